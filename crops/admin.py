@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Crop, CropVariable, PredictedData, CropModelMapping
+from .models import (
+    Crop, CropVariable, PredictedData, CropModelMapping, ImportManifest, ImportJob, PriceRollup, ForecastRun,
+)
+from .ingest.upsert import refresh_derived
 
 class CropModelMappingInline(admin.StackedInline):
     model = CropModelMapping
@@ -22,9 +25,55 @@ class CropVariableAdmin(admin.ModelAdmin):
     search_fields = ('crop__crop_name', 'file_name')
     ordering = ('-date',)
 
+    # แก้ราคารายวันผ่าน admin ต้องคำนวณ PriceRollup/PriceSnapshot ที่เกี่ยวข้องใหม่ด้วย
+    def save_model(self, request, obj, form, change):
+        changed = {}
+        if change and obj.pk:
+            old = CropVariable.objects.filter(pk=obj.pk).values('crop_id', 'date').first()
+            if old:
+                changed.setdefault(old['crop_id'], set()).add(old['date'])
+        super().save_model(request, obj, form, change)
+        changed.setdefault(obj.crop_id, set()).add(obj.date)
+        refresh_derived(changed)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_derived({obj.crop_id: {obj.date}})
+
+    def delete_queryset(self, request, queryset):
+        changed = {}
+        for crop_id, day in queryset.values_list('crop_id', 'date'):
+            changed.setdefault(crop_id, set()).add(day)
+        super().delete_queryset(request, queryset)
+        refresh_derived(changed)
+
 @admin.register(PredictedData)
 class PredictedDataAdmin(admin.ModelAdmin):
-    list_display = ('crop', 'predicted_date', 'predicted_price')
+    list_display = ('crop', 'predicted_date', 'predicted_price', 'run')
     list_filter = ('crop', 'predicted_date')
     search_fields = ('crop__crop_name',)
     ordering = ('-predicted_date',)
+
+@admin.register(ImportManifest)
+class ImportManifestAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'file_path', 'file_size', 'row_count', 'imported_at')
+    search_fields = ('file_name', 'file_path')
+    ordering = ('-imported_at',)
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'kind', 'status', 'files_done', 'files_total', 'rows_inserted', 'rows_updated', 'attempts', 'created_at', 'heartbeat_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-job_id',)
+
+@admin.register(PriceRollup)
+class PriceRollupAdmin(admin.ModelAdmin):
+    list_display = ('crop', 'period', 'period_start', 'period_end', 'day_count', 'average_price', 'min_price', 'max_price')
+    list_filter = ('period', 'crop')
+    ordering = ('crop', 'period', '-period_start')
+
+@admin.register(ForecastRun)
+class ForecastRunAdmin(admin.ModelAdmin):
+    list_display = ('run_id', 'crop', 'model_version', 'data_watermark', 'horizon_start', 'horizon_end', 'row_count', 'created_at')
+    list_filter = ('crop',)
+    ordering = ('-run_id',)
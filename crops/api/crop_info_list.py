@@ -1,49 +1,47 @@
 from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
-from rest_framework.renderers import JSONRenderer
-from django.utils.dateparse import parse_date
-from crops.models import Crop, CropVariable
-import json
-
-# Custom JSON renderer ที่ใช้ ensure_ascii=False
-defualt_charset = 'utf-8'
-class CustomJSONRenderer(JSONRenderer):
-    charset = defualt_charset
-    def render(self, data, accepted_media_type=None, renderer_context=None):
-        if data is None:
-            return bytes()
-        ret = json.dumps(data, ensure_ascii=False)
-        return ret.encode(self.charset)
+from crops.models import Crop, PriceSnapshot
+from crops.ingest.snapshots import compute_snapshots
+from crops.response_cache import cached_response, SCOPE_CATALOG, SCOPE_PRICES
+from crops.db_router import replica_reads
+from .renderers import FastJSONRenderer
 
+@replica_reads
+@cached_response('all_vegetable_info', scopes=[SCOPE_CATALOG, SCOPE_PRICES])
 @api_view(['GET'])
-@renderer_classes([CustomJSONRenderer])
+@renderer_classes([FastJSONRenderer])
 def all_vegetable_info(request):
     """
     ส่งกลับข้อมูลของผักทุกชนิดในตาราง Crops พร้อมกับข้อมูลจาก CropVariable
     รูปแบบที่ส่งกลับ:
       - name: ชื่อผัก (จาก Crop.crop_name)
       - unit: หน่วย (จาก Crop.unit)
-      - price: "฿min - ฿max / unit" (จาก CropVariable ของวันที่ล่าสุด)
-      - avg_price: ราคาเฉลี่ย (จาก CropVariable ของวันที่ล่าสุด)
+      - price: "฿min - ฿max / unit" (จาก PriceSnapshot: ราคาวันที่ล่าสุด)
+      - avg_price: ราคาเฉลี่ย (จาก PriceSnapshot: ราคาวันที่ล่าสุด)
       - change: เปอร์เซ็นต์การเปลี่ยนแปลงราคา
       - image: URL รูปภาพเต็ม (จาก crop.crop_image.url)
       - status: "up" หรือ "down"
     """
-    crops = Crop.objects.all()
+    crops = list(Crop.objects.all())
     result = []
 
-    for crop in crops:
-        # ดึงข้อมูลราคาย้อนหลัง
-        history = CropVariable.objects.filter(crop=crop).order_by('date')
-        if history.exists():
-            latest = history.last()
-            previous = history.exclude(date=latest.date).last()
+    # ราคาล่าสุด/ก่อนหน้าของทุกพืชจาก PriceSnapshot (จำนวน query คงที่ไม่ขึ้นกับจำนวนพืช)
+    snapshots = {s.crop_id: s for s in PriceSnapshot.objects.all()}
+    missing = [crop.crop_id for crop in crops if crop.crop_id not in snapshots]
+    if missing:
+        # ยังไม่มี snapshot (เช่นพืชใหม่หรือยังไม่เคยรันตัวนำเข้า): คำนวณด้วย window query เดียวโดยไม่บันทึก
+        # GET ไม่เขียนฐานข้อมูล snapshot จะถูกเก็บโดยตัวนำเข้า (refresh_derived) หรือ manage.py rebuild_rollups
+        snapshots.update(compute_snapshots(missing))
 
-            price_str = f"฿{int(latest.min_price)} - ฿{int(latest.max_price)} / {crop.unit}"
-            avg_price = f"฿{int(latest.average_price)} / {crop.unit}"
+    for crop in crops:
+        snapshot = snapshots[crop.crop_id]
+        if snapshot.latest_date is not None:
+            price_str = f"฿{int(snapshot.latest_min_price)} - ฿{int(snapshot.latest_max_price)} / {crop.unit}"
+            avg_price = f"฿{int(snapshot.latest_average_price)} / {crop.unit}"
 
-            if previous and previous.average_price:
-                change_val = (latest.average_price - previous.average_price) / previous.average_price * 100
+            previous_price = snapshot.previous_average_price
+            if previous_price:
+                change_val = (snapshot.latest_average_price - previous_price) / previous_price * 100
                 change_pct = round(change_val, 2)
                 if change_val >= 0:
                     change_str = f"↑ {change_pct}%"
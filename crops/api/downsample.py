@@ -0,0 +1,94 @@
+# crops/api/downsample.py
+# ลดจำนวนจุดของกราฟช่วงยาว (?max_points=) ก่อนส่งออก คำนวณด้วย NumPy บน array จาก crops/series_store.py
+#   - lttb (ค่าเริ่มต้น): Largest-Triangle-Three-Buckets เลือกจุดจริงที่รักษารูปร่างกราฟ
+#   - bucket: แบ่งเป็นช่วงเท่าๆ กันแล้วรวมเป็น min/max/avg ต่อช่วง (วันที่ = วันแรกของช่วง)
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "bucket")
+MIN_POINTS = 3
+
+
+def parse_downsample(params):
+    """
+    อ่าน max_points และ downsample จาก query parameters
+    คืนค่า (max_points หรือ None ถ้าไม่ได้ระบุ, method) หรือ raise ValueError พร้อมข้อความ error
+    """
+    raw = params.get("max_points")
+    method = params.get("downsample") or DOWNSAMPLE_METHODS[0]
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError("downsample ต้องเป็น lttb หรือ bucket")
+    if raw in (None, ""):
+        return None, method
+    try:
+        max_points = int(raw)
+    except ValueError:
+        raise ValueError("max_points ต้องเป็นจำนวนเต็ม")
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points ต้องไม่น้อยกว่า {MIN_POINTS}")
+    return max_points, method
+
+
+def lttb_indices(x, y, max_points):
+    """ index ของจุดที่ LTTB เลือก (รวมจุดแรกและจุดสุดท้ายเสมอ) จาก x, y ที่เรียงตาม x แล้ว """
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    # ค่าที่หายไปแทนด้วยค่าเฉลี่ย เพื่อไม่ให้พื้นที่สามเหลี่ยมเป็น NaN
+    y = np.where(np.isnan(y), np.nanmean(y) if np.isfinite(y).any() else 0.0, y)
+    # จุดกลาง n-2 จุดแบ่งเป็น max_points-2 ช่วง, edges[i]..edges[i+1] คือช่วงที่ i
+    every = (n - 2) / (max_points - 2)
+    edges = (np.floor(np.arange(max_points - 1) * every) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _bucket_series(days, columns, max_points, aggregations):
+    """ รวมจุดเป็น max_points ช่วง (จำนวนจุดต่อช่วงใกล้เคียงกัน) ตาม aggregations {key: "min"|"max"|"mean"} """
+    starts = np.floor(np.arange(max_points) * len(days) / max_points).astype(np.int64)
+    merged = {}
+    for key, values in columns.items():
+        how = aggregations.get(key, "mean")
+        if how == "min":
+            merged[key] = np.fmin.reduceat(values, starts)
+        elif how == "max":
+            merged[key] = np.fmax.reduceat(values, starts)
+        else:
+            present = ~np.isnan(values)
+            totals = np.add.reduceat(np.where(present, values, 0.0), starts)
+            filled = np.add.reduceat(present.astype(np.int64), starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                merged[key] = np.round(totals / filled, 2)
+            merged[key][filled == 0] = np.nan
+    # วันที่ของแต่ละช่วง = วันแรกของช่วง
+    return days[starts], merged
+
+
+def downsample_series(days, columns, max_points, method, value_key, aggregations):
+    """
+    ลดจำนวนจุดของ series ให้เหลือไม่เกิน max_points
+      - days: array จำนวนวัน (เรียงจากน้อยไปมาก), columns: dict {key: float array ยาวเท่า days (NaN = ไม่มีค่า)}
+      - value_key: ค่าที่ LTTB ใช้วัดรูปร่างกราฟ เช่น "average_price"
+      - aggregations: วิธีรวมแต่ละ key ในโหมด bucket เช่น {"min_price": "min", "average_price": "mean"}
+    คืนค่า (days, columns) ชุดใหม่ หรือชุดเดิมถ้าจำนวนจุดไม่เกิน max_points
+    """
+    if not max_points or len(days) <= max_points:
+        return days, columns
+    if method == "bucket":
+        return _bucket_series(days, columns, max_points, aggregations)
+    selected = lttb_indices(days.astype("float64"), np.asarray(columns[value_key], dtype="float64"), max_points)
+    return days[selected], {key: values[selected] for key, values in columns.items()}
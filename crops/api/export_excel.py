@@ -1,128 +1,85 @@
-import io
-from django.http import HttpResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils.dateparse import parse_date
+from django.utils.http import content_disposition_header
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-import openpyxl
-from openpyxl.chart import LineChart, Reference
-import urllib.parse
-from crops.models import Crop, CropVariable, PredictedData
+from crops.api.exports import (
+    EXPORT_FORMATS, EXPORT_LAYOUTS, build_export_file, cached_export_path, crop_rows,
+    export_cache_key, for_asgi, parquet_available, stream_csv,
+)
+from crops.crop_index import resolve_crop_list
+from crops.db_router import replica_reads
 
+
+def _export_filename(crops, start_date_str, end_date_str, file_format):
+    label = crops[0].crop_name if len(crops) == 1 else f"{len(crops)}crops"
+    return f"PriceData_{label}_{start_date_str}_to_{end_date_str}.{file_format}"
+
+
+@replica_reads
 @api_view(['GET'])
 def export_price_data_excel(request):
-    # รับ query parameter
-    vegetable_name = request.GET.get('vegetableName')
+    """
+    ดาวน์โหลดราคาจริง + ราคาพยากรณ์ของพืชหนึ่งหรือหลายชนิด
+      - vegetableName / crop_id: ระบุซ้ำได้หลายครั้ง (crop_id คั่นด้วย , ได้)
+      - startDate, endDate: ช่วงวันที่ (YYYY-MM-DD)
+      - file_format: xlsx (ค่าเริ่มต้น) | csv | parquet
+        (ไม่ใช้ชื่อ format เพราะ DRF สงวนไว้เลือก renderer)
+      - layout: sheets (ค่าเริ่มต้น, xlsx หนึ่ง sheet ต่อพืช) | long (ตารางเดียว) — csv / parquet เป็น long เสมอ
+    ไฟล์ที่สร้างแล้วถูก cache ตามพารามิเตอร์และเวอร์ชันข้อมูล (header X-Cache: HIT / MISS)
+    """
     start_date_str = request.GET.get('startDate')
     end_date_str = request.GET.get('endDate')
-    
-    if not (vegetable_name and start_date_str and end_date_str):
+    crop_ids = [value for raw in request.GET.getlist('crop_id') for value in map(str.strip, raw.split(',')) if value]
+    vegetable_names = request.GET.getlist('vegetableName')
+
+    if not ((vegetable_names or crop_ids) and start_date_str and end_date_str):
         return Response({"error": "Missing parameters"}, status=400)
-    
+    if not all(value.isdecimal() for value in crop_ids):
+        return Response({"error": "Invalid crop_id, expected integer ids"}, status=400)
+
     start_date = parse_date(start_date_str)
     end_date = parse_date(end_date_str)
-    
-    crop_obj = Crop.objects.filter(crop_name__icontains=vegetable_name.strip()).first()
-    if not crop_obj:
-        return Response({"error": "Crop not found"}, status=404)
-    
-    # ดึงข้อมูล historical และ predicted
-    historical_qs = CropVariable.objects.filter(
-        crop=crop_obj,
-        date__gte=start_date,
-        date__lte=end_date
-    ).values('date', 'min_price', 'max_price', 'average_price')
-    
-    predicted_qs = PredictedData.objects.filter(
-        crop=crop_obj,
-        predicted_date__gte=start_date,
-        predicted_date__lte=end_date
-    ).values('predicted_date', 'predicted_price')
-    
-    # รวมข้อมูลทั้ง historical และ predicted เป็นรายการเดียวกัน
-    combined_rows = []
-    
-    # เพิ่มข้อมูล historical ทั้งหมด
-    for item in historical_qs:
-        date_dt = item['date']
-        combined_rows.append({
-            "crop_name": crop_obj.crop_name,
-            "date": date_dt.strftime("%Y-%m-%d"),
-            "date_dt": date_dt,
-            "min_price": float(item['min_price']),
-            "max_price": float(item['max_price']),
-            "average_price": float(item['average_price']),
-            "predicted_price": ""  # ไม่มีข้อมูล predicted ในแถว historical
-        })
-    
-    # สร้าง set ของวันที่ที่มีข้อมูล historical (ในรูปแบบสตริง)
-    historical_dates = {row["date"] for row in combined_rows}
-    
-    # เพิ่มข้อมูล predicted เฉพาะวันที่ที่ไม่มีข้อมูล historical
-    for item in predicted_qs:
-        date_dt = item['predicted_date']
-        date_str = date_dt.strftime("%Y-%m-%d")
-        if date_str in historical_dates:
-            continue  # ข้ามถ้ามีข้อมูล historical อยู่แล้วในวันนั้น
-        combined_rows.append({
-            "crop_name": crop_obj.crop_name,
-            "date": date_str,
-            "date_dt": date_dt,
-            "min_price": "",
-            "max_price": "",
-            "average_price": "",
-            "predicted_price": float(item['predicted_price'])
-        })
-    
-    # เรียงลำดับ combined_rows โดยใช้ค่า date_dt จากเก่าไปใหม่
-    combined_rows.sort(key=lambda row: row["date_dt"])
-    
-    # สร้าง workbook ด้วย openpyxl
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Price Data"
+    if not (start_date and end_date):
+        return Response({"error": "Invalid date format, expected YYYY-MM-DD"}, status=400)
 
-    # เพิ่ม header row
-    headers = ["Crop Name", "Date", "Min Price", "Max Price", "Average Price", "Predicted Price"]
-    ws.append(headers)
+    file_format = request.GET.get('file_format') or 'xlsx'
+    if file_format not in EXPORT_FORMATS:
+        return Response({"error": "file_format ต้องเป็น xlsx, csv หรือ parquet"}, status=400)
+    layout = request.GET.get('layout') or EXPORT_LAYOUTS[0]
+    if layout not in EXPORT_LAYOUTS:
+        return Response({"error": "layout ต้องเป็น sheets หรือ long"}, status=400)
+    if file_format == 'parquet' and not parquet_available():
+        return Response({"error": "Parquet export requires pyarrow"}, status=501)
 
-    # เขียนข้อมูลจาก combined_rows ลงใน worksheet
-    for row in combined_rows:
-        ws.append([
-            row["crop_name"],
-            row["date"],
-            row["min_price"],
-            row["max_price"],
-            row["average_price"],
-            row["predicted_price"],
-        ])
-    
-    # สร้างกราฟ LineChart สำหรับแสดงเฉพาะ Average Price กับ Date
-    chart = LineChart()
-    chart.title = "Price Forecast"
-    chart.y_axis.title = "Price"
-    chart.x_axis.title = "Date"
+    crops, not_found = resolve_crop_list(crop_ids, vegetable_names)
+    if not crops:
+        return Response({"error": "Crop not found"}, status=404)
+    if not_found:
+        return Response({"error": "Crop not found", "not_found": not_found}, status=404)
+    if file_format != 'xlsx' or len(crops) == 1:
+        layout = 'long'  # พืชเดียวได้ sheet "Price Data" พร้อมกราฟเหมือน export เดิม
 
-    # กำหนดข้อมูลสำหรับกราฟ: 
-    # ใช้คอลัมน์ 5 ("Average Price") สำหรับข้อมูล y-values โดยข้าม header row (min_row=2)
-    data = Reference(ws, min_col=5, min_row=2, max_row=ws.max_row)
-    chart.add_data(data, titles_from_data=False)
-    
-    # กำหนด categories (แกน x) โดยใช้คอลัมน์ 2 ("Date")
-    categories = Reference(ws, min_col=2, min_row=2, max_row=ws.max_row)
-    chart.set_categories(categories)
-    
-    # วางกราฟใน worksheet ที่ตำแหน่ง "H2"
-    ws.add_chart(chart, "H2")
+    filename = _export_filename(crops, start_date_str, end_date_str, file_format)
+    content_type = EXPORT_FORMATS[file_format]
+    key = export_cache_key(crops, start_date, end_date, file_format, layout)
 
-    # สร้างไฟล์ excel ใน memory stream
-    stream = io.BytesIO()
-    wb.save(stream)
-    stream.seek(0)
+    cached = cached_export_path(key, file_format)
+    if cached is not None:
+        response = FileResponse(open(cached, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+        response['X-Cache'] = 'HIT'
+        return for_asgi(request, response)
 
-    filename = f"PriceData_{crop_obj.crop_name}_{start_date_str}_to_{end_date_str}.xlsx"
-    response = HttpResponse(
-        stream,
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response['Content-Disposition'] = "attachment; filename*=UTF-8''" + urllib.parse.quote(filename)
-    return response
+    rows_by_crop = crop_rows(crops, start_date, end_date)
+    if file_format == 'csv':
+        # ส่งทีละก้อนระหว่างอ่านจากฐานข้อมูล ไม่ต้องรอสร้างไฟล์ทั้งไฟล์
+        response = StreamingHttpResponse(stream_csv(rows_by_crop, key), content_type=content_type)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    else:
+        # xlsx / parquet ต้องปิดไฟล์ให้สมบูรณ์ก่อนส่ง จึงเขียนลงไฟล์ชั่วคราวบนดิสก์แทน memory แล้วส่งด้วย FileResponse
+        response = FileResponse(
+            build_export_file(rows_by_crop, file_format, layout, key),
+            as_attachment=True, filename=filename, content_type=content_type,
+        )
+    response['X-Cache'] = 'MISS'
+    return for_asgi(request, response)
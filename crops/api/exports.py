@@ -0,0 +1,309 @@
+# crops/api/exports.py
+# สร้างไฟล์ export ราคา (xlsx / csv / parquet) ของพืชหนึ่งหรือหลายชนิดโดยไม่โหลดข้อมูลทั้งหมดไว้ในหน่วยความจำ
+#   - ราคามาจาก array ของ crops/series_store.py และเขียนทีละแถว (xlsx ใช้ write-only workbook, parquet เขียนทีละ row group)
+#   - csv ส่งออกเป็น generator ให้ StreamingHttpResponse ได้ทันที
+#   - ไฟล์ที่สร้างแล้วเก็บใน EXPORT_CACHE_DIR ตาม hash ของพารามิเตอร์ + เวอร์ชันข้อมูล ส่งซ้ำได้โดยไม่ต้องสร้างใหม่
+#   - ภายใต้ ASGI ส่ง response เป็น async iterator (for_asgi) เพื่อไม่ให้ Django อ่านทั้งไฟล์เข้าหน่วยความจำก่อนส่ง
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from openpyxl import Workbook
+from openpyxl.chart import LineChart, Reference
+
+from crops.response_cache import crop_scope, current_versions
+from crops.series_store import day_dates, get_series, own_connection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet ไม่บังคับ (ต้องติดตั้ง pyarrow)
+    pa = pq = None
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+# sheets = หนึ่ง sheet ต่อพืช (เฉพาะ xlsx), long = ตารางเดียวมีคอลัมน์ชื่อพืช
+EXPORT_LAYOUTS = ("sheets", "long")
+HEADERS = ["Crop Name", "Date", "Min Price", "Max Price", "Average Price", "Predicted Price"]
+PARQUET_BATCH_ROWS = 10000
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def parquet_available():
+    return pq is not None
+
+
+def _merge_rows(crop, historical, predicted):
+    """
+    รวมราคาจริง (iterable ของ (date, min, max, avg) เรียงตามวันที่) กับราคาพยากรณ์ (list ของ (date, price)
+    เรียงตามวันที่) เป็นแถวเดียวกันเรียงตามวันที่
+    ราคาพยากรณ์ของวันที่มีราคาจริงอยู่แล้วจะถูกข้าม (เหมือน export เดิม)
+    แถว = (crop_name, date, min, max, average, predicted) ค่าที่ไม่มีเป็น None
+    """
+    name = crop.crop_name
+    pending = iter(predicted)
+    next_pred = next(pending, None)
+    for day, low, high, average in historical:
+        while next_pred is not None and next_pred[0] <= day:
+            if next_pred[0] < day:
+                yield (name, next_pred[0], None, None, None, next_pred[1])
+            next_pred = next(pending, None)
+        yield (name, day, low, high, average, None)
+    while next_pred is not None:
+        yield (name, next_pred[0], None, None, None, next_pred[1])
+        next_pred = next(pending, None)
+
+
+def _series_rows(crop, series, start_date, end_date):
+    days, low, high, average = series.history(start_date, end_date)
+    pred_days, predicted = series.forecast(start_date, end_date)
+    historical = zip(day_dates(days), low.tolist(), high.tolist(), average.tolist())
+    return _merge_rows(crop, historical, list(zip(day_dates(pred_days), predicted.tolist())))
+
+
+def crop_rows(crops, start_date, end_date):
+    """
+    คืน generator ของ (crop, generator ของแถว) ตามลำดับพืชที่ขอ
+    array ถูกโหลดทันทีตอนเรียก (ยังอยู่ใน view และฐานข้อมูลที่ view เลือกไว้) ไม่ใช่ตอน stream เริ่มส่ง
+    """
+    series = get_series([crop.crop_id for crop in crops])
+    return ((crop, _series_rows(crop, series[crop.crop_id], start_date, end_date)) for crop in crops)
+
+
+def _sheet_title(name, used):
+    """ ชื่อ sheet ของ Excel: ไม่เกิน 31 ตัวอักษร ห้ามมี []:*?/\\ และต้องไม่ซ้ำ """
+    base = _INVALID_SHEET_CHARS.sub(" ", name).strip()[:31] or "Sheet"
+    title, number = base, 2
+    while title.casefold() in used:
+        suffix = f" ({number})"
+        title, number = base[:31 - len(suffix)] + suffix, number + 1
+    used.add(title.casefold())
+    return title
+
+
+def _add_price_chart(ws, row_count):
+    """ กราฟ Average Price ตาม Date (คอลัมน์ 5 และ 2) เหมือน export เดิม """
+    chart = LineChart()
+    chart.title = "Price Forecast"
+    chart.y_axis.title = "Price"
+    chart.x_axis.title = "Date"
+    chart.add_data(Reference(ws, min_col=5, min_row=2, max_row=row_count + 1), titles_from_data=False)
+    chart.set_categories(Reference(ws, min_col=2, min_row=2, max_row=row_count + 1))
+    ws.add_chart(chart, "H2")
+
+
+def write_xlsx(fileobj, rows_by_crop, layout):
+    """ เขียน workbook แบบ write-only (แถวถูกเขียนลงไฟล์ชั่วคราวทันที ไม่ค้างใน memory) """
+    wb = Workbook(write_only=True)
+    used = set()
+    sheet, row_count, crop_count = None, 0, 0
+    for crop, rows in rows_by_crop:
+        if layout == "sheets":
+            if sheet is not None:
+                _add_price_chart(sheet, row_count)
+            sheet, row_count = wb.create_sheet(_sheet_title(crop.crop_name, used)), 0
+            sheet.append(HEADERS)
+        elif sheet is None:
+            sheet = wb.create_sheet("Price Data")
+            sheet.append(HEADERS)
+        crop_count += 1
+        for name, day, low, high, average, predicted in rows:
+            sheet.append([name, day.isoformat(), low, high, average, predicted])
+            row_count += 1
+    if sheet is None:
+        sheet = wb.create_sheet("Price Data")
+        sheet.append(HEADERS)
+    # ตารางเดียวที่มีหลายพืชต่อกันไม่ใส่กราฟ (เส้นของแต่ละพืชจะต่อกันจนอ่านไม่ได้)
+    if layout == "sheets" or crop_count <= 1:
+        _add_price_chart(sheet, row_count)
+    wb.save(fileobj)
+
+
+def csv_chunks(rows_by_crop):
+    """ generator ของ CSV (UTF-8 มี BOM ให้ Excel เปิดภาษาไทยได้) เป็นก้อนละประมาณ STREAM_CHUNK_BYTES """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("﻿")
+    writer.writerow(HEADERS)
+    for _, rows in rows_by_crop:
+        for name, day, low, high, average, predicted in rows:
+            writer.writerow([name, day.isoformat(), low, high, average, predicted])
+            if buffer.tell() >= STREAM_CHUNK_BYTES:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_parquet(fileobj, rows_by_crop):
+    """ เขียน parquet (long format) ทีละ row group ละ PARQUET_BATCH_ROWS แถว """
+    schema = pa.schema([
+        ("crop_id", pa.int32()),
+        ("crop_name", pa.string()),
+        ("date", pa.date32()),
+        ("min_price", pa.float64()),
+        ("max_price", pa.float64()),
+        ("average_price", pa.float64()),
+        ("predicted_price", pa.float64()),
+    ])
+    columns = [[] for _ in schema.names]
+
+    def flush(writer):
+        writer.write_table(pa.table(
+            {name: values for name, values in zip(schema.names, columns)}, schema=schema
+        ))
+        for values in columns:
+            values.clear()
+
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for crop, rows in rows_by_crop:
+            for row in rows:
+                for values, value in zip(columns, (crop.crop_id, *row)):
+                    values.append(value)
+                if len(columns[0]) >= PARQUET_BATCH_ROWS:
+                    flush(writer)
+        if columns[0]:
+            flush(writer)
+
+
+# --- cache ของไฟล์ export ---
+
+def export_cache_key(crops, start_date, end_date, file_format, layout):
+    """ hash ของพารามิเตอร์ที่ normalize แล้ว + เวอร์ชันข้อมูลของแต่ละพืช (นำเข้า/พยากรณ์ใหม่ -> key ใหม่) """
+    scopes = [crop_scope(crop.crop_id) for crop in crops]
+    raw = json.dumps([
+        [crop.crop_id for crop in crops], start_date.isoformat(), end_date.isoformat(),
+        file_format, layout, sorted(current_versions(scopes).items()),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_enabled():
+    return getattr(settings, "EXPORT_CACHE_MAX_FILES", 0) > 0
+
+
+def cached_export_path(key, file_format):
+    """ path ของไฟล์ใน cache ถ้ามีอยู่แล้ว (และบันทึกว่าเพิ่งถูกใช้) หรือ None """
+    if not _cache_enabled():
+        return None
+    path = os.path.join(settings.EXPORT_CACHE_DIR, f"{key}.{file_format}")
+    if not os.path.exists(path):
+        return None
+    os.utime(path)
+    return path
+
+
+def _prune_cache():
+    """ ลบไฟล์ที่ไม่ได้ใช้นานที่สุดเมื่อจำนวนไฟล์เกิน EXPORT_CACHE_MAX_FILES """
+    folder = settings.EXPORT_CACHE_DIR
+    files = [
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.rsplit(".", 1)[-1] in EXPORT_FORMATS
+    ]
+    if len(files) <= settings.EXPORT_CACHE_MAX_FILES:
+        return
+    files.sort(key=lambda path: os.path.getmtime(path))
+    for path in files[:len(files) - settings.EXPORT_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _temp_file(file_format):
+    if not _cache_enabled():
+        return tempfile.TemporaryFile(), None
+    os.makedirs(settings.EXPORT_CACHE_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=settings.EXPORT_CACHE_DIR)
+    return os.fdopen(fd, "w+b"), temp_path
+
+
+def _publish(temp_path, key, file_format):
+    """ ย้ายไฟล์ชั่วคราวเข้า cache แบบ atomic (request ที่สร้างพร้อมกันจะได้ไฟล์ที่สมบูรณ์เสมอ) """
+    path = os.path.join(settings.EXPORT_CACHE_DIR, f"{key}.{file_format}")
+    os.replace(temp_path, path)
+    _prune_cache()
+    return path
+
+
+def build_export_file(rows_by_crop, file_format, layout, key):
+    """
+    สร้างไฟล์ xlsx / parquet แล้วคืน file object ที่เปิดไว้สำหรับอ่าน (ส่งให้ FileResponse ได้เลย)
+    ถ้าเปิด cache ไฟล์จะถูกเก็บไว้ใน EXPORT_CACHE_DIR ด้วย
+    """
+    fileobj, temp_path = _temp_file(file_format)
+    try:
+        if file_format == "xlsx":
+            write_xlsx(fileobj, rows_by_crop, layout)
+        else:
+            write_parquet(fileobj, rows_by_crop)
+        if temp_path is None:
+            fileobj.seek(0)
+            return fileobj
+        fileobj.close()
+        return open(_publish(temp_path, key, file_format), "rb")
+    except BaseException:
+        fileobj.close()
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def stream_csv(rows_by_crop, key):
+    """ generator ของ CSV สำหรับ StreamingHttpResponse ที่เขียนลง cache ไปพร้อมกัน (เก็บเมื่อส่งครบเท่านั้น) """
+    if not _cache_enabled():
+        yield from csv_chunks(rows_by_crop)
+        return
+    fileobj, temp_path = _temp_file("csv")
+    try:
+        with fileobj:
+            for chunk in csv_chunks(rows_by_crop):
+                fileobj.write(chunk)
+                yield chunk
+        _publish(temp_path, key, "csv")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# --- ASGI ---
+
+def _next_block(iterator):
+    """ รวมก้อนจาก iterator ให้ได้ประมาณ STREAM_CHUNK_BYTES ต่อครั้ง (b"" เมื่อหมด) """
+    parts, size = [], 0
+    for part in iterator:
+        parts.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            break
+    return b"".join(parts)
+
+
+async def _async_blocks(chunks):
+    iterator = iter(chunks)
+    next_block = own_connection(_next_block)
+    while block := await next_block(iterator):
+        yield block
+
+
+def for_asgi(request, response):
+    """
+    ภายใต้ ASGI Django อ่าน streaming response ที่เป็น iterator แบบ sync เข้าหน่วยความจำทั้งหมดก่อนส่ง
+    จึงเปลี่ยนเป็น async iterator ที่สร้าง/อ่านทีละประมาณ STREAM_CHUNK_BYTES ใน thread (WSGI คืน response เดิม)
+    ไฟล์และ generator เดิมยังถูกปิดตอน response ปิดตามปกติ
+    """
+    if isinstance(getattr(request, "_request", request), ASGIRequest):
+        response.streaming_content = _async_blocks(response.streaming_content)
+    return response
@@ -1,22 +1,34 @@
 import django_filters
-from crops.models import Crop, CropVariable, PredictedData
+from django.db.models import Subquery
+from crops.models import Crop, CropVariable, CurrentForecast, PredictedData
 
 class CropVariableFilter(django_filters.FilterSet):
     crop = django_filters.ModelChoiceFilter(
         queryset=Crop.objects.all(),
         label="Crop Name"
     )
+    # ?date_after=YYYY-MM-DD&date_before=YYYY-MM-DD (รวมวันที่ขอบทั้งสองด้าน)
+    date = django_filters.DateFromToRangeFilter(field_name='date')
 
     class Meta:
         model = CropVariable
-        fields = ['crop']
+        fields = ['crop', 'date']
 
 class PredictedDataFilter(django_filters.FilterSet):
     crop = django_filters.ModelChoiceFilter(
         queryset=Crop.objects.all(),
-        label="Crop Name"
+        label="Crop Name",
+        method='filter_crop'
     )
+    # ?date_after=YYYY-MM-DD&date_before=YYYY-MM-DD ของ predicted_date
+    date = django_filters.DateFromToRangeFilter(field_name='predicted_date')
 
     class Meta:
         model = PredictedData
-        fields = ['crop']
+        fields = ['crop', 'date']
+
+    def filter_crop(self, queryset, name, value):
+        # ค่าพยากรณ์ของพืชหนึ่งชนิดมาจากรอบปัจจุบันรอบเดียว: กรองด้วย run_id ของรอบนั้น
+        # เพื่อใช้ index (run, predicted_date) ทั้งกับช่วงวันที่และลำดับของ keyset pagination
+        current_run = CurrentForecast.objects.filter(crop=value).values('run_id')[:1]
+        return queryset.filter(run_id=Subquery(current_run))
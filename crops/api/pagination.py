@@ -0,0 +1,90 @@
+# crops/api/pagination.py
+# keyset (cursor) pagination เรียงตาม (วันที่, id) สำหรับ crop-variables / predicted-data
+# ไม่มี COUNT(*) และไม่ใช้ OFFSET: หน้าถัดไปเริ่มจากแถวสุดท้ายของหน้าก่อน ความเร็วต่อหน้าจึงคงที่แม้จะลึกแค่ไหน
+
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class DateKeysetPagination(BasePagination):
+    """
+    ใช้กับ viewset ที่กำหนด keyset_ordering = (ชื่อฟิลด์วันที่, ชื่อฟิลด์ primary key)
+    คำตอบ: {"next": URL ของหน้าถัดไป หรือ null เมื่อถึงหน้าสุดท้าย, "results": [...]}
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, day, pk):
+        return base64.urlsafe_b64encode(f"{day.isoformat()}|{pk}".encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """ คืนค่า (date, pk) ของแถวสุดท้ายของหน้าก่อน หรือ None ถ้าเป็นหน้าแรก """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            day, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            day, pk = parse_date(day), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if day is None:
+            raise NotFound(self.invalid_cursor_message)
+        return day, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        date_field, pk_field = view.keyset_ordering
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        queryset = queryset.order_by(date_field, pk_field)
+        if cursor is not None:
+            day, pk = cursor
+            # (date, pk) > (day, pk): เงื่อนไข date >= day นำหน้าเพื่อให้ใช้ index (date, pk) เป็นช่วงได้
+            queryset = queryset.filter(**{f'{date_field}__gte': day}).filter(
+                Q(**{f'{date_field}__gt': day}) | Q(**{f'{pk_field}__gt': pk})
+            )
+        # ดึงเกิน 1 แถวเพื่อรู้ว่ามีหน้าถัดไปหรือไม่ (แทน COUNT(*))
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, date_field), getattr(last, pk_field))
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,28 +1,111 @@
-from rest_framework.decorators import api_view, renderer_classes
-from rest_framework.response import Response
-from crops.models import Crop, CropVariable, PredictedData  # เพิ่ม PredictedData
+import asyncio
+from asgiref.sync import sync_to_async
+from crops.models import PriceRollup
+from crops.crop_index import resolve_crop
+from crops.response_cache import cached_response
+from crops.db_router import replica_reads
+from crops.series_store import aget_series, day_strings
 from django.utils.dateparse import parse_date
-from rest_framework.renderers import JSONRenderer
-import json
+from django.views.decorators.http import require_GET
 from datetime import datetime
+from .renderers import json_response, requested_format
+from .downsample import parse_downsample, downsample_series
+from .summary import series_summary
+
+def _price_change_text(start_price, end_price, start_date, end_date):
+    """ ข้อความการเปลี่ยนแปลงราคาจากราคาวันแรกถึงวันสุดท้ายของช่วง เช่น "⭣ 10% จาก 10 วันที่แล้ว" """
+    if start_price is None or end_price is None or not start_price:
+        return "-"
+    try:
+        start_price = float(start_price)
+        end_price = float(end_price)
+        change_value = ((end_price - start_price) / start_price) * 100
+        change_percent = round(abs(change_value), 2)
+        days_diff = (end_date - start_date).days
+        arrow = "⭡" if change_value >= 0 else "⭣"
+        return f"{arrow} {change_percent}% จาก {days_diff} วันที่แล้ว"
+    except Exception:
+        return "-"
+
+
+def _predicted_prices(days, prices):
+    return [
+        {"date": day, "predicted_price": price}
+        for day, price in zip(day_strings(days), prices.tolist())
+    ]
+
+
+def _summary(series, start_date, end_date):
+    """ summary ของราคารายวันในช่วงที่ขอพอดี คำนวณจาก array ของ series_store (crops/api/summary.py) """
+    historical = series_summary(series, start_date, end_date)["historical"]
+    if not historical["count"]:
+        return {"overall_average": None, "overall_min": None, "overall_max": None, "price_change": "-"}
+    return {
+        "overall_average": historical["average"],
+        "overall_min": historical["min"],
+        "overall_max": historical["max"],
+        "price_change": _price_change_text(
+            historical["first_price"], historical["last_price"], start_date, end_date
+        ),
+    }
+
+
+async def _rollups(crop_obj, period, start_date, end_date):
+    """ PriceRollup ที่ทับกับช่วงวันที่ (async ORM) """
+    return [
+        rollup async for rollup in PriceRollup.objects.filter(
+            crop_id=crop_obj.crop_id,
+            period=period,
+            period_end__gte=start_date,
+            period_start__lte=end_date,
+        ).order_by('period_start')
+    ]
+
+
+def _period_data(crop_obj, period, rollups, series, start_date, end_date):
+    """
+    คำตอบแบบรายช่วง: "periodPrices" มาจาก PriceRollup ที่ทับกับช่วงวันที่ (ช่วงแรก/สุดท้ายอาจเกินขอบ)
+    ส่วน summary คำนวณจากราคารายวันในช่วงที่ขอพอดี จึงตรงกับคำตอบแบบรายวัน
+    """
+    periodPrices = [
+        {
+            "period_start": r.period_start.isoformat(),
+            "period_end": r.period_end.isoformat(),
+            "day_count": r.day_count,
+            "average_price": float(r.average_price),
+            "min_price": float(r.min_price),
+            "max_price": float(r.max_price),
+            "first_price": float(r.first_price),
+            "last_price": float(r.last_price),
+        }
+        for r in rollups
+    ]
+    summary = _summary(series, start_date, end_date)
+
+    return {
+        "name": crop_obj.crop_name,
+        "unit": crop_obj.unit,
+        "period": period,
+        "periodPrices": periodPrices,
+        "predictedPrices": _predicted_prices(*series.forecast(start_date, end_date)),
+        "summary": summary,
+    }
 
-# Custom JSON renderer ที่ใช้ ensure_ascii=False
-class CustomJSONRenderer(JSONRenderer):
-    charset = 'utf-8'
-    def render(self, data, accepted_media_type=None, renderer_context=None):
-        if data is None:
-            return bytes()
-        ret = json.dumps(data, ensure_ascii=False)
-        return ret.encode(self.charset)
 
-@api_view(['GET'])
-@renderer_classes([CustomJSONRenderer])
-def quarterly_avg_data(request):
+@replica_reads
+@cached_response('quarterly_avg_data', crop_param='crop_name')
+@require_GET
+async def quarterly_avg_data(request):
     """
     รับ query parameters:
       - crop_name: ชื่อผักที่ต้องการค้นหา
       - startDate: วันที่เริ่มต้น (รูปแบบ YYYY-MM-DD)
       - endDate: วันที่สิ้นสุด (รูปแบบ YYYY-MM-DD)
+      - period (ไม่บังคับ): week, month, quarter หรือ year เพื่อรับ "periodPrices" ราคารวมรายช่วง
+        จาก PriceRollup แทน "dailyPrices" (เหมาะกับกราฟช่วงยาวหลายปี)
+      - max_points (ไม่บังคับ): ลด "dailyPrices" และ "predictedPrices" ให้ไม่เกินจำนวนจุดนี้
+        ด้วยวิธี downsample=lttb (ค่าเริ่มต้น, เลือกจุดจริงที่รักษารูปร่างกราฟ) หรือ bucket (min/max/avg ต่อช่วง)
+        summary ยังคำนวณจากข้อมูลรายวันทั้งหมด
     
     ส่งกลับข้อมูลในรูปแบบ JSON ดังนี้:
       {
@@ -45,13 +128,17 @@ def quarterly_avg_data(request):
             "price_change": "⭣ 10% จาก 10 วันที่แล้ว"
         }
       }
+    async view: period=... query PriceRollup พร้อมกับการโหลดราคารายวันของ series store
     """
+    if requested_format(request) is None:
+        return json_response({"detail": "Not found."}, status=404)
+
     crop_name = request.GET.get('crop_name')
     start_date_str = request.GET.get('startDate')
     end_date_str = request.GET.get('endDate')
     
     if not (crop_name and start_date_str and end_date_str):
-        return Response({"error": "Missing required parameters"}, status=400)
+        return json_response({"error": "Missing required parameters"}, status=400)
     
     try:
         start_date = parse_date(start_date_str)
@@ -60,87 +147,55 @@ def quarterly_avg_data(request):
         end_date = parse_date(end_date_str)
         if end_date is None:
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-    except Exception as e:
-        return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    except Exception:
+        return json_response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=400)
+    try:
+        max_points, downsample = parse_downsample(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
     
-    crop_obj = Crop.objects.filter(crop_name__icontains=crop_name.strip()).first()
+    crop_obj = await sync_to_async(resolve_crop)(crop_name)
     if not crop_obj:
-        return Response({"error": "Crop not found"}, status=404)
-    
-    historical_qs = CropVariable.objects.filter(
-        crop=crop_obj,
-        date__gte=start_date,
-        date__lte=end_date
-    ).order_by('date')
-    
-    dailyPrices = []
-    for var in historical_qs:
-        dailyPrices.append({
-            "date": var.date.isoformat(),
-            "min_price": float(var.min_price) if var.min_price is not None else None,
-            "max_price": float(var.max_price) if var.max_price is not None else None,
-            "average_price": float(var.average_price) if var.average_price is not None else None,
-        })
+        return json_response({"error": "Crop not found"}, status=404)
     
-    # Query ข้อมูล predicted จาก PredictedData model
-    predicted_qs = PredictedData.objects.filter(
-        crop=crop_obj,
-        predicted_date__gte=start_date,
-        predicted_date__lte=end_date
-    ).order_by('predicted_date')
+    # period=week|month|quarter|year: ตอบราคารวมรายช่วงจาก PriceRollup แทนราคารายวันทุกแถว
+    period = request.GET.get('period')
+    if period:
+        if period not in dict(PriceRollup.PERIOD_CHOICES):
+            return json_response({"error": "period ต้องเป็น week, month, quarter หรือ year"}, status=400)
+        rollups, series = await asyncio.gather(
+            _rollups(crop_obj, period, start_date, end_date), aget_series([crop_obj.crop_id]),
+        )
+        return json_response(_period_data(crop_obj, period, rollups, series[crop_obj.crop_id], start_date, end_date))
     
-    predictedPrices = []
-    for item in predicted_qs:
-        predictedPrices.append({
-            "date": item.predicted_date.isoformat(),
-            "predicted_price": float(item.predicted_price) if item.predicted_price is not None else None,
-        })
-    
-    # คำนวณ summary
-    avg_prices = [float(var.average_price) for var in historical_qs if var.average_price is not None]
-    overall_average = sum(avg_prices) / len(avg_prices) if avg_prices else None
-
-    min_prices = [float(var.min_price) for var in historical_qs if var.min_price is not None]
-    overall_min = min(min_prices) if min_prices else None
+    # ราคารายวันและค่าพยากรณ์จาก array ในหน่วยความจำ (crops/series_store.py) ลดจำนวนจุดก่อนแปลงเป็น list
+    series = (await aget_series([crop_obj.crop_id]))[crop_obj.crop_id]
+    days, low, high, average = series.history(start_date, end_date)
+    days, daily = downsample_series(
+        days, {"min_price": low, "max_price": high, "average_price": average},
+        max_points, downsample, "average_price",
+        {"min_price": "min", "max_price": "max", "average_price": "mean"},
+    )
+    dailyPrices = [
+        {"date": day, "min_price": low_price, "max_price": high_price, "average_price": price}
+        for day, low_price, high_price, price in zip(
+            day_strings(days), daily["min_price"].tolist(), daily["max_price"].tolist(),
+            daily["average_price"].tolist(),
+        )
+    ]
+    pred_days, predicted = series.forecast(start_date, end_date)
+    pred_days, predicted = downsample_series(
+        pred_days, {"predicted_price": predicted}, max_points, downsample,
+        "predicted_price", {"predicted_price": "mean"},
+    )
 
-    max_prices = [float(var.max_price) for var in historical_qs if var.max_price is not None]
-    overall_max = max(max_prices) if max_prices else None
-
-    if historical_qs.exists():
-        start_var = historical_qs.first()
-        end_var = historical_qs.last()
-        if start_var and end_var and start_var.average_price:
-            try:
-                start_price = float(start_var.average_price)
-                end_price = float(end_var.average_price)
-                change_value = ((end_price - start_price) / start_price) * 100
-                change_percent = round(abs(change_value), 2)
-                days_diff = (end_date - start_date).days
-                arrow = "⭡" if change_value >= 0 else "⭣"
-                price_change_str = f"{arrow} {change_percent}% จาก {days_diff} วันที่แล้ว"
-            except Exception as e:
-                price_change_str = "-"
-        else:
-            price_change_str = "-"
-    else:
-        overall_average = None
-        overall_min = None
-        overall_max = None
-        price_change_str = "-"
-    
-    summary = {
-        "overall_average": overall_average,
-        "overall_min": overall_min,
-        "overall_max": overall_max,
-        "price_change": price_change_str,
-    }
-    
     data = {
         "name": crop_obj.crop_name,
         "unit": crop_obj.unit,
         "dailyPrices": dailyPrices,
-        "predictedPrices": predictedPrices,
-        "summary": summary,
+        "predictedPrices": _predicted_prices(pred_days, predicted["predicted_price"]),
+        # summary คำนวณจากข้อมูลรายวันทั้งหมดในช่วง (ก่อนลดจำนวนจุด)
+        "summary": _summary(series, start_date, end_date),
     }
     
-    return Response(data)
+    return json_response(data)
@@ -0,0 +1,63 @@
+# crops/api/renderers.py
+# JSON renderer กลางของ API ฝั่งอ่าน: ภาษาไทยไม่ถูก escape (\uXXXX) และไม่มีช่องว่างเกิน
+# ใช้ orjson ถ้าติดตั้งไว้ (เร็วกว่า json.dumps หลายเท่า) ไม่เช่นนั้นใช้ json ของ Python ได้ผลเหมือนกัน
+# async view (ไม่ผ่าน DRF) ใช้ json_response / requested_format ให้ได้ response แบบเดียวกับ renderer
+
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson ไม่บังคับ
+    orjson = None
+
+
+def _default(value):
+    """ แปลงชนิดที่ JSON ไม่รู้จัก (Decimal จาก DecimalField, วันที่, UUID) """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "tolist"):  # numpy array / scalar
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(data):
+    """ แปลงข้อมูลเป็น JSON bytes (UTF-8) """
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """ แทน CustomJSONRenderer เดิม (json.dumps + ensure_ascii=False) ที่เคยซ้ำกันหลายไฟล์ """
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        return dumps_json(data)
+
+
+def json_response(data, status=200):
+    """ HttpResponse แบบเดียวกับที่ DRF สร้างด้วย FastJSONRenderer """
+    return HttpResponse(dumps_json(data), status=status, content_type="application/json; charset=utf-8")
+
+
+def requested_format(request, formats=("json",)):
+    """
+    รูปแบบที่ขอด้วย ?format= (แบบ format override ของ DRF: ไม่ระบุ = json)
+    คืน None ถ้าไม่รองรับ (view ตอบ 404 เหมือน DRF) เช่น ?format=columnar ของ combined-priceforecast
+    """
+    value = request.GET.get("format") or "json"
+    return value if value in formats else None
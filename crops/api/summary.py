@@ -0,0 +1,66 @@
+# crops/api/summary.py
+# สรุปราคาในช่วงวันที่ของพืช (ใช้ร่วมกันระหว่าง combined-priceforecast, batch-priceforecast และ quarterly-avg)
+# คำนวณจาก array ใน crops/series_store.py จึงไม่ต้อง query หรือแปลง Decimal ทีละแถว
+#   - ราคาจริง / ราคาพยากรณ์: จำนวนแถว, ค่าเฉลี่ย, MIN, MAX, ราคาแรก/สุดท้ายของช่วง
+#     และ volatility = ส่วนเบี่ยงเบนมาตรฐาน (sample) ของผลตอบแทนรายวัน
+#   - ราคาจริงที่ใกล้ start_date / end_date ที่สุด (ค้นทั้งก่อนและหลังวันนั้น ไม่จำกัดอยู่ในช่วง)
+
+import numpy as np
+
+
+def _stats(prices, low, high):
+    """ ค่าสรุปของราคาในช่วง (None เมื่อไม่มีข้อมูล) """
+    if not len(prices):
+        return {"count": 0, "average": None, "min": None, "max": None,
+                "first_price": None, "last_price": None, "volatility": 0.0}
+    # ผลตอบแทนรายวัน = (price - price ก่อนหน้า) / price ก่อนหน้า (ข้ามวันที่ราคาก่อนหน้าเป็น 0)
+    previous, current = prices[:-1], prices[1:]
+    valid = previous > 0
+    returns = (current[valid] - previous[valid]) / previous[valid]
+    return {
+        "count": len(prices),
+        "average": float(prices.mean()),
+        "min": float(low.min()),
+        "max": float(high.max()),
+        "first_price": float(prices[0]),
+        "last_price": float(prices[-1]),
+        # sample standard deviation ของผลตอบแทนรายวัน (ต้องมีอย่างน้อย 2 ค่า) เป็นเปอร์เซ็นต์
+        "volatility": float(np.std(returns, ddof=1)) * 100 if len(returns) >= 2 else 0.0,
+    }
+
+
+def series_summary(series, start_date, end_date):
+    """
+    ค่าสรุปของ CropSeries หนึ่งพืช:
+    {"historical": stats, "predicted": stats, "start_price": float, "end_price": float}
+    stats มี count, average, min, max, volatility (%), first_price, last_price
+    start_price / end_price คือ average_price ที่ใกล้ start_date / end_date ที่สุด
+    """
+    _, low, high, average = series.history(start_date, end_date)
+    _, predicted = series.forecast(start_date, end_date)
+    return {
+        "historical": _stats(average, low, high),
+        "predicted": _stats(predicted, predicted, predicted),
+        "start_price": series.closest_price(start_date),
+        "end_price": series.closest_price(end_date),
+    }
+
+
+def overall_summary(summary):
+    """
+    overall_summary ของ combined-priceforecast จากผลของ series_summary
+      - overall_average / min / max และ volatility_percent: ใช้ราคาจริงถ้ามี ไม่มีก็ใช้ราคาพยากรณ์
+      - price_change_percent: จากราคาที่ใกล้ start_date และ end_date ที่สุด
+    """
+    source = summary["historical"] if summary["historical"]["count"] else summary["predicted"]
+    start_price, end_price = summary["start_price"], summary["end_price"]
+    price_change_percent = 0.0
+    if start_price != 0:
+        price_change_percent = ((end_price - start_price) / start_price) * 100
+    return {
+        "overall_average": round(source["average"] or 0.0, 2),
+        "overall_min": round(source["min"] or 0.0, 2),
+        "overall_max": round(source["max"] or 0.0, 2),
+        "volatility_percent": round(source["volatility"], 2),
+        "price_change_percent": round(price_change_percent, 2),
+    }
@@ -5,7 +5,8 @@ from .views_api import (
     CropVariableViewSet, 
     PredictedDataViewSet,
     crops_list, 
-    combined_price_forecast
+    combined_price_forecast,
+    batch_price_forecast,
 )
 from .export_excel import export_price_data_excel
 from .crop_info_list import all_vegetable_info  # Import view จาก crop_info_list.py
@@ -13,7 +14,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from .quarterly_avg_api import quarterly_avg_data
 from crops.api.views_api import migrate_images
-from .views_api import debug_storage
+from .views_api import debug_storage, cache_stats
 
 router = DefaultRouter()
 router.register(r'crops', CropViewSet)
@@ -26,6 +27,8 @@ urlpatterns = [
     path('api/crops-list/', crops_list, name='crops_list'),
     # URL สำหรับ combined price forecast endpoint
     path('api/combined-priceforecast/', combined_price_forecast, name='combined_price_forecast'),
+    # URL สำหรับข้อมูลแบบ combined-priceforecast ของหลายพืชใน request เดียว
+    path('api/batch-priceforecast/', batch_price_forecast, name='batch_price_forecast'),
     # URL สำหรับ export excel endpoint
     path('api/export-excel/', export_price_data_excel, name='export_excel'),
     # URL สำหรับแสดงข้อมูลผักทั้งหมด (จาก Crop) ในรูปแบบที่ต้องการ
@@ -33,6 +36,7 @@ urlpatterns = [
     path('api/quarterly-avg/', quarterly_avg_data, name='quarterly_avg'),
     path('api/migrate-images/', migrate_images, name='migrate_images'),
     path('debug-storage/', debug_storage, name='debug_storage'),
+    path('api/cache-stats/', cache_stats, name='cache_stats'),
 ]
 
 if settings.DEBUG:  # ถ้าใน local development
@@ -1,47 +1,58 @@
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets
-from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.pagination import PageNumberPagination
 from django.utils.dateparse import parse_date
 from django.db.models import F
 from django.http import JsonResponse
+from django.views.decorators.http import require_GET
 from crops.models import Crop, CropVariable, PredictedData
+from crops.crop_index import resolve_crop, resolve_crop_list
+from crops.response_cache import cached_response, response_cache, SCOPE_CATALOG
+from crops.series_store import aget_series, day_strings
+from crops.forecast_runs import current_predictions
+from crops.db_router import replica_reads, ReplicaReadMixin
 from .filters import CropVariableFilter, PredictedDataFilter
+from .pagination import DateKeysetPagination
+from .renderers import json_response, requested_format
+from .downsample import parse_downsample, downsample_series
+from .summary import series_summary, overall_summary
 from .serializers import CropSerializer, CropVariableSerializer, PredictedDataSerializer
 import os
+import numpy as np
 from django.conf import settings
 from django.core.files import File
 from django.core.files.storage import default_storage
 
 
 
-import math
-
-class CropVariablePagination(PageNumberPagination):
-    page_size = 100  # หรือกำหนดตามที่ต้องการ
-
-class CropViewSet(viewsets.ModelViewSet):
+class CropViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Crop.objects.all()
     serializer_class = CropSerializer
     http_method_names = ['get']  # รองรับเฉพาะ GET
 
-class CropVariableViewSet(viewsets.ModelViewSet):
-    queryset = CropVariable.objects.all()
+class CropVariableViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = CropVariable.objects.select_related('crop')
     serializer_class = CropVariableSerializer
-    pagination_class = CropVariablePagination
+    pagination_class = DateKeysetPagination
+    keyset_ordering = ('date', 'variable_id')
     filter_backends = [DjangoFilterBackend]
     filterset_class = CropVariableFilter
     http_method_names = ['get']  # รองรับเฉพาะ GET
 
-class PredictedDataViewSet(viewsets.ModelViewSet):
-    queryset = PredictedData.objects.all()
+class PredictedDataViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    # เฉพาะค่าพยากรณ์ของรอบปัจจุบันของแต่ละพืช (รอบเก่าที่ยังไม่ถูกลบไม่แสดง)
+    queryset = current_predictions().select_related('crop')
     serializer_class = PredictedDataSerializer
-    pagination_class = CropVariablePagination
+    pagination_class = DateKeysetPagination
+    keyset_ordering = ('predicted_date', 'predicted_id')
     filter_backends = [DjangoFilterBackend]
     filterset_class = PredictedDataFilter
     http_method_names = ['get']  # รองรับเฉพาะ GET
 
+@replica_reads
+@cached_response('crops_list', scopes=[SCOPE_CATALOG])
 @api_view(['GET'])
 def crops_list(request):
     """
@@ -55,8 +66,13 @@ def crops_list(request):
     response['Content-Type'] = 'application/json; charset=utf-8'
     return response
 
-@api_view(['GET'])
-def combined_price_forecast(request):
+# ?format= ที่ combined-priceforecast / batch-priceforecast รองรับ
+SERIES_FORMATS = ("json", "columnar")
+
+@replica_reads
+@cached_response('combined_price_forecast', crop_param='vegetableName')
+@require_GET
+async def combined_price_forecast(request):
     """
     Endpoint รวมข้อมูล Historical และ Predicted
     พร้อมคำนวณ Overall Summary:
@@ -64,207 +80,201 @@ def combined_price_forecast(request):
         ไม่มีก็ใช้ predicted
       - volatility_percent: คำนวณจากข้อมูล historical (ถ้ามี) ไม่มีก็ใช้ predictedแทน
       - price_change_percent: คำนวณจากราคาที่ใกล้เคียง start_date และ end_date
+    ?format=columnar: ส่งเป็น array ขนานกันตามแกนวันที่ (ดู _columnar_payload) แทน list ของ dict
+    ?max_points=N (&downsample=lttb|bucket): ลดจุดของแต่ละ series ให้ไม่เกิน N จุด (summary ยังคำนวณจากข้อมูลทั้งหมด)
+    async view: ถ้าพืชยังไม่อยู่ใน series store ราคาจริงและค่าพยากรณ์ถูก query พร้อมกัน
     """
+    response_format = requested_format(request, SERIES_FORMATS)
+    if response_format is None:
+        return json_response({"detail": "Not found."}, status=404)
+
     # รับ query parameter
     vegetable_name = request.GET.get('vegetableName')
     start_date_str = request.GET.get('startDate')
     end_date_str = request.GET.get('endDate')
     
     if not (vegetable_name and start_date_str and end_date_str):
-        return Response({"error": "Missing parameters"}, status=400)
+        return json_response({"error": "Missing parameters"}, status=400)
     
     # แปลงวันที่
     start_date = parse_date(start_date_str)
     end_date = parse_date(end_date_str)
     if not (start_date and end_date):
-        return Response({"error": "Invalid date format"}, status=400)
+        return json_response({"error": "Invalid date format"}, status=400)
+    try:
+        max_points, downsample = parse_downsample(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
     
-    # ทำความสะอาดชื่อพืชและหา Crop Object
+    # ทำความสะอาดชื่อพืชและหา Crop Object (ดัชนีอาจต้องโหลดใหม่จากฐานข้อมูล จึงรันผ่าน sync_to_async)
     vegetable_name_clean = vegetable_name.strip()
-    crop_obj = Crop.objects.filter(crop_name__icontains=vegetable_name_clean).first()
+    crop_obj = await sync_to_async(resolve_crop)(vegetable_name_clean)
     if not crop_obj:
-        return Response({"error": "Crop not found"}, status=404)
+        return json_response({"error": "Crop not found"}, status=404)
     
+    series = (await aget_series([crop_obj.crop_id]))[crop_obj.crop_id]
+    return json_response(_series_payload(
+        crop_obj, series, start_date, end_date, max_points, downsample,
+        columnar=response_format == "columnar",
+    ))
+
+# จำนวนพืชสูงสุดต่อหนึ่ง request ของ batch-priceforecast
+MAX_BATCH_CROPS = 50
+
+def _batch_crops(request):
+    """
+    อ่านรายการพืชจาก ?crop_id= และ ?vegetableName= (ระบุซ้ำได้ / crop_id คั่นด้วย , ได้)
+    คืนค่า (list ของ Crop ตามลำดับที่ขอ ไม่ซ้ำกัน, list ของค่าที่หาไม่พบ)
+    """
+    crop_ids = [value for raw in request.GET.getlist('crop_id') for value in map(str.strip, raw.split(',')) if value]
+    return resolve_crop_list(crop_ids, request.GET.getlist('vegetableName'))
+
+@replica_reads
+@cached_response('batch_price_forecast', scopes=[SCOPE_CATALOG], crops_from=lambda request: _batch_crops(request)[0])
+@require_GET
+async def batch_price_forecast(request):
+    """
+    ข้อมูลแบบเดียวกับ combined-priceforecast ของหลายพืชใน request เดียว (สำหรับหน้าเปรียบเทียบ)
+      - crop_id / vegetableName: พืชที่ต้องการ ระบุซ้ำได้ (ไม่เกิน MAX_BATCH_CROPS ชนิด)
+      - startDate, endDate, max_points, downsample, format=columnar: เหมือน combined-priceforecast
+    ข้อมูลมาจาก crops/series_store.py (query เฉพาะพืชที่ยังไม่อยู่ในหน่วยความจำหรือข้อมูลเปลี่ยนแล้ว
+    ราคาจริงและค่าพยากรณ์ของทุกพืชที่ต้องโหลดถูก query พร้อมกัน)
+    ส่งกลับ {"series": [ข้อมูลของแต่ละพืชตามลำดับที่ขอ], "not_found": [ค่าที่หาพืชไม่พบ]}
+    """
+    response_format = requested_format(request, SERIES_FORMATS)
+    if response_format is None:
+        return json_response({"detail": "Not found."}, status=404)
+
+    start_date_str = request.GET.get('startDate')
+    end_date_str = request.GET.get('endDate')
+    crops, not_found = await sync_to_async(_batch_crops)(request)
+    if not (start_date_str and end_date_str) or not (crops or not_found):
+        return json_response({"error": "Missing parameters"}, status=400)
+    try:
+        start_date = parse_date(start_date_str)
+        end_date = parse_date(end_date_str)
+    except ValueError:
+        # รูปแบบถูกแต่ไม่ใช่วันที่จริง เช่น 2024-13-01
+        start_date = end_date = None
+    if not (start_date and end_date):
+        return json_response({"error": "Invalid date format"}, status=400)
+    if len(crops) > MAX_BATCH_CROPS:
+        return json_response({"error": f"ขอได้ไม่เกิน {MAX_BATCH_CROPS} พืชต่อครั้ง"}, status=400)
+    try:
+        max_points, downsample = parse_downsample(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+
+    series = await aget_series([crop.crop_id for crop in crops])
+    columnar = response_format == "columnar"
+    return json_response({
+        "series": [
+            _series_payload(
+                crop, series[crop.crop_id], start_date, end_date, max_points, downsample,
+                columnar=columnar, with_crop=True,
+            )
+            for crop in crops
+        ],
+        "not_found": not_found,
+    })
+
+def _series_payload(crop_obj, series, start_date, end_date,
+                    max_points=None, downsample="lttb", columnar=False, with_crop=False):
+    """
+    สร้างข้อมูลตอบกลับของพืชหนึ่งชนิด (ใช้ร่วมกันระหว่าง combined-priceforecast และ batch-priceforecast)
+    series: CropSeries ของพืชนี้ ตัดช่วงวันที่ ลดจำนวนจุด และสรุปบน array ทั้งหมด แปลงเป็น list ตอนท้ายครั้งเดียว
+    with_crop=True เพิ่ม "crop" ในรูปแบบปกติด้วย (รูปแบบ columnar มีอยู่แล้ว)
+    """
     crop_name = crop_obj.crop_name
-    
-    # Query historical data จาก CropVariable
-    historical_qs = CropVariable.objects.filter(
-        crop=crop_obj,
-        date__gte=start_date,
-        date__lte=end_date
-    ).values('date', 'average_price', 'min_price', 'max_price').order_by('date')
-    
-    # Query predicted data จาก PredictedData
-    predicted_qs = PredictedData.objects.filter(
-        crop=crop_obj,
-        predicted_date__gte=start_date,
-        predicted_date__lte=end_date
-    ).values('predicted_date', 'predicted_price')
-    
-    # สร้าง list สำหรับ Historical
+    hist_days, low, high, average = series.history(start_date, end_date)
+    pred_days, predicted = series.forecast(start_date, end_date)
+
+    # combined: ราคาจริงทุกวัน ต่อด้วยราคาพยากรณ์เฉพาะวันที่หลังวันสุดท้ายของราคาจริง
+    after_history = pred_days > hist_days[-1] if len(hist_days) else slice(None)
+    combined_days = np.concatenate([hist_days, pred_days[after_history]])
+    combined_prices = np.concatenate([average, predicted[after_history]])
+
+    # ลดจำนวนจุดเฉพาะข้อมูลที่ส่งออก (columnar "combined" และ summary ยังใช้ข้อมูลครบ)
+    hist_days, hist = downsample_series(
+        hist_days, {"min_price": low, "max_price": high, "price": average}, max_points, downsample, "price",
+        {"min_price": "min", "max_price": "max", "price": "mean"},
+    )
+    pred_days, pred = downsample_series(
+        pred_days, {"price": predicted}, max_points, downsample, "price", {"price": "mean"}
+    )
+
+    # Overall Summary คำนวณจาก array ของช่วงวันที่ทั้งหมด (crops/api/summary.py)
+    overall = overall_summary(series_summary(series, start_date, end_date))
+
+    if columnar:
+        return _columnar_payload(crop_obj, hist_days, hist, pred_days, pred, combined_days, combined_prices, overall)
+
     historical = [
-        {
-            "crop_name": crop_name,
-            "date": str(item['date']),
-            "min_price": float(item['min_price']),
-            "max_price": float(item['max_price']),
-            "price": float(item['average_price']),
-            "type": "historical"
-        }
-        for item in historical_qs
+        {"crop_name": crop_name, "date": day, "min_price": low_price, "max_price": high_price,
+         "price": price, "type": "historical"}
+        for day, low_price, high_price, price in zip(
+            day_strings(hist_days), hist["min_price"].tolist(), hist["max_price"].tolist(), hist["price"].tolist()
+        )
     ]
-    
-    # สร้าง list สำหรับ Predicted
-    predicted = [
-        {
-            "crop_name": crop_name,
-            "date": str(item['predicted_date']),
-            "price": float(item['predicted_price']),
-            "type": "predicted"
-        }
-        for item in predicted_qs
+    forecasts = [
+        {"crop_name": crop_name, "date": day, "price": price, "type": "predicted"}
+        for day, price in zip(day_strings(pred_days), pred["price"].tolist())
     ]
-    
+    combined_days, combined = downsample_series(
+        combined_days, {"combined_price": combined_prices}, max_points, downsample,
+        "combined_price", {"combined_price": "mean"},
+    )
+    combined_price_list = [
+        {"crop_name": crop_name, "date": day, "combined_price": price}
+        for day, price in zip(day_strings(combined_days), combined["combined_price"].tolist())
+    ]
+
     # รวมข้อมูลทั้งสองชุด แล้วเรียงลำดับตามวันที่
-    combined = historical + predicted
-    combined.sort(key=lambda x: (x['date'], 0 if x['type'] == "historical" else 1))
-    
-    # สร้าง combined_price_list โดยรวมราคาจาก historical และเพิ่ม predicted สำหรับวันที่หลังสุดของ historical
-    last_hist_date = None
-    if historical:
-        last_hist_date = max(parse_date(item['date']) for item in historical)
-    
-    combined_price_dict = {}
-    for item in historical:
-        combined_price_dict[item['date']] = float(item['price'])
-    for item in predicted:
-        p_date = parse_date(item['date'])
-        if last_hist_date is None or p_date > last_hist_date:
-            combined_price_dict[item['date']] = float(item['price'])
-    
-    combined_price_list = []
-    for date_str in sorted(combined_price_dict.keys()):
-        combined_price_list.append({
-            "crop_name": crop_name,
-            "date": date_str,
-            "combined_price": combined_price_dict[date_str]
-        })
-    
-    # ---------------------------------------------------
-    # คำนวณ Overall Summary
-    # ---------------------------------------------------
-    # หากมี historical data ให้ใช้ historical_qs; ถ้าไม่มีใช้ predicted_qs
-    if historical_qs.exists():
-        data_source = list(historical_qs)
-        avg_prices = [float(item['average_price']) for item in data_source if item['average_price'] is not None]
-        min_prices = [float(item['min_price']) for item in data_source if item['min_price'] is not None]
-        max_prices = [float(item['max_price']) for item in data_source if item['max_price'] is not None]
-        prices_for_vol = [
-            {"date": item['date'], "price": float(item['average_price'])}
-            for item in data_source if item['average_price'] is not None
-        ]
-    elif predicted_qs.exists():
-        data_source = list(predicted_qs)
-        avg_prices = [float(item['predicted_price']) for item in data_source if item['predicted_price'] is not None]
-        # ไม่มี min/max แยกใน predicted, ใช้ predicted_price ทั้งหมด
-        min_prices = avg_prices[:]  # copy list
-        max_prices = avg_prices[:]
-        prices_for_vol = [
-            {"date": item['predicted_date'], "price": float(item['predicted_price'])}
-            for item in data_source if item['predicted_price'] is not None
-        ]
-    else:
-        avg_prices = []
-        min_prices = []
-        max_prices = []
-        prices_for_vol = []
-    
-    overall_avg = sum(avg_prices) / len(avg_prices) if avg_prices else 0.0
-    overall_min = min(min_prices) if min_prices else 0.0
-    overall_max = max(max_prices) if max_prices else 0.0
-    
-    volatility_percent = 0.0
-    if len(prices_for_vol) >= 2:
-        volatility_percent = _calculate_volatility_from_prices(prices_for_vol)
-    
-    # คำนวณ Price Change Percent จากราคาที่ใกล้เคียง start_date และ end_date
-    start_price = _get_closest_price(crop_obj, start_date)
-    end_price = _get_closest_price(crop_obj, end_date)
-    price_change_percent = 0.0
-    if start_price != 0:
-        price_change_percent = ((end_price - start_price) / start_price) * 100
-    
-    overall_summary = {
-        "overall_average": round(overall_avg, 2),
-        "overall_min": round(overall_min, 2),
-        "overall_max": round(overall_max, 2),
-        "volatility_percent": round(volatility_percent, 2),
-        "price_change_percent": round(price_change_percent, 2)
+    results = historical + forecasts
+    results.sort(key=lambda x: (x['date'], 0 if x['type'] == "historical" else 1))
+
+    payload = {
+        "results": results,
+        "combined": combined_price_list,
+        "overall_summary": overall
     }
-    
-    return JsonResponse(
-        {
-            "results": combined,
-            "combined": combined_price_list,
-            "overall_summary": overall_summary
-        },
-        json_dumps_params={'ensure_ascii': False},
-        charset='utf-8',
-    )
+    if with_crop:
+        payload = {"crop": _crop_meta(crop_obj), **payload}
+    return payload
 
-def _calculate_volatility_from_prices(prices):
-    """
-    คำนวณความผันผวน (Volatility) จากข้อมูลราคาที่ได้รับ
-    ขั้นตอน:
-      1. เรียงข้อมูลตามวันที่
-      2. คำนวณผลตอบแทนรายวัน = (price[i] - price[i-1]) / price[i-1]
-      3. คำนวณ Standard Deviation ของผลตอบแทน
-      4. แปลงเป็นเปอร์เซ็นต์
-    """
-    if len(prices) < 2:
-        return 0.0
-    sortedPrices = sorted(prices, key=lambda x: x["date"])
-    returns = []
-    for i in range(1, len(sortedPrices)):
-        prev_price = sortedPrices[i-1]["price"]
-        curr_price = sortedPrices[i]["price"]
-        if prev_price > 0:
-            returns.append((curr_price - prev_price) / prev_price)
-    if len(returns) < 2:
-        return 0.0
-    avg_return = sum(returns) / len(returns)
-    variance = sum((r - avg_return) ** 2 for r in returns) / (len(returns) - 1)
-    volatility = math.sqrt(variance)
-    return volatility * 100
-
-def _get_closest_price(crop_obj, target_date):
+def _crop_meta(crop_obj):
+    return {"crop_id": crop_obj.crop_id, "crop_name": crop_obj.crop_name, "unit": crop_obj.unit}
+
+def _lookup(axis, days, values):
+    """ ค่าของ values ในแต่ละวันของ axis (None ถ้าวันนั้นไม่มีใน days) """
+    if not len(days):
+        return [None] * len(axis)
+    positions = np.minimum(np.searchsorted(days, axis), len(days) - 1)
+    found = (days[positions] == axis).tolist()
+    return [value if hit else None for value, hit in zip(values[positions].tolist(), found)]
+
+def _columnar_payload(crop_obj, hist_days, hist, pred_days, pred, combined_days, combined_prices, summary):
     """
-    หา average_price ของ CropVariable ที่ใกล้ target_date ที่สุด
-    โดยพิจารณาทั้งข้อมูลก่อนและหลัง target_date แล้วเลือกอันที่ใกล้ที่สุด
+    รูปแบบ columnar: ข้อมูลพืชส่งครั้งเดียว และทุก array ใน series ยาวเท่ากับ dates (วันที่เรียงจากน้อยไปมาก)
+      - min / max / avg: ราคาจริง (null ถ้าวันนั้นไม่มีข้อมูลจริง)
+      - predicted: ราคาพยากรณ์ (null ถ้าไม่มี)
+      - combined: ราคาเดียวกับ "combined" ของรูปแบบปกติ (null ถ้าวันนั้นไม่อยู่ในชุดนั้น)
+    hist / pred คือข้อมูลที่ใช้สร้าง "results" (หลังลดจำนวนจุดแล้ว) ส่วน combined เป็นข้อมูลครบ
     """
-    before_or_equal = CropVariable.objects.filter(
-        crop=crop_obj,
-        date__lte=target_date
-    ).order_by('-date').first()
-    
-    after = CropVariable.objects.filter(
-        crop=crop_obj,
-        date__gte=target_date
-    ).order_by('date').first()
-    
-    candidate = None
-    if before_or_equal and after:
-        diff_before = abs((target_date - before_or_equal.date).days)
-        diff_after = abs((after.date - target_date).days)
-        candidate = before_or_equal if diff_before <= diff_after else after
-    elif before_or_equal:
-        candidate = before_or_equal
-    elif after:
-        candidate = after
-    
-    if candidate:
-        return float(candidate.average_price or 0.0)
-    return 0.0
+    axis = np.union1d(hist_days, pred_days)
+    return {
+        "format": "columnar",
+        "crop": _crop_meta(crop_obj),
+        "series": {
+            "dates": day_strings(axis),
+            "min": _lookup(axis, hist_days, hist["min_price"]),
+            "max": _lookup(axis, hist_days, hist["max_price"]),
+            "avg": _lookup(axis, hist_days, hist["price"]),
+            "predicted": _lookup(axis, pred_days, pred["price"]),
+            "combined": _lookup(axis, combined_days, combined_prices),
+        },
+        "overall_summary": summary,
+    }
 
 # --------------------------------------------------
 # One-time migration endpoint to re-upload local images to Cloudinary
@@ -340,6 +350,7 @@ def migrate_images(request):
     media_root = settings.MEDIA_ROOT  # โฟลเดอร์ media ของคุณ
 
     for filename, veg_name in FILE_MAP.items():
+        # บันทึกรูปลง Crop จึงอ่านจากฐานข้อมูลโดยตรง ไม่ใช้สำเนาจากดัชนีชื่อพืชที่อาจค้างอยู่
         crop = Crop.objects.filter(crop_name=veg_name).first()
         if not crop:
             results.append({'file': filename, 'vegetable': veg_name, 'status': 'crop not found'})
@@ -371,4 +382,11 @@ def debug_storage(request):
     """
     return Response({
         'default_storage': default_storage.__class__.__name__
-    })
\ No newline at end of file
+    })
+
+@api_view(['GET'])
+def cache_stats(request):
+    """
+    ตัวนับ hit/miss ของ response cache ใน process นี้
+    """
+    return Response(response_cache.stats())
@@ -5,3 +5,6 @@ class CropsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crops'
 
+    def ready(self):
+        # ลงทะเบียน signal ที่ล้างดัชนีชื่อพืชเมื่อ Crop เปลี่ยน
+        from . import signals  # noqa: F401
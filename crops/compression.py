@@ -0,0 +1,120 @@
+# crops/compression.py
+# บีบอัด response ของ API ตาม Accept-Encoding ของ client (Brotli ถ้ารองรับ ไม่เช่นนั้น gzip)
+#   - CompressionMiddleware บีบอัด response JSON ของ API ที่ยาวเกิน COMPRESSION_MIN_SIZE
+#   - response_cache เก็บ bytes ที่บีบอัดแล้วไว้กับรายการใน cache: request ถัดไปไม่ต้อง serialize และบีบอัดซ้ำ
+# ไฟล์ static ยังใช้ไฟล์ที่ WhiteNoise บีบอัดไว้ล่วงหน้าตามเดิม
+
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Brotli ไม่บังคับ (ใช้ gzip อย่างเดียว)
+    brotli = None
+
+# เฉพาะ JSON ของ API (JSONRenderer / FastJSONRenderer / json_response) ไม่บีบอัดหน้า HTML (เช่น admin)
+# ที่มี CSRF token ปนกับข้อมูลที่ผู้ใช้ส่งมา เพื่อกันการเดา token จากขนาด body ที่บีบอัดแล้ว (BREACH)
+COMPRESSIBLE_TYPES = ("application/json",)
+
+
+def _accepted_encodings(header):
+    """ แปลง Accept-Encoding เป็น {encoding: q} เช่น "br;q=0.9, gzip" -> {"br": 0.9, "gzip": 1.0} """
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(request):
+    """ encoding ที่จะใช้กับ request นี้ ("br" / "gzip") หรือ None ถ้าไม่บีบอัด (q เท่ากันเลือก br) """
+    if not getattr(settings, "COMPRESSION_ENABLED", True):
+        return None
+    accepted = _accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    best, best_quality = None, 0.0
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(content_type, size):
+    return size >= getattr(settings, "COMPRESSION_MIN_SIZE", 512) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(content, encoding, cached=False):
+    """
+    บีบอัด bytes ด้วย encoding ที่เลือก
+    cached=True ใช้ระดับของ payload ที่เก็บใน cache (บีบอัดครั้งเดียวแต่ส่งซ้ำหลายครั้ง จึงใช้ระดับสูงกว่าได้)
+    """
+    if encoding == "br":
+        if cached:
+            return brotli.compress(content, quality=getattr(settings, "COMPRESSION_CACHED_BROTLI_LEVEL", 9))
+        return brotli.compress(content, quality=getattr(settings, "COMPRESSION_BROTLI_LEVEL", 4))
+    level = getattr(settings, "COMPRESSION_CACHED_GZIP_LEVEL", 9) if cached else getattr(settings, "COMPRESSION_GZIP_LEVEL", 6)
+    # mtime=0 ให้ผลลัพธ์เหมือนกันทุกครั้งสำหรับเนื้อหาเดียวกัน
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def set_encoded_content(response, content, encoding):
+    """ ใส่ body ที่บีบอัดแล้วพร้อม header ที่เกี่ยวข้อง """
+    response.content = content
+    response["Content-Length"] = str(len(content))
+    response["Content-Encoding"] = encoding
+    # bytes ต่างจากต้นฉบับ ETag จึงเป็น weak (เหมือน GZipMiddleware ของ Django)
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response["ETag"] = "W/" + etag
+    return response
+
+
+class CompressionMiddleware:
+    """
+    บีบอัด response ที่ยังไม่ได้บีบอัด (ข้าม streaming response และไฟล์ไบนารีอย่าง xlsx / parquet)
+    วางไว้ใต้ WhiteNoiseMiddleware เพื่อไม่ยุ่งกับไฟล์ static รองรับทั้ง WSGI และ ASGI
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+        if not compressible(content_type, len(response.content)):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        return set_encoded_content(response, compressed, encoding)
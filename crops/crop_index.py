@@ -0,0 +1,160 @@
+# crops/crop_index.py
+# ดัชนีชื่อพืชในหน่วยความจำ (ต่อ process) สำหรับหา Crop จากชื่อหรือ id โดยไม่ต้อง query
+# ถูกล้างอัตโนมัติเมื่อ Crop ถูกเพิ่ม/แก้ไข/ลบ (crops/signals.py) และหมดอายุตาม CROP_INDEX_TTL
+# เพื่อให้ process อื่น (เช่น import worker) เห็นพืชที่ถูกเพิ่มจากที่อื่นด้วย
+
+import copy
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Crop
+
+# อักขระที่มองไม่เห็นซึ่งมักติดมากับชื่อที่ copy มาจากเว็บ
+_INVISIBLE = re.compile("[\u200b\u200c\u200d\ufeff]")
+
+# คำค้นที่ไม่พบจะโหลดดัชนีใหม่ได้ไม่บ่อยกว่านี้ (วินาที) กันไม่ให้ชื่อที่ไม่มีจริงทำให้ query ทุก request
+_MISS_RELOAD_SECONDS = 30
+
+_lock = threading.Lock()
+_cached = None          # CropIndex ล่าสุด
+_cached_at = 0.0
+_last_miss_reload = 0.0
+
+
+def normalize_crop_name(name):
+    """ ทำชื่อพืชให้อยู่ในรูปเดียวกันก่อนเทียบ: NFC, ตัดอักขระล่องหน, ยุบช่องว่าง, ไม่สนตัวพิมพ์เล็ก/ใหญ่ """
+    name = unicodedata.normalize("NFC", name or "")
+    name = _INVISIBLE.sub("", name)
+    return " ".join(name.split()).casefold()
+
+
+class CropIndex:
+    """
+    ดัชนีของพืชทั้งหมด หาได้ 3 ระดับตามลำดับ
+      1) exact: ชื่อตรงกันหลัง normalize
+      2) prefix: ชื่อที่ขึ้นต้นด้วยคำค้น
+      3) substring: ชื่อที่มีคำค้นอยู่ข้างใน
+    ในระดับเดียวกันเลือกชื่อที่สั้นที่สุด (ใกล้คำค้นที่สุด) แล้วจึง crop_id ที่น้อยกว่า จึงได้ผลเดิมทุกครั้ง
+    """
+
+    def __init__(self, crops):
+        self._by_id = {crop.crop_id: crop for crop in crops}
+        self._by_name = {crop.crop_name: crop for crop in crops}
+        self._by_normalized = {}
+        # เรียงครั้งเดียวตอนสร้าง การค้น prefix/substring จึงหยุดที่ตัวแรกที่เจอได้เลย
+        self._ranked = sorted(
+            ((normalize_crop_name(crop.crop_name), crop) for crop in crops),
+            key=lambda item: (len(item[0]), item[1].crop_id),
+        )
+        for normalized, crop in self._ranked:
+            self._by_normalized.setdefault(normalized, crop)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @staticmethod
+    def _copy(crop):
+        # คืนสำเนาเพื่อไม่ให้ผู้เรียกแก้ instance ที่อยู่ใน cache
+        return copy.copy(crop) if crop is not None else None
+
+    def get(self, crop_id):
+        """ หา Crop จาก crop_id """
+        try:
+            return self._copy(self._by_id.get(int(crop_id)))
+        except (TypeError, ValueError):
+            return None
+
+    def exact(self, crop_name):
+        """ หา Crop ที่ชื่อตรงกันทุกตัวอักษร (ไม่ normalize) """
+        return self._copy(self._by_name.get(crop_name))
+
+    def crop_ids(self, crop_names):
+        """ คืน dict {crop_name: crop_id} เฉพาะชื่อที่มีอยู่แล้ว (เทียบชื่อแบบตรงตัว เหมือน crop_name__in) """
+        return {name: self._by_name[name].crop_id for name in crop_names if name in self._by_name}
+
+    def resolve(self, query):
+        """ หา Crop ที่ตรงกับคำค้นที่สุดตามลำดับ exact > prefix > substring หรือ None ถ้าไม่พบ """
+        needle = normalize_crop_name(query)
+        if not needle:
+            return None
+        crop = self._by_normalized.get(needle)
+        if crop is None:
+            crop = next((c for name, c in self._ranked if name.startswith(needle)), None)
+        if crop is None:
+            crop = next((c for name, c in self._ranked if needle in name), None)
+        return self._copy(crop)
+
+
+def _build_index():
+    return CropIndex(list(Crop.objects.all()))
+
+
+def crop_index():
+    """
+    คืน CropIndex ปัจจุบันของ process (สร้างใหม่เมื่อยังไม่มี, ถูกล้าง หรือเกิน CROP_INDEX_TTL วินาที)
+    ระหว่าง transaction ที่ยังไม่ commit จะสร้างดัชนีชั่วคราวโดยไม่เก็บลง cache
+    เพื่อไม่ให้พืชที่อาจถูก rollback ค้างอยู่ในดัชนี
+    """
+    global _cached, _cached_at
+    index = _cached
+    ttl = getattr(settings, 'CROP_INDEX_TTL', 300)
+    if index is not None and time.monotonic() - _cached_at < ttl:
+        return index
+    if connection.in_atomic_block:
+        return _build_index()
+    with _lock:
+        if _cached is None or time.monotonic() - _cached_at >= ttl:
+            _cached = _build_index()
+            _cached_at = time.monotonic()
+        return _cached
+
+
+def invalidate_crop_index(**kwargs):
+    """ ล้างดัชนี (ใช้เป็น signal receiver ได้) ครั้งถัดไปที่เรียก crop_index() จะสร้างใหม่ """
+    global _cached
+    with _lock:
+        _cached = None
+
+
+def resolve_crop(query):
+    """
+    หา Crop จากชื่อที่ผู้ใช้ส่งมา (แทน Crop.objects.filter(crop_name__icontains=...).first())
+    ถ้าไม่พบจะโหลดดัชนีใหม่ (ไม่เกินหนึ่งครั้งต่อ _MISS_RELOAD_SECONDS) เผื่อพืชถูกเพิ่มจาก process อื่น
+    """
+    global _last_miss_reload
+    crop = crop_index().resolve(query)
+    if crop is None and not connection.in_atomic_block:
+        now = time.monotonic()
+        if now - _last_miss_reload >= _MISS_RELOAD_SECONDS:
+            _last_miss_reload = now
+            invalidate_crop_index()
+            crop = crop_index().resolve(query)
+    return crop
+
+
+def get_crop(crop_id):
+    """ หา Crop จาก crop_id ผ่านดัชนี """
+    return crop_index().get(crop_id)
+
+
+def resolve_crop_list(crop_ids=(), crop_names=()):
+    """
+    หา Crop หลายชนิดจาก crop_id และ/หรือชื่อ (แบบเดียวกับ resolve_crop)
+    คืนค่า (list ของ Crop ตามลำดับที่ขอโดยไม่ซ้ำ, list ของค่าที่หาไม่พบ)
+    """
+    index = crop_index()
+    wanted = [(crop_id, index.get(crop_id)) for crop_id in crop_ids]
+    wanted += [(name, resolve_crop(name)) for name in crop_names]
+    crops, not_found, seen = [], [], set()
+    for value, crop in wanted:
+        if crop is None:
+            not_found.append(value)
+        elif crop.crop_id not in seen:
+            seen.add(crop.crop_id)
+            crops.append(crop)
+    return crops, not_found
@@ -0,0 +1,183 @@
+# crops/db_router.py
+# แยกฐานข้อมูลอ่าน/เขียน: endpoint ฝั่งอ่านที่ครอบด้วย replica_reads / ReplicaReadMixin อ่านจาก alias "replica"
+# (ถ้าตั้ง REPLICA_DATABASE_URL) ส่วนอื่นทั้งหมด (นำเข้าราคา, พยากรณ์, admin, worker, management command)
+# อ่านและเขียนที่ฐานข้อมูลหลัก (default) เสมอ
+#   - ระหว่าง transaction บนฐานข้อมูลหลัก การอ่านจะกลับไปที่ฐานข้อมูลหลัก (เห็นสิ่งที่เพิ่งเขียนใน transaction นั้น)
+#   - read-your-writes: request ที่เขียนฐานข้อมูลจะได้ cookie read_primary อายุ REPLICA_PIN_SECONDS วินาที
+#     request ถัดไปของ client นั้นจึงอ่านจากฐานข้อมูลหลัก (replica อาจยังตามไม่ทัน)
+#     client ที่ไม่ใช้ cookie ส่ง header X-Read-Primary: 1 แทนได้
+# สถานะเก็บใน ContextVar จึงแยกกันต่อ thread / ต่อ task ของ async view
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = "replica"
+PIN_COOKIE = "read_primary"
+PRIMARY_HEADER = "X-Read-Primary"
+
+_read_alias = ContextVar("read_alias", default=None)       # None = อ่านจากฐานข้อมูลหลัก
+_write_marker = ContextVar("write_marker", default=None)   # _WriteMarker ของ request ปัจจุบัน (ตั้งโดย middleware)
+
+
+class _WriteMarker:
+    wrote = False
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def reading_from_replica():
+    """ True ถ้าการอ่านใน context นี้ถูกส่งไปที่ replica """
+    return _read_alias.get() is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def _reads_from(alias):
+    token = _read_alias.set(None if alias == DEFAULT_DB_ALIAS else alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def read_from_replica():
+    """ ให้การอ่านภายใน block ไปที่ replica (ไม่มี replica = ฐานข้อมูลหลักตามเดิม) """
+    return _reads_from(REPLICA_ALIAS if replica_configured() else DEFAULT_DB_ALIAS)
+
+
+def use_primary():
+    """ บังคับให้การอ่านภายใน block ไปที่ฐานข้อมูลหลัก แม้จะอยู่ใน endpoint ฝั่งอ่าน """
+    return _reads_from(DEFAULT_DB_ALIAS)
+
+
+def wants_primary(request):
+    """ client ขออ่านจากฐานข้อมูลหลัก (เพิ่งเขียนข้อมูลเอง หรือส่ง header มา) """
+    return request.headers.get(PRIMARY_HEADER) == "1" or request.COOKIES.get(PIN_COOKIE) == "1"
+
+
+def request_read_alias(request):
+    """ ฐานข้อมูลที่ view ฝั่งอ่านของ request นี้ใช้อ่าน """
+    if not replica_configured() or wants_primary(request):
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS
+
+
+@contextmanager
+def _read_view(request):
+    """ context ของ view ฝั่งอ่าน คืนค่า alias ที่ใช้อ่าน """
+    alias = request_read_alias(request)
+    # การเขียนระหว่าง view ฝั่งอ่าน (เช่นเก็บ PriceSnapshot ที่คำนวณแล้ว) ไม่ใช่ข้อมูลที่ client เขียน จึงไม่ pin
+    token = _write_marker.set(None)
+    try:
+        with _reads_from(alias):
+            yield alias
+    finally:
+        _write_marker.reset(token)
+
+
+def replica_reads(view):
+    """
+    decorator สำหรับ function view ฝั่งอ่าน (วางไว้นอกสุด เหนือ cached_response) ใช้กับ async view ได้
+    ให้ query ทั้งหมดของ view รวมถึงการเช็คเวอร์ชันข้อมูลของ cache ไปที่ replica
+    response มี header X-Read-Database บอกว่าอ่านจากฐานข้อมูลไหน
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with _read_view(request) as alias:
+                response = await view(request, *args, **kwargs)
+            response["X-Read-Database"] = alias
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with _read_view(request) as alias:
+            response = view(request, *args, **kwargs)
+        response["X-Read-Database"] = alias
+        return response
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """ mixin สำหรับ DRF viewset ฝั่งอ่าน (ทำแบบเดียวกับ replica_reads) """
+
+    def dispatch(self, request, *args, **kwargs):
+        with _read_view(request) as alias:
+            response = super().dispatch(request, *args, **kwargs)
+        response["X-Read-Database"] = alias
+        return response
+
+
+class PrimaryReplicaRouter:
+    """
+    DATABASE_ROUTERS: เขียนที่ default เสมอ อ่านที่ replica เฉพาะใน read_from_replica()
+    migration รันที่ฐานข้อมูลหลักเท่านั้น (replica ได้ schema ผ่านการ replicate)
+    """
+
+    def db_for_read(self, model, **hints):
+        # ตอบ default ชัดเจน (ไม่คืน None) เพื่อไม่ให้ Django ตาม instance ที่โหลดมาจาก replica ไปอ่านที่ replica
+        return REPLICA_ALIAS if reading_from_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        marker = _write_marker.get()
+        if marker is not None:
+            marker.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # ข้อมูลชุดเดียวกัน: object จาก replica ใช้เป็น foreign key ของแถวที่เขียนลงฐานข้อมูลหลักได้
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA_ALIAS else None
+
+
+class ReadYourWritesMiddleware:
+    """
+    ตั้ง cookie read_primary ให้ client ที่ request นี้เขียนฐานข้อมูล (เฉพาะเมื่อมี replica)
+    รองรับทั้ง WSGI และ ASGI (ไม่บังคับให้ request ของ async view ต้องรันใน thread)
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        marker = _WriteMarker()
+        token = _write_marker.set(marker)
+        try:
+            response = self.get_response(request)
+        finally:
+            _write_marker.reset(token)
+        return self._pin(response, marker)
+
+    async def __acall__(self, request):
+        marker = _WriteMarker()
+        token = _write_marker.set(marker)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _write_marker.reset(token)
+        return self._pin(response, marker)
+
+    @staticmethod
+    def _pin(response, marker):
+        if marker.wrote and replica_configured():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=getattr(settings, "REPLICA_PIN_SECONDS", 10), httponly=True, samesite="Lax",
+            )
+        return response
@@ -0,0 +1,83 @@
+# crops/forecast_runs.py
+# เก็บผลพยากรณ์เป็นรอบ (ForecastRun): แถวของรอบใหม่ถูก insert ด้วย bulk insert ครั้งเดียว
+# แล้วเปลี่ยนตัวชี้ CurrentForecast ของพืชไปที่รอบนั้นใน transaction เดียวกัน
+# ผู้อ่านจึงเห็นค่าพยากรณ์ของรอบเก่าหรือรอบใหม่ทั้งชุดเสมอ และรอบเก่าลบทิ้งได้ทั้งรอบ (prune_forecast_runs)
+
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import CurrentForecast, ForecastRun, PredictedData
+from .response_cache import bump_versions, crop_scope
+
+INSERT_BATCH_SIZE = 1000
+
+
+def current_predictions():
+    """ queryset ของ PredictedData เฉพาะรอบปัจจุบันของแต่ละพืช (ใช้กับทุกจุดที่อ่านค่าพยากรณ์) """
+    return PredictedData.objects.filter(run_id__in=CurrentForecast.objects.values('run_id'))
+
+
+def model_version(model_path):
+    """ เวอร์ชันของโมเดลจากชื่อไฟล์และเวลาแก้ไขไฟล์ เช่น "cabbage.joblib@2025-03-01T10:00:00" """
+    modified = datetime.fromtimestamp(os.path.getmtime(model_path)).replace(microsecond=0)
+    return f"{os.path.basename(model_path)}@{modified.isoformat()}"
+
+
+def save_forecast_run(crop, forecast, version, data_watermark=None):
+    """
+    บันทึกผลพยากรณ์หนึ่งรอบของพืชแล้วตั้งเป็นรอบปัจจุบัน
+      - forecast: iterable ของ (date, predicted_price) ไม่ซ้ำวัน
+      - version: เวอร์ชันของโมเดล (ดู model_version), data_watermark: วันที่ล่าสุดของราคาที่ใช้พยากรณ์
+    รอบเก่าเกิน FORECAST_RUNS_KEEP รอบของพืชนี้จะถูกลบหลัง commit
+    คืนค่า ForecastRun ที่สร้าง
+    """
+    rows = sorted(forecast)
+    with transaction.atomic():
+        run = ForecastRun.objects.create(
+            crop=crop,
+            model_version=version,
+            data_watermark=data_watermark,
+            horizon_start=rows[0][0] if rows else None,
+            horizon_end=rows[-1][0] if rows else None,
+            row_count=len(rows),
+        )
+        PredictedData.objects.bulk_create(
+            [PredictedData(crop=crop, run=run, predicted_date=day, predicted_price=price) for day, price in rows],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        # เปลี่ยนตัวชี้ด้วย upsert statement เดียว (สร้างใหม่ถ้าพืชนี้ยังไม่เคยมีรอบปัจจุบัน)
+        CurrentForecast.objects.bulk_create(
+            [CurrentForecast(crop=crop, run=run)],
+            update_conflicts=True, unique_fields=['crop'], update_fields=['run', 'updated_at'],
+        )
+        # ผลพยากรณ์เปลี่ยน: เพิ่มเวอร์ชันข้อมูลของพืชนี้เพื่อไม่ให้ cache ตอบค่าเก่า
+        bump_versions([crop_scope(crop.crop_id)])
+        transaction.on_commit(lambda: prune_forecast_runs([crop.crop_id]))
+    return run
+
+
+def prune_forecast_runs(crop_ids=None, keep=None):
+    """
+    ลบรอบพยากรณ์เก่า เหลือ keep รอบล่าสุดต่อพืช (ค่าเริ่มต้น FORECAST_RUNS_KEEP) รอบปัจจุบันไม่ถูกลบเสมอ
+    แถว PredictedData ของรอบที่ลบถูกลบด้วย DELETE ... WHERE run_id IN (...) ครั้งเดียว
+    คืนค่าจำนวนรอบที่ลบ
+    """
+    keep = max(1, keep if keep is not None else getattr(settings, 'FORECAST_RUNS_KEEP', 3))
+    runs = ForecastRun.objects.all()
+    if crop_ids is not None:
+        runs = runs.filter(crop_id__in=list(crop_ids))
+    stale = list(
+        runs.annotate(
+            rank=Window(RowNumber(), partition_by=[F('crop_id')], order_by=F('run_id').desc()),
+        ).filter(rank__gt=keep).values_list('run_id', flat=True)
+    )
+    if not stale:
+        return 0
+    # กรองรอบปัจจุบันออกตอนลบ (ถ้าใส่ในเงื่อนไขข้างบน Django จะกรองก่อนจัดอันดับ ทำให้เหลือเกิน keep รอบ)
+    _, deleted = ForecastRun.objects.filter(run_id__in=stale, current_for__isnull=True).delete()
+    return deleted.get(ForecastRun._meta.label, 0)
@@ -0,0 +1,76 @@
+# crops/ingest/benchmark.py
+# วัดความเร็วการนำเข้าราคา: เวลา, rows/sec, จำนวน query และหน่วยความจำสูงสุด ของแต่ละรอบ
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+
+try:
+    import resource
+except ImportError:  # Windows ไม่มี module resource
+    resource = None
+
+
+class QueryCounter:
+    """
+    นับจำนวน statement ที่ส่งผ่าน connection ของ Django (ใช้กับ connection.execute_wrapper)
+    COPY ที่ส่งตรงผ่าน cursor ของ driver (pg_copy) ไม่ถูกนับ
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def max_rss_mb():
+    """ หน่วยความจำสูงสุดของ process นี้ตั้งแต่เริ่ม (MB) หรือ None ถ้าวัดไม่ได้ """
+    if resource is None:
+        return None
+    # Linux คืนค่าเป็น KB (macOS เป็น byte)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+@contextmanager
+def measure(trace_memory=False):
+    """
+    วัดงานใน block: yield dict ที่จะถูกเติม seconds, queries, peak_memory_mb เมื่อจบ block
+    trace_memory=True ใช้ tracemalloc วัด peak ของหน่วยความจำ Python (ช้าลง จึงเปิดเฉพาะเมื่อต้องการ)
+    """
+    stats = {}
+    counter = QueryCounter()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(counter):
+            yield stats
+    finally:
+        stats["seconds"] = round(time.perf_counter() - started, 4)
+        stats["queries"] = counter.count
+        if trace_memory:
+            stats["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+            tracemalloc.stop()
+        else:
+            stats["peak_memory_mb"] = None
+
+
+def phase_report(name, results, stats):
+    """ รวมผลรายไฟล์ของ import_price_files กับค่าที่วัดได้ เป็นหนึ่งบรรทัดของรายงาน """
+    rows = sum(r.get("row_count", 0) for r in results.values())
+    counts = {key: sum(r.get(key, 0) for r in results.values()) for key in ("inserted", "updated", "unchanged")}
+    return {
+        "phase": name,
+        "files": len(results),
+        "failed_files": sum(1 for r in results.values() if not r["success"]),
+        "rows_parsed": rows,
+        **counts,
+        **stats,
+        "rows_per_sec": round(rows / stats["seconds"], 1) if stats["seconds"] and rows else 0.0,
+        "parse_seconds": round(sum(r["parse_seconds"] for r in results.values()), 4),
+        "write_seconds": round(sum(r["write_seconds"] for r in results.values()), 4),
+    }
@@ -0,0 +1,227 @@
+# crops/ingest/jobs.py
+# คิวงานนำเข้าราคาที่เก็บในฐานข้อมูล (ไม่ต้องใช้ broker ภายนอก)
+# web สร้างงานแล้วตอบกลับทันที ส่วน worker (manage.py run_import_worker) เป็นผู้รันงาน
+# งานที่ worker หยุดไประหว่างรัน (crash / restart) จะถูกส่งกลับเข้าคิวเมื่อ heartbeat เก่าเกิน IMPORT_JOB_STALE_SECONDS
+# ระหว่างรันงาน thread แยกอัปเดต heartbeat ทุก IMPORT_JOB_HEARTBEAT_SECONDS (ไฟล์ใหญ่ที่ใช้เวลานานจึงไม่ถูกส่งกลับเข้าคิว)
+# การอัปเดตงานทุกครั้งผูกกับ attempts ของรอบที่รันอยู่ worker ที่ถูกแทนที่แล้วจึงเขียนทับผลของรอบใหม่ไม่ได้
+
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from crops.models import ImportJob
+
+from .parallel import import_price_files
+
+
+def enqueue_import(kind, folder_path, file_names, **options):
+    """ สร้างงานนำเข้าใหม่ในสถานะ queued แล้วคืน ImportJob """
+    return ImportJob.objects.create(
+        kind=kind,
+        params={"folder": folder_path, "files": list(file_names), **options},
+        files_total=len(file_names),
+    )
+
+
+def recover_stale_jobs():
+    """
+    งาน running ที่ไม่มี heartbeat นานเกิน IMPORT_JOB_STALE_SECONDS: ส่งกลับเข้าคิว (ล้างตัวนับความคืบหน้า)
+    หรือเป็น failed ถ้าถูกหยิบไปรันครบ IMPORT_JOB_MAX_ATTEMPTS ครั้งแล้ว
+    การนำเข้าเป็น upsert จึงรันไฟล์เดิมซ้ำได้ คืนค่า (จำนวนที่ส่งกลับเข้าคิว, จำนวนที่ failed)
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'IMPORT_JOB_STALE_SECONDS', 1800))
+    max_attempts = getattr(settings, 'IMPORT_JOB_MAX_ATTEMPTS', 3)
+    stale = ImportJob.objects.filter(status=ImportJob.STATUS_RUNNING).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=ImportJob.STATUS_FAILED, finished_at=now,
+        error=f"worker หยุดทำงานระหว่างนำเข้า (รันแล้ว {max_attempts} ครั้ง)",
+    )
+    requeued = stale.filter(attempts__lt=max_attempts).update(
+        status=ImportJob.STATUS_QUEUED, started_at=None, heartbeat_at=None, files_done=0,
+        rows_inserted=0, rows_updated=0, rows_unchanged=0, rows_skipped=0,
+    )
+    for count, label in ((requeued, "ส่งกลับเข้าคิว"), (failed, "เปลี่ยนเป็น failed")):
+        if count:
+            print(f"⚠️ งานนำเข้าที่ worker หยุดไประหว่างรัน {count} งาน: {label}")
+    return requeued, failed
+
+
+def _claim(job):
+    """ เปลี่ยนงานเป็น running ถ้ายังอยู่ในคิว (UPDATE แบบมีเงื่อนไข) คืน True ถ้า worker นี้ได้งาน """
+    now = timezone.now()
+    return bool(ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_QUEUED).update(
+        status=ImportJob.STATUS_RUNNING, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+    ))
+
+
+def claim_next_job():
+    """
+    หยิบงานที่รอคิวเก่าที่สุดมารัน (หลังส่งงานที่ค้างจาก worker ที่หยุดไปกลับเข้าคิว)
+    ใช้ UPDATE แบบมีเงื่อนไข status='queued' จึงไม่มี worker สองตัวได้งานเดียวกัน (ใช้ได้ทั้ง PostgreSQL และ SQLite)
+    """
+    recover_stale_jobs()
+    while True:
+        job = ImportJob.objects.filter(status=ImportJob.STATUS_QUEUED).order_by('job_id').first()
+        if job is None:
+            return None
+        if _claim(job):
+            job.refresh_from_db()
+            return job
+
+
+def _current_attempt(job):
+    """ แถวของงานนี้เฉพาะเมื่อยังเป็นรอบที่ worker นี้รันอยู่ """
+    return ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING, attempts=job.attempts)
+
+
+def summarize_results(file_names, results):
+    """ รวมผลรายไฟล์จาก import_price_files ให้เป็นสรุปเดียวกับที่ endpoint เคยตอบกลับ """
+    success_count = 0
+    overall_skipped = {}  # key: file_name, value: list of skipped record details
+    write_summary = {"inserted": 0, "updated": 0, "unchanged": 0}
+    timings = {}          # key: file_name, value: เวลาที่ใช้ parse/เขียนฐานข้อมูล
+    unchanged_files = []  # ไฟล์ที่ข้ามเพราะไม่เปลี่ยนตั้งแต่นำเข้าครั้งล่าสุด
+    errors = {}
+
+    for file_name in file_names:
+        file_result = results[file_name]
+        if file_result["success"]:
+            success_count += 1
+            for key in write_summary:
+                write_summary[key] += file_result[key]
+            if file_result["file_unchanged"]:
+                unchanged_files.append(file_name)
+        else:
+            errors[file_name] = file_result["error"]
+        overall_skipped[file_name] = file_result["skipped_records"]
+        timings[file_name] = {
+            "parse_seconds": file_result["parse_seconds"],
+            "write_seconds": file_result["write_seconds"],
+        }
+
+    return {
+        "message": f"นำเข้าข้อมูลจาก {success_count} ไฟล์สำเร็จ!",
+        "success_count": success_count,
+        "skipped_summary": overall_skipped,
+        "write_summary": write_summary,
+        "unchanged_files": unchanged_files,
+        "errors": errors,
+        "timings": timings,
+    }
+
+
+def _record_progress(job, file_result):
+    """ อัปเดตตัวนับความคืบหน้าและ heartbeat ของงานหลังจบแต่ละไฟล์ (ใช้ F() จึงไม่ต้องโหลดแถวงานขึ้นมา) """
+    _current_attempt(job).update(
+        heartbeat_at=timezone.now(),
+        files_done=F('files_done') + 1,
+        rows_inserted=F('rows_inserted') + file_result.get("inserted", 0),
+        rows_updated=F('rows_updated') + file_result.get("updated", 0),
+        rows_unchanged=F('rows_unchanged') + file_result.get("unchanged", 0),
+        rows_skipped=F('rows_skipped') + sum(r["skipped_rows"] for r in file_result["skipped_records"]),
+    )
+
+
+class _Heartbeat(threading.Thread):
+    """
+    อัปเดต heartbeat_at ของงานทุก interval วินาทีจนกว่าจะเรียก stop() (ใช้ connection ของ thread นี้เอง)
+    หยุดเองเมื่องานไม่ใช่รอบของ worker นี้แล้ว (ถูกส่งกลับเข้าคิว / worker อื่นรับไป)
+    """
+
+    def __init__(self, job, interval):
+        super().__init__(name=f"import-job-{job.pk}-heartbeat", daemon=True)
+        self.job = job
+        self.interval = interval
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            while not self.finished.wait(self.interval):
+                try:
+                    if not _current_attempt(self.job).update(heartbeat_at=timezone.now()):
+                        return
+                except DatabaseError as e:
+                    # เช่น SQLite ถูก lock ระหว่าง process หลักเขียนไฟล์: ลองใหม่รอบถัดไป
+                    print(f"⚠️ อัปเดต heartbeat ของงานนำเข้า #{self.job.pk} ไม่ได้: {e}")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def run_job(job):
+    """ รันงานนำเข้าหนึ่งงาน (ที่ถูก claim แล้ว) และบันทึกผลลัพธ์/สถานะสุดท้ายลง ImportJob """
+    heartbeat = _Heartbeat(job, getattr(settings, 'IMPORT_JOB_HEARTBEAT_SECONDS', 60))
+    heartbeat.start()
+    try:
+        _run_job(job)
+    finally:
+        heartbeat.stop()
+
+
+def _run_job(job):
+    params = job.params
+    started = time.perf_counter()
+    try:
+        results = import_price_files(
+            params["folder"],
+            params["files"],
+            workers=params.get("workers"),
+            incremental=params.get("incremental", job.kind == ImportJob.KIND_FOLDER),
+            progress=lambda file_name, file_result: _record_progress(job, file_result),
+            backend=params.get("backend", "auto"),
+        )
+        result = summarize_results(params["files"], results)
+    except Exception as e:
+        print(f"🚫 งานนำเข้า #{job.pk} ล้มเหลว: {e}")
+        _current_attempt(job).update(
+            status=ImportJob.STATUS_FAILED, error=str(e), finished_at=timezone.now()
+        )
+        return
+
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+    # งานไฟล์เดียวถือว่าล้มเหลวถ้าไฟล์นั้นนำเข้าไม่สำเร็จ
+    failed = job.kind == ImportJob.KIND_FILE and result["success_count"] == 0
+    _current_attempt(job).update(
+        status=ImportJob.STATUS_FAILED if failed else ImportJob.STATUS_DONE,
+        result=result,
+        error="; ".join(f"{name}: {error}" for name, error in result["errors"].items()),
+        finished_at=timezone.now(),
+    )
+
+
+def job_status(job):
+    """ แปลง ImportJob เป็น dict สำหรับ endpoint สถานะงาน """
+    if job.started_at is None:
+        elapsed = None
+    else:
+        elapsed = round(((job.finished_at or timezone.now()) - job.started_at).total_seconds(), 3)
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "files_total": job.files_total,
+        "files_done": job.files_done,
+        "rows_written": job.rows_inserted + job.rows_updated,
+        "rows_inserted": job.rows_inserted,
+        "rows_updated": job.rows_updated,
+        "rows_unchanged": job.rows_unchanged,
+        "skipped_rows": job.rows_skipped,
+        "elapsed_seconds": elapsed,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat(),
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "result": job.result,
+    }
@@ -0,0 +1,62 @@
+# crops/ingest/manifest.py
+
+import hashlib
+import os
+
+from crops.models import ImportManifest
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_fingerprint(file_path, with_hash=True):
+    """ คืนค่า dict {"file_size", "file_mtime", "content_hash"} ของไฟล์ (hash เป็น SHA-256) """
+    stat = os.stat(file_path)
+    fingerprint = {"file_size": stat.st_size, "file_mtime": stat.st_mtime, "content_hash": None}
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+                digest.update(chunk)
+        fingerprint["content_hash"] = digest.hexdigest()
+    return fingerprint
+
+
+def manifest_key(file_path):
+    """ key ของไฟล์ใน manifest: path เต็มที่ resolve symlink แล้ว (ชื่อไฟล์อย่างเดียวชนกันได้ระหว่างโฟลเดอร์) """
+    return os.path.realpath(file_path)
+
+
+def load_manifest(file_paths):
+    """ ดึง manifest ของไฟล์ที่ระบุด้วย query เดียว คืนค่า dict {manifest_key: ImportManifest} """
+    keys = [manifest_key(file_path) for file_path in file_paths]
+    return {m.file_path: m for m in ImportManifest.objects.filter(file_path__in=keys)}
+
+
+def detect_change(entry, file_path):
+    """
+    ตรวจว่าไฟล์เปลี่ยนไปจากการนำเข้าครั้งล่าสุดหรือไม่
+      - ขนาดและ mtime ตรงกับ manifest: ถือว่าไม่เปลี่ยน (ไม่ต้องอ่านไฟล์)
+      - ขนาดตรงแต่ mtime ต่าง: เทียบ hash ของเนื้อหา (ถ้าตรงจะอัปเดต mtime ใน manifest)
+    คืนค่า None ถ้าไฟล์ไม่เปลี่ยน มิฉะนั้นคืน fingerprint ปัจจุบันไว้บันทึกหลังนำเข้าสำเร็จ
+    """
+    if entry is not None:
+        stat = file_fingerprint(file_path, with_hash=False)
+        if stat["file_size"] == entry.file_size and stat["file_mtime"] == entry.file_mtime:
+            return None
+
+    fingerprint = file_fingerprint(file_path)
+    if (entry is not None
+            and fingerprint["file_size"] == entry.file_size
+            and fingerprint["content_hash"] == entry.content_hash):
+        entry.file_mtime = fingerprint["file_mtime"]
+        entry.save(update_fields=["file_mtime", "imported_at"])
+        return None
+    return fingerprint
+
+
+def record_import(file_path, fingerprint, row_count):
+    """ บันทึก fingerprint ของไฟล์ (ที่วัดไว้ก่อน parse) หลังนำเข้าสำเร็จ """
+    ImportManifest.objects.update_or_create(
+        file_path=manifest_key(file_path),
+        defaults={"file_name": os.path.basename(file_path), **fingerprint, "row_count": row_count},
+    )
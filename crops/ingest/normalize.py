@@ -0,0 +1,105 @@
+# crops/ingest/normalize.py
+
+import re
+
+import pandas as pd
+
+THAI_MONTHS = {
+    "ม.ค.": 1, "ก.พ.": 2, "มี.ค.": 3, "เม.ย.": 4,
+    "พ.ค.": 5, "มิ.ย.": 6, "ก.ค.": 7, "ส.ค.": 8,
+    "ก.ย.": 9, "ต.ค.": 10, "พ.ย.": 11, "ธ.ค.": 12,
+}
+THAI_DATE_PATTERN = r"(\d{1,2})\s+(" + "|".join(re.escape(m) for m in THAI_MONTHS) + r")\s+(\d{4})"
+
+# คอลัมน์ราคาในไฟล์ -> ชื่อ field ใน CropVariable
+PRICE_COLUMNS = {
+    'ราคาเฉลี่ย': 'average_price',
+    'ราคาต่ำสุด': 'min_price',
+    'ราคาสูงสุด': 'max_price',
+}
+
+REASON_MISSING_PRICE = "ข้อมูลราคาไม่สมบูรณ์"
+REASON_BAD_DATE = "แปลงวันที่ไม่ได้"
+REASON_MISSING_CROP = "ไม่มีชื่อสินค้า"
+
+
+def parse_thai_dates(raw_dates):
+    """
+    แปลง Series ของวันที่ภาษาไทย (เช่น "4 ม.ค. 2564") เป็น datetime64 ทั้งคอลัมน์ในครั้งเดียว
+    แถวที่รูปแบบไม่ถูกต้องจะได้ค่า NaT
+    """
+    parts = raw_dates.astype("string").str.extract(THAI_DATE_PATTERN)
+    return pd.to_datetime(
+        pd.DataFrame({
+            "year": parts[2].astype("float") - 543,  # แปลงปี พ.ศ. → ค.ศ.
+            "month": parts[1].map(THAI_MONTHS).astype("float"),
+            "day": parts[0].astype("float"),
+        }),
+        errors="coerce",
+    )
+
+
+def parse_prices(raw_prices):
+    """ แปลงคอลัมน์ราคาเป็นตัวเลขทั้งคอลัมน์ (ค่าที่แปลงไม่ได้จะเป็น NaN) """
+    if raw_prices.dtype == object:
+        raw_prices = raw_prices.astype("string").str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(raw_prices, errors="coerce").astype("float64")
+
+
+def normalize_price_frame(df):
+    """
+    ทำความสะอาด DataFrame ที่มีคอลัมน์ 'date', 'ชื่อสินค้า', 'ราคาเฉลี่ย', 'ราคาต่ำสุด', 'ราคาสูงสุด'
+    แบบ vectorized ทั้งหมด (ไม่วนทีละแถว)
+    คืนค่า tuple (clean, rejected)
+      - clean: คอลัมน์ crop_name, date (datetime64), average_price, min_price, max_price
+      - rejected: คอลัมน์ crop_name, date (ข้อความเดิมจากไฟล์), reason
+    """
+    crop_names = df['ชื่อสินค้า'].astype("string").str.strip()
+    raw_dates = df['date'].astype("string").str.strip()
+
+    clean = pd.DataFrame({
+        "crop_name": crop_names,
+        "date": parse_thai_dates(raw_dates),
+        **{field: parse_prices(df[col]) for col, field in PRICE_COLUMNS.items()},
+    }, index=df.index)
+
+    missing_price = clean[list(PRICE_COLUMNS.values())].isna().any(axis=1)
+    bad_date = clean["date"].isna()
+    missing_crop = crop_names.isna() | (crop_names == "")
+
+    # เหตุผลเรียงตามลำดับการตรวจสอบเดิม: ราคา -> วันที่ -> ชื่อสินค้า
+    reason = pd.Series(pd.NA, index=df.index, dtype="string")
+    reason = reason.mask(missing_crop, REASON_MISSING_CROP)
+    reason = reason.mask(bad_date, REASON_BAD_DATE)
+    reason = reason.mask(missing_price, REASON_MISSING_PRICE)
+    is_rejected = reason.notna()
+
+    rejected = pd.DataFrame({
+        "crop_name": crop_names[is_rejected],
+        "date": raw_dates[is_rejected],
+        "reason": reason[is_rejected],
+    })
+    return clean[~is_rejected].reset_index(drop=True), rejected.reset_index(drop=True)
+
+
+def frame_to_records(clean):
+    """ แปลง clean frame เป็น list ของ dict สำหรับ bulk_upsert_crop_prices (date เป็น datetime.date) """
+    return clean.assign(date=clean["date"].dt.date).to_dict("records")
+
+
+def summarize_rejected(rejected):
+    """
+    สรุปแถวที่ถูกข้ามแบบ grouped โดย (crop, date)
+    คืนค่าเป็น list ของ {"crop": ชื่อพืช, "date": วันที่, "skipped_rows": จำนวน}
+    """
+    if rejected.empty:
+        return []
+    counts = (
+        rejected.fillna({"crop_name": "", "date": ""})
+        .groupby(["crop_name", "date"], sort=False)
+        .size()
+    )
+    return [
+        {"crop": crop, "date": date_str, "skipped_rows": int(count)}
+        for (crop, date_str), count in counts.items()
+    ]
@@ -0,0 +1,113 @@
+# crops/ingest/parallel.py
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+
+from .manifest import load_manifest, manifest_key, detect_change, file_fingerprint, record_import
+from .reader import iter_price_chunks, parse_price_job, PriceFileError
+from .pg_copy import load_price_chunks
+
+
+def default_workers():
+    """ จำนวน process สำหรับ parse ไฟล์ (ตั้งค่าได้ด้วย PRICE_IMPORT_WORKERS, ค่าเริ่มต้น 1 = ไม่ใช้ pool) """
+    return max(1, int(getattr(settings, 'PRICE_IMPORT_WORKERS', 1) or 1))
+
+
+def _timed_chunks(chunks, timer):
+    """ ห่อ iterator ของ chunk เพื่อสะสมเวลาที่ใช้อ่าน/parse ไว้ใน timer["parse"] """
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            timer["parse"] += time.perf_counter() - started
+            return
+        timer["parse"] += time.perf_counter() - started
+        yield chunk
+
+
+def import_price_files(folder_path, file_names, workers=None, incremental=True, progress=None,
+                       backend="auto"):
+    """
+    นำเข้าไฟล์ราคาหลายไฟล์: parse ไฟล์แบบขนานใน process pool (workers > 1)
+    แล้วให้ process หลักเป็นผู้เขียนฐานข้อมูลเพียงคนเดียว ตามลำดับที่ parse เสร็จ
+    เมื่อ incremental=True ไฟล์ที่ไม่เปลี่ยนจาก ImportManifest จะถูกข้ามโดยไม่ parse เลย
+    คืนค่า dict {file_name: ผลลัพธ์} โดยผลลัพธ์แต่ละไฟล์มี
+      - success, error (ถ้ามี), skipped_records, inserted, updated, unchanged
+      - file_unchanged: True ถ้าข้ามไฟล์เพราะไม่เปลี่ยนตั้งแต่นำเข้าครั้งล่าสุด
+      - parse_seconds, write_seconds: เวลาที่ใช้ในแต่ละขั้น
+    progress: callable(file_name, ผลลัพธ์) ที่จะถูกเรียกทุกครั้งที่ไฟล์หนึ่งทำเสร็จ (ใช้รายงานความคืบหน้า)
+    backend: วิธีเขียนฐานข้อมูล "auto" / "copy" / "orm" (ดู load_price_chunks)
+    """
+    workers = workers or default_workers()
+    paths = {file_name: os.path.join(folder_path, file_name) for file_name in file_names}
+    results = {}
+
+    def finish(file_name, result):
+        results[file_name] = result
+        if progress is not None:
+            progress(file_name, result)
+
+    # ตรวจ manifest ก่อน: ไฟล์ที่ไม่เปลี่ยนไม่ต้องอ่าน/เขียนอะไรเลย
+    fingerprints = {}
+    manifest = load_manifest(paths.values()) if incremental else {}
+    for file_name, file_path in list(paths.items()):
+        if not os.path.exists(file_path):
+            continue
+        entry = manifest.get(manifest_key(file_path))
+        if incremental:
+            fingerprint = detect_change(entry, file_path)
+        else:
+            fingerprint = file_fingerprint(file_path)
+        if fingerprint is None:
+            finish(file_name, {"success": True, "file_unchanged": True, "skipped_records": [],
+                               "inserted": 0, "updated": 0, "unchanged": entry.row_count,
+                               "parse_seconds": 0.0, "write_seconds": 0.0})
+            del paths[file_name]
+            continue
+        fingerprints[file_name] = fingerprint
+
+    def fail(file_name, error, parse_seconds):
+        print(f"🚫 อ่านไฟล์ {file_name} ไม่ได้: {error}")
+        finish(file_name, {"success": False, "error": error, "skipped_records": [],
+                           "parse_seconds": round(parse_seconds, 4), "write_seconds": 0.0})
+
+    def write(file_name, chunks, parse_seconds=0.0):
+        timer = {"parse": parse_seconds}
+        started = time.perf_counter()
+        try:
+            summary = load_price_chunks(_timed_chunks(chunks, timer), file_name, backend)
+        except PriceFileError as e:
+            fail(file_name, str(e), timer["parse"])
+            return
+        write_seconds = time.perf_counter() - started - (timer["parse"] - parse_seconds)
+        record_import(paths[file_name], fingerprints[file_name], summary["row_count"])
+        finish(file_name, {"success": True, "file_unchanged": False, **summary,
+                           "parse_seconds": round(timer["parse"], 4),
+                           "write_seconds": round(write_seconds, 4)})
+
+    if not paths:
+        return results
+    if workers <= 1 or len(paths) <= 1:
+        # ทำทีละไฟล์: อ่านแบบ streaming แล้วเขียนทีละ chunk
+        for file_name, file_path in paths.items():
+            if file_name not in fingerprints:
+                fail(file_name, "ไม่พบไฟล์", 0.0)
+                continue
+            write(file_name, iter_price_chunks(file_path))
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = {pool.submit(parse_price_job, file_path): file_name for file_name, file_path in paths.items()}
+        for future in as_completed(futures):
+            file_name = futures[future]
+            clean, rejected, error, parse_seconds = future.result()
+            if error is not None:
+                fail(file_name, error, parse_seconds)
+            else:
+                write(file_name, [(clean, rejected)], parse_seconds)
+    return results
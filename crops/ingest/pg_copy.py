@@ -0,0 +1,127 @@
+# crops/ingest/pg_copy.py
+# backend นำเข้าราคาสำหรับ PostgreSQL: COPY แถวที่ทำความสะอาดแล้วลง temp table แล้ว merge ด้วย SQL เดียว
+# ฐานข้อมูลอื่น (เช่น SQLite ตอนพัฒนา) จะใช้ bulk insert/update ของ ORM แทน
+
+import io
+
+from django.db import connection, transaction
+
+from crops.models import CropVariable
+
+from .upsert import resolve_crops, save_price_chunks, finish_price_summary, refresh_derived
+
+STAGE_TABLE = "price_stage"
+_STAGE_COLUMNS = ["seq", "crop_id", "date", "average_price", "min_price", "max_price"]
+
+
+def _create_stage_table(cursor):
+    """ สร้าง temp table สำหรับพักข้อมูลของไฟล์หนึ่ง (ถูกลบเองเมื่อจบ transaction) """
+    cursor.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+    cursor.execute(
+        f"CREATE TEMP TABLE {STAGE_TABLE} ("
+        " seq bigint NOT NULL,"
+        " crop_id integer NOT NULL,"
+        " date date NOT NULL,"
+        " average_price numeric(10, 2),"
+        " min_price numeric(10, 2),"
+        " max_price numeric(10, 2)"
+        ") ON COMMIT DROP"
+    )
+
+
+def _copy_rows(cursor, buffer):
+    """ ส่ง CSV เข้า temp table ด้วย COPY (รองรับทั้ง psycopg2 และ psycopg 3) """
+    sql = f"COPY {STAGE_TABLE} ({', '.join(_STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    raw = cursor.cursor
+    if hasattr(raw, "copy_expert"):
+        raw.copy_expert(sql, buffer)
+    else:
+        with raw.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def _stage_chunk(cursor, clean, seq_start):
+    """ แปลง chunk (DataFrame จาก normalize_price_frame) เป็น CSV แล้ว COPY ลง temp table """
+    crop_ids = resolve_crops(clean["crop_name"].unique())
+    frame = clean.assign(
+        seq=range(seq_start, seq_start + len(clean)),
+        crop_id=clean["crop_name"].map(crop_ids),
+    )[_STAGE_COLUMNS]
+
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False, date_format="%Y-%m-%d")
+    buffer.seek(0)
+    _copy_rows(cursor, buffer)
+
+
+def _merge_sql():
+    """ SQL สำหรับ merge temp table เข้าตารางราคา คืนแถว (ชนิด, crop_id, date) ของทุกแถวที่ update/insert """
+    table = CropVariable._meta.db_table
+    changed = " OR ".join(
+        f"t.{f} IS DISTINCT FROM EXCLUDED.{f}" for f in ("average_price", "min_price", "max_price", "file_name")
+    )
+    # แถวที่ซ้ำ (crop, date) ในไฟล์เดียวกัน ใช้แถวหลังสุด (seq มากสุด) เหมือน upsert ของ ORM
+    # ON CONFLICT ใช้ unique constraint (crop_id, date): import ที่รันพร้อมกันจึงไม่สร้างแถวซ้ำ
+    # แถวที่มีอยู่แล้วถูก update เฉพาะเมื่อค่าเปลี่ยน และ xmax = 0 แปลว่าแถวนั้นเพิ่งถูก insert
+    return f"""
+        INSERT INTO {table} AS t (crop_id, date, average_price, min_price, max_price, file_name)
+        SELECT DISTINCT ON (crop_id, date) crop_id, date, average_price, min_price, max_price, %s
+        FROM {STAGE_TABLE}
+        ORDER BY crop_id, date, seq DESC
+        ON CONFLICT (crop_id, date) DO UPDATE
+        SET average_price = EXCLUDED.average_price, min_price = EXCLUDED.min_price,
+            max_price = EXCLUDED.max_price, file_name = EXCLUDED.file_name
+        WHERE {changed}
+        RETURNING CASE WHEN t.xmax = 0 THEN 'inserted' ELSE 'updated' END, t.crop_id, t.date
+    """
+
+
+def copy_price_chunks(chunks, file_name):
+    """
+    นำเข้าไฟล์หนึ่งด้วย COPY + merge (เฉพาะ PostgreSQL)
+      - ทุก chunk ถูก COPY ลง temp table ก่อน แล้ว merge เข้า crops_cropvariable ด้วย statement เดียว
+      - แถวที่มีอยู่แล้วจะถูก update เฉพาะเมื่อราคาหรือ file_name เปลี่ยน
+      - PriceRollup/PriceSnapshot ที่ได้รับผลจากแถวที่เปลี่ยนจะถูกคำนวณใหม่ใน transaction เดียวกัน
+    คืนค่าแบบเดียวกับ save_price_chunks
+    """
+    rejected_parts = []
+    row_count = 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _create_stage_table(cursor)
+        for clean, rejected in chunks:
+            if not clean.empty:
+                _stage_chunk(cursor, clean, row_count)
+            row_count += len(clean)
+            if not rejected.empty:
+                rejected_parts.append(rejected)
+
+        cursor.execute(f"SELECT count(*) FROM (SELECT DISTINCT crop_id, date FROM {STAGE_TABLE}) AS s")
+        total = cursor.fetchone()[0]
+        cursor.execute(_merge_sql(), [file_name])
+        write_counts = {"inserted": 0, "updated": 0, "unchanged": total}
+        changed = {}
+        for kind, crop_id, day in cursor.fetchall():
+            write_counts[kind] += 1
+            write_counts["unchanged"] -= 1
+            changed.setdefault(crop_id, set()).add(day)
+        # คำนวณ PriceRollup/PriceSnapshot ใหม่เฉพาะส่วนที่มีแถวเปลี่ยน ใน transaction เดียวกัน
+        refresh_derived(changed)
+
+    return finish_price_summary(file_name, write_counts, rejected_parts, row_count)
+
+
+def load_price_chunks(chunks, file_name, backend="auto"):
+    """
+    เลือก backend สำหรับเขียนราคาของไฟล์หนึ่ง
+      - "copy": COPY + merge (ต้องเป็น PostgreSQL)
+      - "orm": bulk insert/update ของ Django (ใช้ได้ทุกฐานข้อมูล)
+      - "auto": ใช้ copy เมื่อเชื่อมต่อ PostgreSQL มิฉะนั้นใช้ orm
+    """
+    if backend == "auto":
+        backend = "copy" if connection.vendor == "postgresql" else "orm"
+    if backend == "copy":
+        if connection.vendor != "postgresql":
+            raise ValueError("backend 'copy' ใช้ได้เฉพาะ PostgreSQL")
+        return copy_price_chunks(chunks, file_name)
+    return save_price_chunks(chunks, file_name)
@@ -0,0 +1,118 @@
+# crops/ingest/reader.py
+# ส่วนอ่านไฟล์ราคาไม่แตะฐานข้อมูลเลย จึงส่งไปรันใน process อื่นได้
+# ห้าม import Django หรือ crops.models ในไฟล์นี้: Windows/macOS เริ่ม worker ของ process pool แบบ spawn
+# ซึ่ง import โมดูลใหม่ใน process ที่ยังไม่ได้ตั้งค่า Django (AppRegistryNotReady)
+
+import os
+import time
+
+import pandas as pd
+from lxml import etree
+
+from .normalize import normalize_price_frame
+
+CHUNK_SIZE = 5000
+
+# เปลี่ยนชื่อคอลัมน์ให้ตรงตามที่เราต้องการ
+RENAME_MAP = {
+    'วันที่': 'date',
+    'ประเภท': 'category',
+    'สินค้า': 'ชื่อสินค้า',
+    'หน่วย': 'หน่วย',
+    'ราคา ต่ำสุด': 'ราคาต่ำสุด',
+    'ราคา สูงสุด': 'ราคาสูงสุด',
+    'ราคาเฉลี่ย': 'ราคาเฉลี่ย'
+}
+REQUIRED_COLUMNS = ['date', 'ชื่อสินค้า', 'ราคาเฉลี่ย', 'ราคาต่ำสุด', 'ราคาสูงสุด']
+
+
+class PriceFileError(Exception):
+    """ อ่านไฟล์ราคาไม่ได้ (ไม่พบไฟล์ / parse ไม่ได้ / โครงสร้างไม่ถูกต้อง) """
+
+
+def _cell_text(cell):
+    """ ข้อความในช่องตาราง (รวม tag ย่อย เช่น <div>) โดยยุบช่องว่างให้เหลือช่องเดียว """
+    return ' '.join(''.join(cell.itertext()).split())
+
+
+def _select_columns(df):
+    df = df.rename(columns=RENAME_MAP, errors='ignore')
+    try:
+        return df[REQUIRED_COLUMNS]
+    except KeyError as e:
+        raise PriceFileError("โครงสร้างไฟล์ไม่ถูกต้อง") from e
+
+
+def iter_price_table(file_path, chunk_size=CHUNK_SIZE):
+    """
+    อ่านตารางแรกจากไฟล์ .xls (ที่จริงเป็น HTML) แบบ streaming ด้วย lxml iterparse
+    คืน DataFrame ทีละ chunk (ไม่เกิน chunk_size แถว) ที่มีเฉพาะคอลัมน์ที่ใช้
+    แถว <tr> ที่อ่านแล้วจะถูกลบออกจาก tree ทันที หน่วยความจำจึงไม่โตตามขนาดไฟล์
+    """
+    if not os.path.exists(file_path):
+        raise PriceFileError("ไม่พบไฟล์")
+
+    header = None
+    rows = []
+    yielded = False
+    try:
+        context = etree.iterparse(file_path, events=("end",), tag=("tr", "table"),
+                                  html=True, encoding="utf-8")
+        for _, elem in context:
+            if elem.tag == "table":
+                break  # จบตารางแรกแล้ว ไม่ต้องอ่านส่วนที่เหลือของไฟล์
+
+            cells = [_cell_text(cell) for cell in elem if cell.tag in ("td", "th")]
+            # ลบแถวที่อ่านแล้ว (และแถวก่อนหน้า) ออกจาก tree
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+            if header is None:
+                header = cells
+                continue
+            if not any(cells):
+                continue
+            rows.append(cells[:len(header)] + [None] * (len(header) - len(cells)))
+            if len(rows) >= chunk_size:
+                yield _select_columns(pd.DataFrame(rows, columns=header))
+                yielded = True
+                rows = []
+    except etree.LxmlError as e:
+        raise PriceFileError(str(e)) from e
+
+    if header is None:
+        raise PriceFileError("No tables found")
+    # chunk สุดท้าย (หรือ frame ว่างถ้าตารางมีแต่ header เพื่อให้ยังตรวจโครงสร้างคอลัมน์)
+    if rows or not yielded:
+        yield _select_columns(pd.DataFrame(rows, columns=header))
+
+
+def iter_price_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """ อ่านไฟล์แบบ streaming และทำความสะอาดทีละ chunk คืนค่า (clean, rejected) ทีละชุด """
+    for chunk in iter_price_table(file_path, chunk_size):
+        yield normalize_price_frame(chunk)
+
+
+def parse_price_file(file_path):
+    """ อ่านและทำความสะอาดไฟล์ราคาทั้งไฟล์ คืนค่า tuple (clean, rejected) จาก normalize_price_frame """
+    chunks = list(iter_price_chunks(file_path))
+    return (
+        pd.concat([clean for clean, _ in chunks], ignore_index=True),
+        pd.concat([rejected for _, rejected in chunks], ignore_index=True),
+    )
+
+
+def parse_price_job(file_path):
+    """
+    งานที่รันใน worker process ของ import_price_files: อ่าน + normalize ไฟล์เดียว
+    คืนค่า (clean, rejected, error, parse_seconds) โดย error เป็นข้อความเมื่ออ่านไฟล์ไม่ได้
+    """
+    started = time.perf_counter()
+    try:
+        clean, rejected = parse_price_file(file_path)
+        error = None
+    except PriceFileError as e:
+        clean = rejected = None
+        error = str(e)
+    return clean, rejected, error, time.perf_counter() - started
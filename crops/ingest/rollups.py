@@ -0,0 +1,169 @@
+# crops/ingest/rollups.py
+# ดูแลตาราง PriceRollup (ราคารวมรายสัปดาห์/เดือน/ไตรมาส/ปี) ให้ตรงกับ CropVariable
+# คำนวณใหม่เฉพาะช่วงเวลาที่มีวันที่ถูก insert/update ในการนำเข้าครั้งนั้น
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+from django.db.models import Q
+
+from crops.models import CropVariable, PriceRollup
+
+# ความถี่ของ pandas Period ต่อชนิดช่วงเวลา (สัปดาห์เริ่มวันจันทร์)
+PERIOD_FREQS = {
+    PriceRollup.PERIOD_WEEK: "W-SUN",
+    PriceRollup.PERIOD_MONTH: "M",
+    PriceRollup.PERIOD_QUARTER: "Q",
+    PriceRollup.PERIOD_YEAR: "Y",
+}
+BATCH_SIZE = 1000
+_CENT = Decimal("0.01")
+
+
+def _cents_to_price(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def affected_periods(changed):
+    """
+    แปลงวันที่ที่เปลี่ยน {crop_id: iterable ของ date} เป็นช่วงเวลาที่ต้องคำนวณใหม่
+    คืนค่า dict {period: set ของ (crop_id, period_start)}
+    """
+    frame = pd.DataFrame(
+        [(crop_id, day) for crop_id, days in changed.items() for day in days],
+        columns=["crop_id", "date"],
+    )
+    if frame.empty:
+        return {}
+    dates = pd.to_datetime(frame["date"])
+    result = {}
+    for period, freq in PERIOD_FREQS.items():
+        starts = dates.dt.to_period(freq).dt.start_time.dt.date
+        result[period] = set(zip(frame["crop_id"], starts))
+    return result
+
+
+def _load_daily(bounds):
+    """
+    โหลดราคารายวันตามช่วงวันที่ของแต่ละพืช bounds = {crop_id: (date_from, date_to)}
+    ราคาแปลงเป็นหน่วยสตางค์ (int) เพื่อรวมได้โดยไม่มี error ของทศนิยม
+    """
+    condition = Q()
+    for crop_id, (date_from, date_to) in bounds.items():
+        condition |= Q(crop_id=crop_id, date__gte=date_from, date__lte=date_to)
+    rows = CropVariable.objects.filter(condition).values_list(
+        "crop_id", "date", "average_price", "min_price", "max_price"
+    )
+    frame = pd.DataFrame.from_records(list(rows), columns=["crop_id", "date", "average", "min", "max"])
+    for column in ("average", "min", "max"):
+        frame[column] = (frame[column].astype("float64") * 100).round().astype("int64")
+    frame["date"] = pd.to_datetime(frame["date"])
+    return frame.sort_values(["crop_id", "date"], kind="stable")
+
+
+def _period_bounds(days):
+    """ ช่วงวันที่ที่ครอบทุกช่วงเวลาของวันที่ที่ระบุ (เดือน/ไตรมาสอยู่ในปีเสมอ แต่สัปดาห์อาจคร่อมปี) """
+    first, last = pd.Timestamp(min(days)), pd.Timestamp(max(days))
+    return (
+        min(first.to_period("Y").start_time, first.to_period("W-SUN").start_time).date(),
+        max(last.to_period("Y").end_time, last.to_period("W-SUN").end_time).date(),
+    )
+
+
+def _build_rollups(period, grouped):
+    rollups = []
+    for (crop_id, start), agg in grouped.iterrows():
+        rollups.append(PriceRollup(
+            crop_id=int(crop_id),
+            period=period,
+            period_start=start,
+            period_end=agg["period_end"],
+            day_count=int(agg["day_count"]),
+            price_sum=_cents_to_price(agg["price_sum"]),
+            average_price=(_cents_to_price(agg["price_sum"]) / int(agg["day_count"])).quantize(
+                _CENT, rounding=ROUND_HALF_UP),
+            min_price=_cents_to_price(agg["min_price"]),
+            max_price=_cents_to_price(agg["max_price"]),
+            first_date=agg["first_date"].date(),
+            first_price=_cents_to_price(agg["first_price"]),
+            last_date=agg["last_date"].date(),
+            last_price=_cents_to_price(agg["last_price"]),
+        ))
+    return rollups
+
+
+def _delete_periods(period, keys):
+    """ ลบ rollup ของ (crop_id, period_start) ที่ระบุ แบ่งเป็นชุดเพื่อไม่ให้ parameter ต่อ query มากเกินไป """
+    by_crop = {}
+    for crop_id, start in keys:
+        by_crop.setdefault(crop_id, []).append(start)
+    condition, size = Q(), 0
+    for crop_id, starts in by_crop.items():
+        condition |= Q(crop_id=crop_id, period_start__in=starts)
+        size += len(starts)
+        if size >= BATCH_SIZE:
+            PriceRollup.objects.filter(condition, period=period).delete()
+            condition, size = Q(), 0
+    if size:
+        PriceRollup.objects.filter(condition, period=period).delete()
+
+
+def refresh_rollups(changed):
+    """
+    คำนวณ PriceRollup ใหม่เฉพาะช่วงเวลาที่ครอบวันที่ใน changed ({crop_id: iterable ของ date})
+    ควรเรียกใน transaction เดียวกับการเขียน CropVariable เพื่อให้ rollup ตรงกับข้อมูลรายวันเสมอ
+    คืนค่าจำนวนแถว rollup ที่เขียน
+    """
+    targets = affected_periods(changed)
+    if not targets:
+        return 0
+
+    # โหลดรายวันด้วย query เดียวให้ครอบทุกช่วงที่ต้องคำนวณของแต่ละพืช
+    daily = _load_daily({crop_id: _period_bounds(days) for crop_id, days in changed.items() if days})
+
+    written = 0
+    for period, keys in targets.items():
+        # ลบ rollup เดิมของช่วงที่เปลี่ยน (รวมช่วงที่ไม่มีข้อมูลรายวันเหลือแล้ว) แล้วสร้างใหม่
+        _delete_periods(period, keys)
+
+        if daily.empty:
+            continue
+        periods = daily["date"].dt.to_period(PERIOD_FREQS[period])
+        frame = daily.assign(
+            period_start=periods.dt.start_time.dt.date,
+            period_end=periods.dt.end_time.dt.date,
+        )
+        wanted = pd.MultiIndex.from_tuples(list(keys), names=["crop_id", "period_start"])
+        frame = frame.set_index(["crop_id", "period_start"])
+        frame = frame[frame.index.isin(wanted)]
+        grouped = frame.groupby(level=["crop_id", "period_start"], sort=False).agg(
+            period_end=("period_end", "first"),
+            day_count=("average", "size"),
+            price_sum=("average", "sum"),
+            min_price=("min", "min"),
+            max_price=("max", "max"),
+            first_date=("date", "first"),
+            first_price=("average", "first"),
+            last_date=("date", "last"),
+            last_price=("average", "last"),
+        )
+        rollups = _build_rollups(period, grouped)
+        PriceRollup.objects.bulk_create(rollups, batch_size=BATCH_SIZE)
+        written += len(rollups)
+    return written
+
+
+def rebuild_rollups(crop_ids=None):
+    """ สร้าง PriceRollup ใหม่ทั้งหมด (หรือเฉพาะพืชที่ระบุ) จากข้อมูลรายวันทั้งหมด """
+    rows = CropVariable.objects.all()
+    if crop_ids:
+        rows = rows.filter(crop_id__in=crop_ids)
+    changed = {}
+    for crop_id, day in rows.values_list("crop_id", "date").iterator(chunk_size=BATCH_SIZE * 10):
+        changed.setdefault(crop_id, set()).add(day)
+
+    stale = PriceRollup.objects.all()
+    if crop_ids:
+        stale = stale.filter(crop_id__in=crop_ids)
+    stale.exclude(crop_id__in=list(changed)).delete()
+    return refresh_rollups(changed)
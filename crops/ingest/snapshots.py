@@ -0,0 +1,92 @@
+# crops/ingest/snapshots.py
+# ดูแลตาราง PriceSnapshot (ราคาวันล่าสุด + วันก่อนหน้าของแต่ละพืช) สำหรับ crop-info-list
+
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank, RowNumber
+from django.utils import timezone
+
+from crops.models import Crop, CropVariable, PriceSnapshot
+
+_UPDATE_FIELDS = [
+    "latest_date", "latest_average_price", "latest_min_price", "latest_max_price",
+    "previous_date", "previous_average_price",
+]
+
+
+def compute_snapshots(crop_ids):
+    """
+    คำนวณ snapshot ของพืชที่ระบุด้วย window-function query เดียว
+      - date_rank 1 = วันล่าสุด, 2 = วันก่อนหน้า (ข้ามวันที่ซ้ำกัน)
+      - ถ้าวันเดียวกันมีหลายแถว ใช้แถวที่ variable_id มากที่สุด
+    คืนค่า dict {crop_id: PriceSnapshot (ยังไม่บันทึก)} ครบทุก crop_id (พืชที่ไม่มีราคาจะมี latest_date เป็น None)
+    """
+    crop_ids = list(crop_ids)
+    snapshots = {crop_id: PriceSnapshot(crop_id=crop_id) for crop_id in crop_ids}
+    if not crop_ids:
+        return snapshots
+
+    ranked = CropVariable.objects.filter(crop_id__in=crop_ids).annotate(
+        date_rank=Window(DenseRank(), partition_by=[F("crop_id")], order_by=F("date").desc()),
+        row_rank=Window(RowNumber(), partition_by=[F("crop_id"), F("date")], order_by=F("variable_id").desc()),
+    ).filter(date_rank__lte=2, row_rank=1).values_list(
+        "crop_id", "date_rank", "date", "average_price", "min_price", "max_price"
+    )
+    for crop_id, date_rank, day, average, low, high in ranked:
+        snapshot = snapshots[crop_id]
+        if date_rank == 1:
+            snapshot.latest_date = day
+            snapshot.latest_average_price = average
+            snapshot.latest_min_price = low
+            snapshot.latest_max_price = high
+        else:
+            snapshot.previous_date = day
+            snapshot.previous_average_price = average
+    return snapshots
+
+
+def save_snapshots(snapshots):
+    """ บันทึก snapshot (แทนที่ของเดิมของพืชเดียวกัน) ด้วย bulk query """
+    existing = dict(
+        PriceSnapshot.objects.filter(crop_id__in=list(snapshots)).values_list("crop_id", "snapshot_id")
+    )
+    to_update, to_create = [], []
+    now = timezone.now()
+    for crop_id, snapshot in snapshots.items():
+        if crop_id in existing:
+            snapshot.snapshot_id = existing[crop_id]
+            snapshot.updated_at = now  # bulk_update ไม่เติม auto_now ให้
+            to_update.append(snapshot)
+        else:
+            to_create.append(snapshot)
+    PriceSnapshot.objects.bulk_update(to_update, [*_UPDATE_FIELDS, "updated_at"])
+    PriceSnapshot.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+def refresh_snapshots(changed):
+    """
+    อัปเดต snapshot หลังนำเข้า changed = {crop_id: iterable ของ date ที่ insert/update}
+    พืชที่วันที่เปลี่ยนทั้งหมดเก่ากว่า previous_date ของ snapshot เดิมไม่ต้องคำนวณใหม่
+    """
+    if not changed:
+        return 0
+    current = {
+        s.crop_id: s for s in PriceSnapshot.objects.filter(crop_id__in=list(changed)).only(
+            "crop_id", "previous_date"
+        )
+    }
+    stale = [
+        crop_id for crop_id, days in changed.items()
+        if crop_id not in current
+        or current[crop_id].previous_date is None
+        or max(days) >= current[crop_id].previous_date
+    ]
+    if stale:
+        save_snapshots(compute_snapshots(stale))
+    return len(stale)
+
+
+def rebuild_snapshots(crop_ids=None):
+    """ สร้าง PriceSnapshot ใหม่ของทุกพืช (หรือเฉพาะพืชที่ระบุ) """
+    if not crop_ids:
+        crop_ids = Crop.objects.values_list("crop_id", flat=True)
+    save_snapshots(compute_snapshots(crop_ids))
@@ -0,0 +1,113 @@
+# crops/ingest/synthetic.py
+# สร้างไฟล์ราคา .xls (HTML table) ปลอมในรูปแบบเดียวกับไฟล์ที่ดาวน์โหลดมา ใช้สำหรับ benchmark การนำเข้า
+
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+from .normalize import THAI_MONTHS
+
+_MONTH_NAMES = {number: name for name, number in THAI_MONTHS.items()}
+
+_HEADER = """<html xmlns:o="urn:schemas-microsoft-com:office:office"
+xmlns:x="urn:schemas-microsoft-com:office:excel"
+xmlns="http://www.w3.org/TR/REC-html40">
+
+<html>
+<head>
+<title>Export Excel</title>
+<meta http-equiv=Content-Type content="text/html; charset=utf-8">
+</head>
+<body>
+<table widht="100%" height="" align="center" border="1" >
+  <tr>
+    <th> <div align="center">วันที่ </div></th>
+    <th> <div align="center">ประเภท </div></th>
+    <th> <div align="center">สินค้า</div></th>
+    <th> <div align="center">หน่วย</div></th>
+    <th> <div align="center">ราคา ต่ำสุด</div></th>
+    <th> <div align="center">ราคา สูงสุด</div></th>
+    <th> <div align="center">ราคาเฉลี่ย</div></th>
+  </tr>
+"""
+_ROW = """  <tr>
+    <td>{date}</td>
+    <td>ขายปลีก</td>
+    <td>{crop}</td>
+    <td>บาท/กก.</td>
+    <td>{min}</td>
+    <td>{max}</td>
+    <td>{avg}</td>
+  </tr>
+"""
+_FOOTER = """</table>
+</body>
+</html>"""
+
+SYNTHETIC_PREFIX = "bench"
+
+
+def thai_date(day):
+    """ แปลง date เป็นรูปแบบในไฟล์ราคา เช่น '4 ม.ค. 2564' (ปี พ.ศ.) """
+    return f"{day.day} {_MONTH_NAMES[day.month]} {day.year + 543}"
+
+
+def business_days(start, days):
+    """ วันทำการ (จันทร์-ศุกร์) จำนวน days วันนับจาก start เหมือนไฟล์จริงที่ไม่มีเสาร์-อาทิตย์ """
+    result = []
+    current = start
+    while len(result) < days:
+        if current.weekday() < 5:
+            result.append(current)
+        current += timedelta(days=1)
+    return result
+
+
+def write_price_file(file_path, crop_name, days, rng, start=date(2021, 1, 4), blank_ratio=0.0):
+    """
+    เขียนไฟล์ราคาของพืชหนึ่งชนิด จำนวน days วันทำการ
+      - ราคาเป็น random walk รอบราคาเริ่มต้น ปัดเป็น 0.5 บาทเหมือนข้อมูลจริง
+      - blank_ratio: สัดส่วนแถวที่ราคาว่าง (ใช้ทดสอบเส้นทางแถวที่ถูกข้าม)
+    คืนค่าจำนวนแถวที่เขียน
+    """
+    dates = business_days(start, days)
+    # แยก generator ของราคาและแถวว่าง เพื่อให้ข้อมูลช่วงต้นเหมือนเดิมเมื่อเพิ่มจำนวนวัน
+    walk_rng, blank_rng = rng.spawn(2)
+    base = walk_rng.uniform(10, 120)
+    spread_ratio = walk_rng.uniform(0.05, 0.15)
+    avg = np.maximum(1.0, base + np.cumsum(walk_rng.normal(0, base * 0.02, len(dates))))
+    low = np.round(avg * (1 - spread_ratio) * 2) / 2
+    high = np.round(avg * (1 + spread_ratio) * 2) / 2
+    avg = (low + high) / 2
+    blank = blank_rng.random(len(dates)) < blank_ratio
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(_HEADER)
+        for i, day in enumerate(dates):
+            prices = ("", "", "") if blank[i] else (f"{low[i]:g}", f"{high[i]:g}", f"{avg[i]:g}")
+            f.write(_ROW.format(date=thai_date(day), crop=crop_name,
+                                min=prices[0], max=prices[1], avg=prices[2]))
+        f.write(_FOOTER)
+    return len(dates)
+
+
+def synthetic_crop_name(index):
+    return f"{SYNTHETIC_PREFIX} พืชทดสอบ {index:03d}"
+
+
+def generate_price_files(folder_path, crops, days, seed=0, blank_ratio=0.0):
+    """
+    สร้างไฟล์ราคา crops ไฟล์ (ไฟล์ละหนึ่งพืช) ไฟล์ละ days วันทำการ ลงใน folder_path
+    ใช้ seed เดิมจะได้ไฟล์เหมือนเดิมทุกครั้ง (เพิ่ม days ภายหลังจะได้ข้อมูลเดิม + วันที่ต่อท้าย)
+    คืนค่า dict {file_name: crop_name}
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    files = {}
+    for index in range(1, crops + 1):
+        rng = np.random.default_rng([seed, index])
+        crop_name = synthetic_crop_name(index)
+        file_name = f"{SYNTHETIC_PREFIX}_{index:03d}_prices.xls"
+        write_price_file(os.path.join(folder_path, file_name), crop_name, days, rng, blank_ratio=blank_ratio)
+        files[file_name] = crop_name
+    return files
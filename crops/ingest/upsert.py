@@ -0,0 +1,177 @@
+# crops/ingest/upsert.py
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+
+from django.db import transaction
+from django.db.models import Max
+
+from crops.crop_index import crop_index
+from crops.models import Crop, CropVariable
+
+from .normalize import frame_to_records, summarize_rejected
+from crops.response_cache import bump_versions, crop_scope, SCOPE_PRICES
+
+from .rollups import refresh_rollups
+from .snapshots import refresh_snapshots
+
+BATCH_SIZE = 1000
+PRICE_FIELDS = ("average_price", "min_price", "max_price")
+_CENT = Decimal("0.01")
+
+
+def to_price(value):
+    """ แปลงราคา (float/str) เป็น Decimal 2 ตำแหน่ง ให้ตรงกับ DecimalField ในฐานข้อมูล """
+    return Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def resolve_crops(crop_names):
+    """
+    หา Crop ของทุกชื่อในครั้งเดียว (สร้างใหม่เฉพาะชื่อที่ยังไม่มี)
+    คืนค่าเป็น dict {crop_name: crop_id}
+    """
+    names = set(crop_names)
+    # ชื่อที่มีอยู่แล้วหาจากดัชนีในหน่วยความจำ (ไม่ต้อง query)
+    crop_ids = crop_index().crop_ids(names)
+    for name in names - crop_ids.keys():
+        crop, _ = Crop.objects.get_or_create(crop_name=name, defaults={"unit": "กิโลกรัม"})
+        crop_ids[name] = crop.crop_id
+    return crop_ids
+
+
+def bulk_upsert_crop_prices(rows, file_name, batch_size=BATCH_SIZE, changed=None):
+    """
+    เขียนข้อมูลราคาทั้งหมดแบบ set-based โดยใช้ (crop, date) เป็น key
+      - rows: iterable ของ dict {"crop_name", "date", "average_price", "min_price", "max_price"}
+        (date เป็น datetime.date, ราคาเป็นตัวเลข)
+      - แถวที่ซ้ำ (crop, date) ในไฟล์เดียวกัน แถวหลังสุดจะถูกใช้ (เหมือนการเรียก update_or_create ทีละแถว)
+      - แถวที่ใหม่กว่า watermark ของพืช (วันที่ล่าสุดในฐานข้อมูล) จะ insert ทันที
+        ส่วนแถวเก่าจะเขียนเฉพาะที่ค่าต่างจากเดิม
+      - changed: dict {crop_id: set ของ date} (ถ้าส่งมา) จะถูกเติมด้วยวันที่ที่ insert/update
+    คืนค่า dict {"inserted": n, "updated": n, "unchanged": n}
+    """
+    incoming = {}
+    for row in rows:
+        incoming[(row["crop_name"], row["date"])] = tuple(to_price(row[f]) for f in PRICE_FIELDS)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not incoming:
+        return counts
+
+    with transaction.atomic():
+        crop_ids = resolve_crops(name for name, _ in incoming)
+
+        # watermark = วันที่ล่าสุดที่มีอยู่แล้วของแต่ละพืช แถวที่ใหม่กว่านี้เป็นแถวใหม่แน่นอน ไม่ต้องเทียบค่า
+        watermarks = dict(
+            CropVariable.objects.filter(crop_id__in=set(crop_ids.values()))
+            .values("crop_id")
+            .annotate(latest=Max("date"))
+            .values_list("crop_id", "latest")
+        )
+        compare_dates = [
+            day for name, day in incoming
+            if watermarks.get(crop_ids[name]) is not None and day <= watermarks[crop_ids[name]]
+        ]
+
+        # ดึงแถวที่มีอยู่แล้วเฉพาะช่วงที่ทับกับข้อมูลเดิม (ไม่เกิน watermark) ด้วย query เดียว
+        existing = {}
+        if compare_dates:
+            existing_qs = CropVariable.objects.filter(
+                crop_id__in=set(crop_ids.values()),
+                date__gte=min(compare_dates),
+                date__lte=max(compare_dates),
+            ).only("variable_id", "crop_id", "date", "file_name", *PRICE_FIELDS)
+            for obj in existing_qs.iterator(chunk_size=batch_size):
+                existing[(obj.crop_id, obj.date)] = obj
+
+        to_create = []
+        to_update = []
+        for (crop_name, day), prices in incoming.items():
+            crop_id = crop_ids[crop_name]
+            obj = existing.get((crop_id, day))
+            if obj is None:
+                to_create.append(CropVariable(
+                    crop_id=crop_id,
+                    date=day,
+                    file_name=file_name,
+                    **dict(zip(PRICE_FIELDS, prices)),
+                ))
+                continue
+
+            current = tuple(getattr(obj, f) for f in PRICE_FIELDS)
+            if current == prices and obj.file_name == file_name:
+                counts["unchanged"] += 1
+                continue
+
+            for field, value in zip(PRICE_FIELDS, prices):
+                setattr(obj, field, value)
+            obj.file_name = file_name
+            to_update.append(obj)
+
+        # แถวที่ import อื่นเพิ่ง insert ระหว่างนี้ (ชน unique (crop, date)) ถูก update แทนการเกิดแถวซ้ำ
+        CropVariable.objects.bulk_create(
+            to_create, batch_size=batch_size, update_conflicts=True,
+            unique_fields=["crop", "date"], update_fields=[*PRICE_FIELDS, "file_name"],
+        )
+        CropVariable.objects.bulk_update(
+            to_update, [*PRICE_FIELDS, "file_name"], batch_size=batch_size
+        )
+
+    if changed is not None:
+        for obj in (*to_create, *to_update):
+            changed.setdefault(obj.crop_id, set()).add(obj.date)
+
+    counts["inserted"] = len(to_create)
+    counts["updated"] = len(to_update)
+    return counts
+
+
+def refresh_derived(changed):
+    """
+    อัปเดตตารางที่คำนวณจาก CropVariable (PriceRollup, PriceSnapshot) และเวอร์ชันข้อมูลของ response cache
+    เฉพาะส่วนที่ได้รับผลจาก changed = {crop_id: set ของ date ที่ insert/update/ลบ}
+    """
+    if not changed:
+        return
+    refresh_rollups(changed)
+    refresh_snapshots(changed)
+    # ข้อมูลเปลี่ยน: เพิ่มเวอร์ชันเพื่อให้ response cache ของพืชเหล่านี้ไม่ถูกใช้อีก
+    bump_versions([SCOPE_PRICES, *(crop_scope(crop_id) for crop_id in changed)])
+
+
+def save_price_chunks(chunks, file_name):
+    """
+    เขียนผลจาก normalize_price_frame ของไฟล์หนึ่งลงฐานข้อมูลทีละ chunk
+      - chunks: iterable ของ tuple (clean, rejected) เช่นจาก iter_price_chunks
+      - ทั้งไฟล์อยู่ใน transaction เดียว ถ้าอ่านไฟล์ไม่สำเร็จกลางทางจะ rollback ทั้งหมด
+      - PriceRollup/PriceSnapshot ที่ได้รับผลจากแถวที่เปลี่ยนจะถูกคำนวณใหม่ใน transaction เดียวกัน
+    คืนค่า dict {"skipped_records": [...], "inserted": n, "updated": n, "unchanged": n, "row_count": n}
+    """
+    write_counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    rejected_parts = []
+    row_count = 0
+    changed = {}
+
+    with transaction.atomic():
+        for clean, rejected in chunks:
+            # เขียนข้อมูลแบบ batch (resolve crop ครั้งเดียว แล้ว bulk insert/update ตาม (crop, date))
+            for key, value in bulk_upsert_crop_prices(frame_to_records(clean), file_name, changed=changed).items():
+                write_counts[key] += value
+            row_count += len(clean)
+            if not rejected.empty:
+                rejected_parts.append(rejected)
+        refresh_derived(changed)
+
+    return finish_price_summary(file_name, write_counts, rejected_parts, row_count)
+
+
+def finish_price_summary(file_name, write_counts, rejected_parts, row_count):
+    """ รวมแถวที่ถูกข้ามของทุก chunk แล้วสร้างสรุปผลการนำเข้าไฟล์ (ใช้ร่วมกันทุก backend) """
+    rejected = pd.concat(rejected_parts, ignore_index=True) if rejected_parts else pd.DataFrame()
+    if not rejected.empty:
+        print(f"⚠️ ข้ามแถวที่ข้อมูลไม่สมบูรณ์ใน {file_name} จำนวน {len(rejected)} แถว")
+
+    print(f"✅ อัปโหลดข้อมูลจาก {file_name} สำเร็จ "
+          f"(เพิ่ม {write_counts['inserted']}, แก้ไข {write_counts['updated']}, ไม่เปลี่ยน {write_counts['unchanged']})")
+    return {"skipped_records": summarize_rejected(rejected), **write_counts, "row_count": row_count}
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from crops.models import Crop, ImportManifest
+from crops.ingest.benchmark import measure, phase_report, max_rss_mb
+from crops.ingest.manifest import manifest_key
+from crops.ingest.parallel import import_price_files, default_workers
+from crops.ingest.synthetic import generate_price_files, SYNTHETIC_PREFIX
+
+
+class Command(BaseCommand):
+    help = ("สร้างไฟล์ราคาจำลอง N พืช × M วัน แล้ววัดความเร็วการนำเข้ากับฐานข้อมูลปัจจุบัน "
+            "(ตั้ง DATABASE_URL เป็น SQLite หรือ PostgreSQL เพื่อเทียบกัน)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crops', type=int, default=10, help="จำนวนพืช (= จำนวนไฟล์)")
+        parser.add_argument('--days', type=int, default=1000, help="จำนวนวันทำการต่อไฟล์")
+        parser.add_argument('--append-days', type=int, default=5,
+                            help="จำนวนวันที่เพิ่มต่อท้ายในรอบ append")
+        parser.add_argument('--blank-ratio', type=float, default=0.01,
+                            help="สัดส่วนแถวที่ราคาว่าง (ถูกข้ามตอนนำเข้า)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=None,
+                            help="จำนวน process สำหรับ parse ไฟล์ (ค่าเริ่มต้นจาก PRICE_IMPORT_WORKERS)")
+        parser.add_argument('--backend', choices=['auto', 'copy', 'orm'], default='auto')
+        parser.add_argument('--dir', default=None,
+                            help="โฟลเดอร์สำหรับไฟล์จำลอง (ค่าเริ่มต้นเป็น temp และถูกลบเมื่อจบ)")
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="วัด peak memory ของแต่ละรอบด้วย tracemalloc (ทำให้ช้าลง)")
+        parser.add_argument('--json', dest='json_path', default=None,
+                            help="บันทึกรายงานเป็นไฟล์ JSON (ใช้ติดตาม regression)")
+        parser.add_argument('--keep', action='store_true',
+                            help="ไม่ลบพืช/ข้อมูลราคาจำลองออกจากฐานข้อมูลเมื่อจบ")
+
+    def handle(self, *args, **options):
+        if options['crops'] < 1 or options['days'] < 1:
+            raise CommandError("--crops และ --days ต้องมากกว่า 0")
+
+        folder = options['dir'] or tempfile.mkdtemp(prefix="bluzora-bench-")
+        workers = options['workers'] or default_workers()
+        backend = options['backend']
+        if backend == 'auto':
+            backend = 'copy' if connection.vendor == 'postgresql' else 'orm'
+
+        def run(name, incremental):
+            with measure(options['trace_memory']) as stats:
+                results = import_price_files(folder, file_names, workers=workers,
+                                             incremental=incremental, backend=backend)
+            report = phase_report(name, results, stats)
+            self._print_phase(report)
+            return report
+
+        file_names = []
+        phases = []
+        try:
+            self.stdout.write(
+                f"🧪 benchmark: {options['crops']} พืช × {options['days']} วัน, "
+                f"ฐานข้อมูล {connection.vendor}, backend {backend}, workers {workers}"
+            )
+            file_names = list(generate_price_files(folder, options['crops'], options['days'],
+                                                   seed=options['seed'], blank_ratio=options['blank_ratio']))
+
+            # 1) นำเข้าครั้งแรก (ทุกแถวเป็นแถวใหม่)
+            phases.append(run("initial", incremental=False))
+            # 2) นำเข้าซ้ำแบบบังคับ (อ่านทุกไฟล์ แต่ไม่มีแถวเปลี่ยน)
+            phases.append(run("reimport", incremental=False))
+            # 3) นำเข้าซ้ำแบบ incremental (ไฟล์ไม่เปลี่ยน ควรข้ามทั้งหมด)
+            phases.append(run("incremental-skip", incremental=True))
+            # 4) เพิ่มวันต่อท้ายทุกไฟล์ แล้วนำเข้าแบบ incremental
+            if options['append_days'] > 0:
+                generate_price_files(folder, options['crops'], options['days'] + options['append_days'],
+                                     seed=options['seed'], blank_ratio=options['blank_ratio'])
+                phases.append(run("append", incremental=True))
+        finally:
+            if not options['keep']:
+                Crop.objects.filter(crop_name__startswith=f"{SYNTHETIC_PREFIX} ").delete()
+                ImportManifest.objects.filter(
+                    file_path__in=[manifest_key(os.path.join(folder, name)) for name in file_names]
+                ).delete()
+            if not options['dir']:
+                shutil.rmtree(folder, ignore_errors=True)
+
+        report = {
+            "database": connection.vendor,
+            "backend": backend,
+            "workers": workers,
+            "crops": options['crops'],
+            "days": options['days'],
+            "max_rss_mb": max_rss_mb(),
+            "phases": phases,
+        }
+        self.stdout.write(f"📈 หน่วยความจำสูงสุดของ process: {report['max_rss_mb']} MB")
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"💾 บันทึกรายงานที่ {options['json_path']}")
+
+    def _print_phase(self, report):
+        memory = "" if report["peak_memory_mb"] is None else f", peak {report['peak_memory_mb']} MB"
+        self.stdout.write(
+            f"⏱️ {report['phase']:<16} {report['seconds']:>8.3f}s  "
+            f"{report['rows_per_sec']:>10.1f} rows/s  {report['queries']:>6} queries  "
+            f"(เพิ่ม {report['inserted']}, แก้ไข {report['updated']}, ไม่เปลี่ยน {report['unchanged']}{memory})"
+        )
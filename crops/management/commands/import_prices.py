@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crops.ingest.jobs import summarize_results
+from crops.ingest.parallel import import_price_files, default_workers
+
+
+class Command(BaseCommand):
+    help = "นำเข้าไฟล์ราคา .xls จากโฟลเดอร์ (PostgreSQL ใช้ COPY + merge, ฐานข้อมูลอื่นใช้ bulk insert)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder', help="โฟลเดอร์ที่เก็บไฟล์ราคา .xls")
+        parser.add_argument('--files', nargs='+',
+                            help="นำเข้าเฉพาะไฟล์ที่ระบุ (ไม่ระบุ = ทุกไฟล์ .xls ในโฟลเดอร์)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="จำนวน process สำหรับ parse ไฟล์ (ค่าเริ่มต้นจาก PRICE_IMPORT_WORKERS)")
+        parser.add_argument('--force', action='store_true',
+                            help="นำเข้าใหม่ทุกไฟล์แม้ไฟล์ไม่เปลี่ยนตั้งแต่ครั้งล่าสุด")
+        parser.add_argument('--backend', choices=['auto', 'copy', 'orm'], default='auto',
+                            help="วิธีเขียนฐานข้อมูล: copy (PostgreSQL), orm (bulk insert) หรือ auto")
+
+    def handle(self, *args, **options):
+        folder = options['folder']
+        if not os.path.isdir(folder):
+            raise CommandError(f"ไม่พบโฟลเดอร์ {folder}")
+
+        files = options['files'] or sorted(f for f in os.listdir(folder) if f.endswith(".xls"))
+        if not files:
+            raise CommandError("ไม่พบไฟล์ .xls ในโฟลเดอร์")
+
+        try:
+            results = import_price_files(
+                folder,
+                files,
+                workers=options['workers'] or default_workers(),
+                incremental=not options['force'],
+                backend=options['backend'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+
+        summary = summarize_results(files, results)
+        written = summary["write_summary"]
+        self.stdout.write(
+            f"📦 {summary['message']} (เพิ่ม {written['inserted']}, แก้ไข {written['updated']}, "
+            f"ไม่เปลี่ยน {written['unchanged']}, ข้ามไฟล์ที่ไม่เปลี่ยน {len(summary['unchanged_files'])})"
+        )
+        for file_name, error in summary["errors"].items():
+            self.stderr.write(f"🚫 {file_name}: {error}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from crops.forecast_runs import prune_forecast_runs
+
+
+class Command(BaseCommand):
+    help = "ลบรอบพยากรณ์ (ForecastRun) เก่าพร้อมค่าพยากรณ์ของรอบนั้น เหลือรอบล่าสุดตามจำนวนที่กำหนดต่อพืช"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=None,
+                            help="จำนวนรอบล่าสุดที่เก็บไว้ต่อพืช (ค่าเริ่มต้นจาก FORECAST_RUNS_KEEP)")
+        parser.add_argument('--crop-id', type=int, nargs='+', dest='crop_ids',
+                            help="เฉพาะพืชที่ระบุ (ไม่ระบุ = ทุกพืช)")
+
+    def handle(self, *args, **options):
+        removed = prune_forecast_runs(options['crop_ids'], keep=options['keep'])
+        self.stdout.write(f"✅ ลบรอบพยากรณ์เก่า {removed} รอบ (รอบปัจจุบันของทุกพืชยังอยู่)")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crops.ingest.rollups import rebuild_rollups
+from crops.ingest.snapshots import rebuild_snapshots
+
+
+class Command(BaseCommand):
+    help = ("สร้างตาราง PriceRollup (ราคารวมรายสัปดาห์/เดือน/ไตรมาส/ปี) และ PriceSnapshot "
+            "(ราคาล่าสุดของแต่ละพืช) ใหม่จากข้อมูลราคารายวัน")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crop-id', type=int, nargs='+', dest='crop_ids',
+                            help="สร้างใหม่เฉพาะพืชที่ระบุ (ไม่ระบุ = ทุกพืช)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = rebuild_rollups(options['crop_ids'])
+            rebuild_snapshots(options['crop_ids'])
+        self.stdout.write(f"✅ สร้าง PriceRollup ใหม่ {written} แถว และอัปเดต PriceSnapshot แล้ว")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from crops.ingest.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "รันงานนำเข้าราคาที่อยู่ในคิว (ImportJob) ทีละงาน"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="เวลารอ (วินาที) ก่อนตรวจคิวใหม่เมื่อไม่มีงาน")
+        parser.add_argument('--once', action='store_true',
+                            help="รันงานที่ค้างอยู่ทั้งหมดแล้วจบการทำงาน")
+
+    def handle(self, *args, **options):
+        self.stdout.write("🚜 เริ่ม import worker")
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"▶️ เริ่มงาน #{job.job_id} ({job.kind}, {job.files_total} ไฟล์)")
+            run_job(job)
+            job.refresh_from_db()
+            self.stdout.write(f"⏹️ งาน #{job.job_id} {job.status} ({job.files_done}/{job.files_total} ไฟล์)")
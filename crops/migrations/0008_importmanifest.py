@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0007_alter_crop_crop_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportManifest',
+            fields=[
+                ('manifest_id', models.AutoField(primary_key=True, serialize=False)),
+                ('file_path', models.CharField(max_length=1024, unique=True)),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_size', models.BigIntegerField()),
+                ('file_mtime', models.FloatField()),
+                ('content_hash', models.CharField(help_text='SHA-256 ของเนื้อหาไฟล์', max_length=64)),
+                ('row_count', models.IntegerField(default=0, help_text='จำนวนแถวที่ใช้ได้ในไฟล์ตอนนำเข้าล่าสุด')),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
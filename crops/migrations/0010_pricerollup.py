@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0009_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('rollup_id', models.AutoField(primary_key=True, serialize=False)),
+                ('period', models.CharField(choices=[('week', 'รายสัปดาห์'), ('month', 'รายเดือน'), ('quarter', 'รายไตรมาส'), ('year', 'รายปี')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('day_count', models.IntegerField(help_text='จำนวนวันที่มีราคาในช่วงนี้')),
+                ('price_sum', models.DecimalField(decimal_places=2, help_text='ผลรวม average_price รายวัน', max_digits=14)),
+                ('average_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('first_date', models.DateField()),
+                ('first_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('last_date', models.DateField()),
+                ('last_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('crop', models.ForeignKey(db_column='crop_id', on_delete=django.db.models.deletion.CASCADE, to='crops.crop')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('crop', 'period', 'period_start'), name='unique_price_rollup_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0010_pricerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSnapshot',
+            fields=[
+                ('snapshot_id', models.AutoField(primary_key=True, serialize=False)),
+                ('latest_date', models.DateField(blank=True, null=True)),
+                ('latest_average_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('latest_min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('latest_max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('previous_date', models.DateField(blank=True, null=True)),
+                ('previous_average_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('crop', models.OneToOneField(db_column='crop_id', on_delete=django.db.models.deletion.CASCADE, related_name='price_snapshot', to='crops.crop')),
+            ],
+        ),
+    ]
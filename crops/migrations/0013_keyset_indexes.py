@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0012_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cropvariable',
+            index=models.Index(fields=['date', 'variable_id'], name='cropvariable_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predicteddata',
+            index=models.Index(fields=['predicted_date', 'predicted_id'], name='predicted_date_id_idx'),
+        ),
+    ]
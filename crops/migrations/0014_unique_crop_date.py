@@ -0,0 +1,155 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:02
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+DELETE_BATCH_SIZE = 1000
+# ความถี่ของ pandas Period ต่อชนิดช่วงเวลาของ PriceRollup (เหมือน crops/ingest/rollups.py ณ migration นี้)
+PERIOD_FREQS = {'week': 'W-SUN', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+_CENT = Decimal('0.01')
+
+
+def _delete_duplicates(model, date_field, pk_field):
+    """
+    ลบแถวซ้ำ (crop, วันที่) ให้เหลือแถวเดียว: เก็บแถวที่ pk มากที่สุด (เขียนล่าสุด)
+    ตรงกับการนำเข้าที่ให้แถวหลังสุดชนะ ผลจึงเหมือนกันทุกครั้งที่รัน
+    คืนค่า set ของ crop_id ที่มีแถวถูกลบ
+    """
+    duplicates = list(
+        model.objects.annotate(
+            row_number=Window(
+                RowNumber(), partition_by=[F('crop_id'), F(date_field)], order_by=F(pk_field).desc(),
+            )
+        ).filter(row_number__gt=1).values_list(pk_field, 'crop_id')
+    )
+    pks = [pk for pk, _ in duplicates]
+    for start in range(0, len(pks), DELETE_BATCH_SIZE):
+        model.objects.filter(pk__in=pks[start:start + DELETE_BATCH_SIZE]).delete()
+    return len(pks), {crop_id for _, crop_id in duplicates}
+
+
+def _bump_versions(DataVersion, scopes):
+    """ เพิ่มเวอร์ชันข้อมูลให้ response cache / export cache ไม่ตอบข้อมูลที่มีแถวซ้ำ (เหมือน bump_versions) """
+    existing = set(DataVersion.objects.filter(scope__in=scopes).values_list('scope', flat=True))
+    DataVersion.objects.filter(scope__in=existing).update(version=F('version') + 1)
+    DataVersion.objects.bulk_create([DataVersion(scope=scope, version=1) for scope in set(scopes) - existing])
+
+
+def _price(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _rebuild_rollups(apps, crop_ids):
+    """
+    สร้าง PriceRollup ของพืชที่ระบุใหม่ทั้งหมดจากราคารายวันที่เหลือหลังลบแถวซ้ำ
+    (ผลเหมือน rebuild_rollups ของ crops/ingest/rollups.py แต่ใช้ model ของ migration)
+    """
+    CropVariable = apps.get_model('crops', 'CropVariable')
+    PriceRollup = apps.get_model('crops', 'PriceRollup')
+    PriceRollup.objects.filter(crop_id__in=crop_ids).delete()
+    rows = CropVariable.objects.filter(crop_id__in=crop_ids).order_by('crop_id', 'date').values_list(
+        'crop_id', 'date', 'average_price', 'min_price', 'max_price'
+    )
+    daily = pd.DataFrame.from_records(list(rows), columns=['crop_id', 'date', 'average', 'min', 'max'])
+    if daily.empty:
+        return
+    # รวมในหน่วยสตางค์ (int) เพื่อไม่ให้มี error ของทศนิยม
+    for column in ('average', 'min', 'max'):
+        daily[column] = (daily[column].astype('float64') * 100).round().astype('int64')
+    daily['date'] = pd.to_datetime(daily['date'])
+
+    for period, freq in PERIOD_FREQS.items():
+        periods = daily['date'].dt.to_period(freq)
+        grouped = daily.assign(
+            period_start=periods.dt.start_time.dt.date,
+            period_end=periods.dt.end_time.dt.date,
+        ).groupby(['crop_id', 'period_start'], sort=False).agg(
+            period_end=('period_end', 'first'),
+            day_count=('average', 'size'),
+            price_sum=('average', 'sum'),
+            min_price=('min', 'min'),
+            max_price=('max', 'max'),
+            first_date=('date', 'first'),
+            first_price=('average', 'first'),
+            last_date=('date', 'last'),
+            last_price=('average', 'last'),
+        )
+        PriceRollup.objects.bulk_create([
+            PriceRollup(
+                crop_id=int(crop_id),
+                period=period,
+                period_start=start,
+                period_end=agg['period_end'],
+                day_count=int(agg['day_count']),
+                price_sum=_price(agg['price_sum']),
+                average_price=(_price(agg['price_sum']) / int(agg['day_count'])).quantize(
+                    _CENT, rounding=ROUND_HALF_UP),
+                min_price=_price(agg['min_price']),
+                max_price=_price(agg['max_price']),
+                first_date=agg['first_date'].date(),
+                first_price=_price(agg['first_price']),
+                last_date=agg['last_date'].date(),
+                last_price=_price(agg['last_price']),
+            )
+            for (crop_id, start), agg in grouped.iterrows()
+        ], batch_size=DELETE_BATCH_SIZE)
+
+
+def _rebuild_snapshots(apps, crop_ids):
+    """ PriceSnapshot (ราคาวันล่าสุด + วันก่อนหน้า) ของพืชที่ระบุใหม่ (หลังลบแถวซ้ำแต่ละวันมีแถวเดียว) """
+    CropVariable = apps.get_model('crops', 'CropVariable')
+    PriceSnapshot = apps.get_model('crops', 'PriceSnapshot')
+    PriceSnapshot.objects.filter(crop_id__in=crop_ids).delete()
+    snapshots = []
+    for crop_id in crop_ids:
+        latest = list(CropVariable.objects.filter(crop_id=crop_id).order_by('-date')[:2])
+        snapshot = PriceSnapshot(crop_id=crop_id)
+        if latest:
+            snapshot.latest_date = latest[0].date
+            snapshot.latest_average_price = latest[0].average_price
+            snapshot.latest_min_price = latest[0].min_price
+            snapshot.latest_max_price = latest[0].max_price
+        if len(latest) > 1:
+            snapshot.previous_date = latest[1].date
+            snapshot.previous_average_price = latest[1].average_price
+        snapshots.append(snapshot)
+    PriceSnapshot.objects.bulk_create(snapshots)
+
+
+def collapse_duplicates(apps, schema_editor):
+    CropVariable = apps.get_model('crops', 'CropVariable')
+    PredictedData = apps.get_model('crops', 'PredictedData')
+    price_count, price_crops = _delete_duplicates(CropVariable, 'date', 'variable_id')
+    predicted_count, predicted_crops = _delete_duplicates(PredictedData, 'predicted_date', 'predicted_id')
+    if not (price_count or predicted_count):
+        return
+    if price_count:
+        # PriceRollup / PriceSnapshot ของพืชเหล่านี้ยังคำนวณจากแถวซ้ำเดิม
+        crop_ids = sorted(price_crops)
+        _rebuild_rollups(apps, crop_ids)
+        _rebuild_snapshots(apps, crop_ids)
+    scopes = [f"crop:{crop_id}" for crop_id in price_crops | predicted_crops]
+    _bump_versions(apps.get_model('crops', 'DataVersion'), scopes + (["prices"] if price_count else []))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0013_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cropvariable',
+            constraint=models.UniqueConstraint(fields=('crop', 'date'), name='cropvariable_crop_date_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='predicteddata',
+            constraint=models.UniqueConstraint(fields=('crop', 'predicted_date'), name='predicted_crop_date_uniq'),
+        ),
+    ]
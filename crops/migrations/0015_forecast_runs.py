@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0014_unique_crop_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentForecast',
+            fields=[
+                ('current_id', models.AutoField(primary_key=True, serialize=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ForecastRun',
+            fields=[
+                ('run_id', models.AutoField(primary_key=True, serialize=False)),
+                ('model_version', models.CharField(help_text='ไฟล์โมเดลและเวลาแก้ไขไฟล์ที่ใช้พยากรณ์', max_length=255)),
+                ('data_watermark', models.DateField(blank=True, help_text='วันที่ล่าสุดของราคาที่ใช้พยากรณ์', null=True)),
+                ('horizon_start', models.DateField(blank=True, null=True)),
+                ('horizon_end', models.DateField(blank=True, null=True)),
+                ('row_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name='predicteddata',
+            name='predicted_crop_date_uniq',
+        ),
+        migrations.AddField(
+            model_name='currentforecast',
+            name='crop',
+            field=models.OneToOneField(db_column='crop_id', on_delete=django.db.models.deletion.CASCADE, related_name='current_forecast', to='crops.crop'),
+        ),
+        migrations.AddField(
+            model_name='forecastrun',
+            name='crop',
+            field=models.ForeignKey(db_column='crop_id', on_delete=django.db.models.deletion.CASCADE, related_name='forecast_runs', to='crops.crop'),
+        ),
+        migrations.AddField(
+            model_name='currentforecast',
+            name='run',
+            field=models.OneToOneField(db_column='run_id', on_delete=django.db.models.deletion.PROTECT, related_name='current_for', to='crops.forecastrun'),
+        ),
+        # ยังเป็น null ได้: 0016 ย้ายค่าพยากรณ์เดิมเข้ารอบ legacy แล้ว 0017 จึงบังคับ NOT NULL
+        # (แยก migration เพื่อให้ข้อมูลและ DDL อยู่คนละ transaction: PostgreSQL ไม่ยอม ALTER TABLE
+        # ที่ยังมี trigger event ของ foreign key ค้างอยู่จากการ UPDATE ใน transaction เดียวกัน)
+        migrations.AddField(
+            model_name='predicteddata',
+            name='run',
+            field=models.ForeignKey(db_column='run_id', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='crops.forecastrun'),
+        ),
+    ]
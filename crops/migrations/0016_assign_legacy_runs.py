@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:10
+
+from django.db import migrations
+from django.db.models import Count, Max, Min
+
+
+def assign_legacy_runs(apps, schema_editor):
+    """
+    ค่าพยากรณ์ที่มีอยู่ก่อนแล้วย้ายเข้ารอบ "legacy" หนึ่งรอบต่อพืช และตั้งเป็นรอบปัจจุบัน
+    ผลที่แสดงบน API จึงเหมือนเดิมจนกว่าจะพยากรณ์รอบใหม่
+    """
+    PredictedData = apps.get_model('crops', 'PredictedData')
+    ForecastRun = apps.get_model('crops', 'ForecastRun')
+    CurrentForecast = apps.get_model('crops', 'CurrentForecast')
+    CropVariable = apps.get_model('crops', 'CropVariable')
+
+    watermarks = dict(CropVariable.objects.values('crop_id').annotate(latest=Max('date')).values_list('crop_id', 'latest'))
+    per_crop = PredictedData.objects.values('crop_id').annotate(
+        rows=Count('pk'), first=Min('predicted_date'), last=Max('predicted_date'),
+    ).order_by('crop_id')
+    for item in per_crop:
+        run = ForecastRun.objects.create(
+            crop_id=item['crop_id'], model_version='legacy', data_watermark=watermarks.get(item['crop_id']),
+            horizon_start=item['first'], horizon_end=item['last'], row_count=item['rows'],
+        )
+        PredictedData.objects.filter(crop_id=item['crop_id']).update(run=run)
+        CurrentForecast.objects.create(crop_id=item['crop_id'], run=run)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0015_forecast_runs'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_legacy_runs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0016_assign_legacy_runs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='predicteddata',
+            name='run',
+            field=models.ForeignKey(db_column='run_id', on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='crops.forecastrun'),
+        ),
+        migrations.AddConstraint(
+            model_name='predicteddata',
+            constraint=models.UniqueConstraint(fields=('run', 'predicted_date'), name='predicted_run_date_uniq'),
+        ),
+    ]
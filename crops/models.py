@@ -44,6 +44,17 @@ class CropVariable(models.Model):
     date = models.DateField()
     file_name = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta:
+        # ลำดับ (date, variable_id) ของ keyset pagination แบบทุกพืช
+        indexes = [
+            models.Index(fields=['date', 'variable_id'], name='cropvariable_date_id_idx'),
+        ]
+        # ราคาหนึ่งแถวต่อพืชต่อวัน (key ของการนำเข้า) index นี้ใช้กับการค้นช่วงวันที่ของพืช
+        # และ keyset pagination ที่กรองตามพืชด้วย (ภายในพืชเดียว date ไม่ซ้ำ ลำดับจึงไม่ต้องใช้ variable_id)
+        constraints = [
+            models.UniqueConstraint(fields=['crop', 'date'], name='cropvariable_crop_date_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.crop.crop_name} - {self.date}"
 
@@ -56,9 +67,27 @@ class PredictedData(models.Model):
         on_delete=models.CASCADE,
         db_column='crop_id'
     )
+    # ทุกแถวเป็นของการพยากรณ์หนึ่งรอบ (ForecastRun) ค่าที่ใช้แสดงผลคือรอบที่ CurrentForecast ของพืชชี้อยู่
+    run = models.ForeignKey(
+        'ForecastRun',
+        on_delete=models.CASCADE,
+        db_column='run_id',
+        related_name='predictions'
+    )
     predicted_date = models.DateField()
     predicted_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        # ลำดับ (predicted_date, predicted_id) ของ keyset pagination แบบทุกพืช
+        indexes = [
+            models.Index(fields=['predicted_date', 'predicted_id'], name='predicted_date_id_idx'),
+        ]
+        # ค่าพยากรณ์หนึ่งค่าต่อวันในแต่ละรอบ (index นี้ใช้อ่านค่าของรอบปัจจุบันตามช่วงวันที่
+        # และ keyset pagination ที่กรองตามพืชด้วย: แต่ละพืชมีรอบปัจจุบันรอบเดียว)
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'predicted_date'], name='predicted_run_date_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.crop.crop_name} - {self.predicted_date}"
 
@@ -76,3 +105,180 @@ class CropModelMapping(models.Model):
 
     def __str__(self):
         return f"{self.crop.crop_name} -> {self.model_path}"
+
+
+# 5. Import Manifest Table
+class ImportManifest(models.Model):
+    manifest_id = models.AutoField(primary_key=True)
+    # หนึ่งแถวต่อไฟล์ราคา ใช้ตรวจว่าไฟล์เปลี่ยนไปหรือไม่ตั้งแต่การนำเข้าครั้งล่าสุด
+    # key คือ path เต็มของไฟล์ (ไฟล์ชื่อเดียวกันจากคนละโฟลเดอร์เป็นคนละแถว) file_name เก็บไว้แสดงผล
+    file_path = models.CharField(max_length=1024, unique=True)
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField()
+    file_mtime = models.FloatField()
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 ของเนื้อหาไฟล์")
+    row_count = models.IntegerField(default=0, help_text="จำนวนแถวที่ใช้ได้ในไฟล์ตอนนำเข้าล่าสุด")
+    imported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.imported_at:%Y-%m-%d %H:%M})"
+
+
+# 6. Import Job Table
+class ImportJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'รอคิว'),
+        (STATUS_RUNNING, 'กำลังทำงาน'),
+        (STATUS_DONE, 'เสร็จแล้ว'),
+        (STATUS_FAILED, 'ล้มเหลว'),
+    ]
+    KIND_FILE = 'file'      # นำเข้าไฟล์เดียว (update-prices/)
+    KIND_FOLDER = 'folder'  # นำเข้าทุกไฟล์ในโฟลเดอร์ (update-all-prices/)
+
+    job_id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=20)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    files_total = models.IntegerField(default=0)
+    files_done = models.IntegerField(default=0)
+    rows_inserted = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_unchanged = models.IntegerField(default=0)
+    rows_skipped = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # worker อัปเดต heartbeat_at ตอนรับงานและทุกครั้งที่จบหนึ่งไฟล์ งานที่ heartbeat เก่าเกิน
+    # IMPORT_JOB_STALE_SECONDS ถือว่า worker หยุดไปแล้ว (ดู crops/ingest/jobs.py)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)  # จำนวนครั้งที่ถูก worker หยิบไปรัน
+
+    def __str__(self):
+        return f"#{self.job_id} {self.kind} ({self.status})"
+
+
+# 7. Price Rollup Table
+class PriceRollup(models.Model):
+    PERIOD_WEEK = 'week'
+    PERIOD_MONTH = 'month'
+    PERIOD_QUARTER = 'quarter'
+    PERIOD_YEAR = 'year'
+    PERIOD_CHOICES = [
+        (PERIOD_WEEK, 'รายสัปดาห์'),
+        (PERIOD_MONTH, 'รายเดือน'),
+        (PERIOD_QUARTER, 'รายไตรมาส'),
+        (PERIOD_YEAR, 'รายปี'),
+    ]
+
+    rollup_id = models.AutoField(primary_key=True)
+    # ราคารวมต่อพืชต่อช่วงเวลา คำนวณจาก CropVariable และอัปเดตเฉพาะช่วงที่ถูกนำเข้าใหม่
+    crop = models.ForeignKey(
+        Crop,
+        on_delete=models.CASCADE,
+        db_column='crop_id'
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    day_count = models.IntegerField(help_text="จำนวนวันที่มีราคาในช่วงนี้")
+    price_sum = models.DecimalField(max_digits=14, decimal_places=2, help_text="ผลรวม average_price รายวัน")
+    average_price = models.DecimalField(max_digits=10, decimal_places=2)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2)
+    first_date = models.DateField()
+    first_price = models.DecimalField(max_digits=10, decimal_places=2)
+    last_date = models.DateField()
+    last_price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['crop', 'period', 'period_start'], name='unique_price_rollup_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.crop.crop_name} - {self.period} {self.period_start}"
+
+
+# 8. Price Snapshot Table
+class PriceSnapshot(models.Model):
+    snapshot_id = models.AutoField(primary_key=True)
+    # ราคาวันล่าสุดและวันก่อนหน้าของแต่ละพืช (ใช้ในหน้ารวมการ์ดพืช) ผู้นำเข้าราคาเป็นผู้อัปเดต
+    # latest_date เป็น null = พืชนี้ยังไม่มีข้อมูลราคา
+    crop = models.OneToOneField(
+        Crop,
+        on_delete=models.CASCADE,
+        db_column='crop_id',
+        related_name='price_snapshot'
+    )
+    latest_date = models.DateField(null=True, blank=True)
+    latest_average_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    latest_min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    latest_max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    previous_date = models.DateField(null=True, blank=True)
+    previous_average_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.crop.crop_name} @ {self.latest_date}"
+
+
+# 9. Data Version Table
+class DataVersion(models.Model):
+    version_id = models.AutoField(primary_key=True)
+    # เลขเวอร์ชันของข้อมูลแต่ละขอบเขต (เช่น "crop:5", "prices", "catalog") ใช้เป็นส่วนหนึ่งของ key ของ response cache
+    # ตัวนำเข้าราคา/การพยากรณ์/การแก้ Crop จะเพิ่มเลขนี้ cache เดิมจึงไม่ถูกใช้อีกโดยไม่ต้องตั้ง TTL
+    scope = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
+# 10. Forecast Run Table
+class ForecastRun(models.Model):
+    run_id = models.AutoField(primary_key=True)
+    # การพยากรณ์หนึ่งรอบของพืชหนึ่งชนิด แถวใน PredictedData ของรอบถูก insert ครั้งเดียวและไม่ถูกแก้อีก
+    crop = models.ForeignKey(
+        Crop,
+        on_delete=models.CASCADE,
+        db_column='crop_id',
+        related_name='forecast_runs'
+    )
+    model_version = models.CharField(max_length=255, help_text="ไฟล์โมเดลและเวลาแก้ไขไฟล์ที่ใช้พยากรณ์")
+    data_watermark = models.DateField(null=True, blank=True, help_text="วันที่ล่าสุดของราคาที่ใช้พยากรณ์")
+    horizon_start = models.DateField(null=True, blank=True)
+    horizon_end = models.DateField(null=True, blank=True)
+    row_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"#{self.run_id} {self.crop.crop_name} ({self.model_version})"
+
+
+# 11. Current Forecast Table
+class CurrentForecast(models.Model):
+    current_id = models.AutoField(primary_key=True)
+    # ตัวชี้รอบพยากรณ์ที่ใช้งานของแต่ละพืช เปลี่ยนด้วย statement เดียว ผู้อ่านจึงเห็นรอบเก่าหรือรอบใหม่ทั้งชุดเสมอ
+    crop = models.OneToOneField(
+        Crop,
+        on_delete=models.CASCADE,
+        db_column='crop_id',
+        related_name='current_forecast'
+    )
+    run = models.OneToOneField(
+        ForecastRun,
+        on_delete=models.PROTECT,
+        db_column='run_id',
+        related_name='current_for'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.crop.crop_name} -> run #{self.run_id}"
@@ -0,0 +1,335 @@
+# crops/response_cache.py
+# cache ของ response ฝั่งอ่านข้อมูล: key = endpoint + พารามิเตอร์ที่ normalize แล้ว + เวอร์ชันข้อมูล (DataVersion)
+# ข้อมูลเปลี่ยนเมื่อไร (นำเข้าราคา / พยากรณ์ใหม่ / แก้ Crop) เวอร์ชันจะถูกเพิ่ม key เดิมจึงไม่ถูกใช้อีก
+# มี 2 ชั้น: LRU ในหน่วยความจำของ process และชั้นที่แชร์ระหว่าง process (ไม่บังคับ, ใช้ Django cache)
+# key เดียวกันใช้เป็น ETag: request ที่ส่ง If-None-Match ตรงกันจะได้ 304 โดยไม่รัน view เลย
+# รายการใน cache เก็บ body ที่บีบอัดแล้ว (br / gzip) ไว้ด้วย hit ถัดไปจึงส่ง bytes ได้ทันทีไม่ต้องบีบอัดซ้ำ
+# ใช้ได้ทั้ง view ปกติและ async view
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date
+
+from .compression import choose_encoding, compress, compressible, set_encoded_content
+from .crop_index import resolve_crop
+from .db_router import reading_from_replica
+from .models import DataVersion
+
+SCOPE_CATALOG = "catalog"  # รายชื่อ/รายละเอียดพืช (Crop)
+SCOPE_PRICES = "prices"    # ราคาของพืชใดก็ได้
+
+
+def crop_scope(crop_id):
+    """ ขอบเขตข้อมูลราคา/การพยากรณ์ของพืชหนึ่งชนิด """
+    return f"crop:{crop_id}"
+
+
+def _version_cache():
+    """ ชั้น shared ของ cache (ถ้าตั้งค่าไว้) ใช้เก็บเวอร์ชันข้อมูลด้วย เพื่อให้เช็ค cache/ETag ได้โดยไม่ query """
+    alias = getattr(settings, "RESPONSE_CACHE_SHARED_ALIAS", "")
+    return caches[alias] if alias else None
+
+
+def _version_key(scope):
+    return f"data-version:{scope}"
+
+
+def _load_versions(scopes):
+    versions = dict(DataVersion.objects.filter(scope__in=list(scopes)).values_list("scope", "version"))
+    return {scope: versions.get(scope, 0) for scope in scopes}
+
+
+def _publish_versions(scopes):
+    """ หลัง commit: เขียนเวอร์ชันล่าสุดจากฐานข้อมูลลงชั้น shared (ทับค่าที่ reader อาจใส่ไว้ก่อน commit) """
+    cache = _version_cache()
+    if cache is not None:
+        cache.set_many({_version_key(s): v for s, v in _load_versions(scopes).items()}, timeout=None)
+
+
+def bump_versions(scopes):
+    """ เพิ่มเวอร์ชันของขอบเขตที่ระบุ (เรียกใน transaction เดียวกับการเขียนข้อมูล) """
+    scopes = set(scopes)
+    if not scopes:
+        return
+    existing = set(DataVersion.objects.filter(scope__in=scopes).values_list("scope", flat=True))
+    if existing:
+        DataVersion.objects.filter(scope__in=existing).update(version=F("version") + 1)
+    DataVersion.objects.bulk_create(
+        [DataVersion(scope=scope, version=1) for scope in scopes - existing], ignore_conflicts=True
+    )
+    if _version_cache() is not None:
+        transaction.on_commit(lambda: _publish_versions(scopes))
+
+
+def current_versions(scopes):
+    """
+    คืนค่า dict {scope: version} ของขอบเขตที่ระบุ (ที่ยังไม่เคยถูกเพิ่มถือเป็น 0)
+    อ่านจากชั้น shared ก่อนถ้ามี ไม่เช่นนั้นใช้ query เดียวจาก DataVersion
+    ระหว่างอ่านจาก replica จะ query เวอร์ชันจาก replica เสมอ: ชั้น shared มีเวอร์ชันของฐานข้อมูลหลัก
+    ถ้าใช้ร่วมกับข้อมูลที่ replica ยังตามไม่ทัน ข้อมูลเก่าจะถูกเก็บไว้กับ key ของเวอร์ชันใหม่
+    """
+    if reading_from_replica():
+        return _load_versions(scopes)
+    cache = _version_cache()
+    if cache is None:
+        return _load_versions(scopes)
+    found = cache.get_many([_version_key(scope) for scope in scopes])
+    versions = {scope: found[_version_key(scope)] for scope in scopes if _version_key(scope) in found}
+    missing = [scope for scope in scopes if scope not in versions]
+    if missing:
+        loaded = _load_versions(missing)
+        for scope, version in loaded.items():
+            # add (ไม่ทับ) เพื่อไม่ให้ค่าที่อ่านก่อน commit ไปทับค่าที่ผู้เพิ่มเวอร์ชันเขียนไว้หลัง commit
+            cache.add(_version_key(scope), version, timeout=None)
+        versions.update(loaded)
+    return versions
+
+
+class LRUCache:
+    """ cache ขนาดจำกัดใน process ตัดรายการที่ไม่ได้ใช้นานที่สุดออกเมื่อเต็ม """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResponseCache:
+    """ cache 2 ชั้น (LRU ใน process -> shared) พร้อมตัวนับ hit/miss """
+
+    def __init__(self, max_entries, shared_alias=None):
+        self.local = LRUCache(max_entries)
+        self.shared_alias = shared_alias or None
+        self._lock = threading.Lock()
+        self.counters = {"local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+                self._count("shared_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            # key มีเวอร์ชันข้อมูลอยู่แล้ว จึงไม่ต้องหมดอายุ (ชั้น shared จะตัดรายการเก่าเองตาม MAX_ENTRIES)
+            self.shared.set(key, value, timeout=None)
+        self._count("stores")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters["local_hits"] + counters["shared_hits"] + counters["misses"]
+        hits = counters["local_hits"] + counters["shared_hits"]
+        return {
+            **counters,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+            "local_entries": len(self.local),
+            "local_max_entries": self.local.max_entries,
+            "shared_alias": self.shared_alias,
+        }
+
+
+response_cache = ResponseCache(
+    getattr(settings, "RESPONSE_CACHE_MAX_ENTRIES", 256),
+    getattr(settings, "RESPONSE_CACHE_SHARED_ALIAS", ""),
+)
+
+
+def _normalize_value(value):
+    value = value.strip()
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    return parsed.isoformat() if parsed else value
+
+
+def _normalize_params(request, crop_param=None, crop=None):
+    """ พารามิเตอร์ที่ใช้ใน key: เรียงตามชื่อ ตัดช่องว่าง วันที่แปลงเป็น ISO และชื่อพืชแทนด้วย crop_id """
+    params = []
+    for name, values in sorted(request.GET.lists()):
+        if name == crop_param:
+            values = [f"crop_id={crop.crop_id}"]
+        else:
+            values = [_normalize_value(value) for value in values]
+        params.append((name, values))
+    return params
+
+
+def _etag_matches(request, etag):
+    """ เทียบ If-None-Match กับ ETag แบบ weak comparison ตาม RFC 9110 """
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def _finish(response, etag, cache_status):
+    response["ETag"] = etag
+    response["X-Cache"] = cache_status
+    # ให้ browser ถามทุกครั้งด้วย If-None-Match (ได้ 304 ถ้าข้อมูลไม่เปลี่ยน)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def _with_encoding(entry, encoding):
+    """
+    entry ที่มี body บีบอัดด้วย encoding ของ request นี้ (บีบอัดด้วยระดับของ cache ถ้ายังไม่มี)
+    คืน dict ใหม่แทนการแก้ของเดิมที่ thread อื่นอาจกำลังอ่านอยู่ ถ้าไม่ต้องบีบอัดคืน entry เดิม
+    """
+    if encoding is None or encoding in entry or not compressible(entry["content_type"], len(entry["content"])):
+        return entry
+    return {**entry, encoding: compress(entry["content"], encoding, cached=True)}
+
+
+def _send(response, entry, encoding):
+    encoded = entry.get(encoding) if encoding else None
+    return set_encoded_content(response, encoded, encoding) if encoded is not None else response
+
+
+def cached_response(endpoint, scopes=(), crop_param=None, crops_from=None):
+    """
+    decorator สำหรับ view ฝั่งอ่าน (ใช้ครอบ @api_view หรือ async view) ให้ตอบจาก cache เมื่อข้อมูลไม่เปลี่ยน
+      - scopes: ขอบเขตข้อมูลที่ response นี้ขึ้นอยู่ เช่น (SCOPE_CATALOG,)
+      - crop_param: ชื่อ query parameter ที่เป็นชื่อพืช response จะขึ้นกับ crop:<id> ของพืชนั้นด้วย
+        (ถ้าหาพืชไม่เจอ จะไม่ใช้ cache และให้ view ตอบ error ตามเดิม)
+      - crops_from: ฟังก์ชัน (request) -> list ของ Crop สำหรับ response ที่ขึ้นกับหลายพืช
+        (ได้ list ว่างจะไม่ใช้ cache)
+    cache เฉพาะ response ที่ status 200 และใส่ header X-Cache: HIT/MISS
+    ทุก response มี ETag (strong) จาก key ของ cache ถ้า If-None-Match ตรงกันจะตอบ 304 ทันที
+    body ถูกบีบอัดตาม Accept-Encoding ที่นี่ (เก็บผลไว้ใน cache) CompressionMiddleware จึงข้าม response เหล่านี้
+    async view: ส่วนที่ query / อ่าน cache รันผ่าน sync_to_async ส่วน view รันบน event loop ตามเดิม
+    """
+    def lookup(request, kwargs):
+        """
+        คืนค่า None ถ้า request นี้ไม่ใช้ cache ไม่เช่นนั้นคืน (key, etag, encoding, response)
+        response ไม่เป็น None เมื่อตอบได้ทันที (304 หรือ HIT)
+        """
+        if request.method != "GET" or not getattr(settings, "RESPONSE_CACHE_ENABLED", True):
+            return None
+
+        key_scopes = list(scopes)
+        crop = None
+        if crop_param:
+            crop = resolve_crop(request.GET.get(crop_param, ""))
+            if crop is None:
+                return None
+            key_scopes.append(crop_scope(crop.crop_id))
+        if crops_from:
+            crops = crops_from(request)
+            if not crops:
+                return None
+            key_scopes.extend(crop_scope(c.crop_id) for c in crops)
+
+        # อ่านเวอร์ชันก่อนคำนวณ response: ถ้าข้อมูลเปลี่ยนระหว่างนั้น response จะถูกเก็บไว้กับเวอร์ชันเก่าเท่านั้น
+        raw_key = json.dumps(
+            [endpoint, request.get_host(), _normalize_params(request, crop_param, crop),
+             sorted(current_versions(key_scopes).items()), sorted(kwargs.items())],
+            ensure_ascii=False, default=str,
+        )
+        digest = hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+        key = f"response:{endpoint}:{digest}"
+        etag = f'"{digest[:32]}"'
+
+        if _etag_matches(request, etag):
+            return key, etag, None, _finish(HttpResponseNotModified(), etag, "NOT-MODIFIED")
+
+        encoding = choose_encoding(request)
+        entry = response_cache.get(key)
+        if entry is None:
+            return key, etag, encoding, None
+        response = HttpResponse(entry["content"], status=entry["status"], content_type=entry["content_type"])
+        updated = _with_encoding(entry, encoding)
+        if updated is not entry:
+            response_cache.set(key, updated)
+        return key, etag, encoding, _send(_finish(response, etag, "HIT"), updated, encoding)
+
+    def store(key, etag, encoding, response):
+        """ เก็บ response ที่ view สร้าง (เฉพาะ 200 ที่ไม่ใช่ streaming) แล้วคืน response ที่จะส่ง """
+        if hasattr(response, "render") and not getattr(response, "is_rendered", True):
+            response.render()
+        if response.status_code != 200 or response.streaming:
+            return response
+        entry = _with_encoding(
+            {"status": response.status_code, "content_type": response["Content-Type"], "content": response.content},
+            encoding,
+        )
+        response_cache.set(key, entry)
+        return _send(_finish(response, etag, "MISS"), entry, encoding)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                cached = await sync_to_async(lookup)(request, kwargs)
+                if cached is None:
+                    return await view(request, *args, **kwargs)
+                key, etag, encoding, response = cached
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                return await sync_to_async(store)(key, etag, encoding, response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            cached = lookup(request, kwargs)
+            if cached is None:
+                return view(request, *args, **kwargs)
+            key, etag, encoding, response = cached
+            if response is not None:
+                return response
+            return store(key, etag, encoding, view(request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,248 @@
+# crops/series_store.py
+# ที่เก็บราคารายวันและค่าพยากรณ์ของแต่ละพืชในหน่วยความจำ (ต่อ process) เป็น NumPy array ต่อเนื่อง
+#   - วันที่เก็บเป็น int32 (จำนวนวันนับจาก 1970-01-01) ราคาเก็บเป็น float64 เรียงตามวันที่
+#   - โหลดเมื่อมีการขอครั้งแรก (ทั้งประวัติของพืชนั้นด้วย query เดียวต่อตาราง) แล้วใช้ซ้ำจนกว่าเวอร์ชันข้อมูล
+#     crop:<id> (DataVersion) จะเปลี่ยน: นำเข้าราคา / พยากรณ์ใหม่แล้ว request ถัดไปจะโหลดพืชนั้นใหม่เอง
+#   - ตัดช่วงวันที่ด้วย searchsorted แทนการ query ช่วงวันที่และแปลง Decimal ทีละแถวทุก request
+#   - async view ใช้ aget_series: query ราคาจริงและค่าพยากรณ์รันพร้อมกันคนละ connection
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .forecast_runs import current_predictions
+from .models import CropVariable
+from .response_cache import crop_scope, current_versions
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+_EMPTY_DAYS = np.empty(0, dtype=np.int32)
+_EMPTY_PRICES = np.empty(0, dtype=np.float64)
+
+
+def to_day(value):
+    """ datetime.date -> จำนวนวันนับจาก 1970-01-01 """
+    return int((np.datetime64(value, "D") - _EPOCH).astype(np.int64))
+
+
+def day_strings(days):
+    """ array ของจำนวนวัน -> list ของวันที่รูปแบบ ISO (YYYY-MM-DD) """
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
+
+def day_dates(days):
+    """ array ของจำนวนวัน -> list ของ datetime.date """
+    return days.astype("datetime64[D]").tolist()
+
+
+class CropSeries:
+    """
+    ราคาทั้งหมดของพืชหนึ่งชนิด (array ทุกตัวเป็น read-only)
+      - days, min, max, avg: ราคาจริงรายวัน (หนึ่งแถวต่อวัน ตาม unique (crop, date))
+      - pred_days, pred: ค่าพยากรณ์รายวัน
+    """
+
+    def __init__(self, crop_id, version, days, low, high, average, pred_days, pred):
+        self.crop_id = crop_id
+        self.version = version
+        self.days, self.min, self.max, self.avg = days, low, high, average
+        self.pred_days, self.pred = pred_days, pred
+        for values in (days, low, high, average, pred_days, pred):
+            values.setflags(write=False)
+
+    @staticmethod
+    def _bounds(days, start_date, end_date):
+        """ slice ของแถวที่ start_date <= วันที่ <= end_date """
+        return slice(
+            int(np.searchsorted(days, to_day(start_date), "left")),
+            int(np.searchsorted(days, to_day(end_date), "right")),
+        )
+
+    def history(self, start_date, end_date):
+        """ (days, min, max, avg) ของราคาจริงในช่วงวันที่ (view ของ array เดิม ไม่ copy) """
+        window = self._bounds(self.days, start_date, end_date)
+        return self.days[window], self.min[window], self.max[window], self.avg[window]
+
+    def forecast(self, start_date, end_date):
+        """ (days, predicted) ของค่าพยากรณ์ในช่วงวันที่ """
+        window = self._bounds(self.pred_days, start_date, end_date)
+        return self.pred_days[window], self.pred[window]
+
+    def closest_price(self, target_date):
+        """
+        ราคาเฉลี่ยของวันที่ใกล้ target_date ที่สุดในประวัติทั้งหมด (ห่างเท่ากันเลือกวันก่อน)
+        0.0 ถ้าไม่มีข้อมูลเลย
+        """
+        target, count = to_day(target_date), len(self.days)
+        before = int(np.searchsorted(self.days, target, "right")) - 1  # แถวสุดท้ายที่ <= target
+        after = int(np.searchsorted(self.days, target, "left"))  # แถวแรกที่ >= target
+        if before >= 0 and (after == count or target - self.days[before] <= self.days[after] - target):
+            return float(self.avg[before])
+        if after < count:
+            return float(self.avg[after])
+        return 0.0
+
+
+def _split(crop_ids, rows, width):
+    """ แยกแถว (crop_id, date, ค่า...) ที่เรียงตาม crop_id แล้วเป็น array ของแต่ละพืช """
+    grouped = {crop_id: [] for crop_id in crop_ids}
+    for row in rows:
+        grouped[row[0]].append(row[1:])
+    result = {}
+    for crop_id, values in grouped.items():
+        if not values:
+            result[crop_id] = (_EMPTY_DAYS.copy(), *(_EMPTY_PRICES.copy() for _ in range(width)))
+            continue
+        dates, *columns = zip(*values)
+        days = (np.array(dates, dtype="datetime64[D]") - _EPOCH).astype(np.int32)
+        result[crop_id] = (days, *(np.array(column, dtype=np.float64) for column in columns))
+    return result
+
+
+def _load_history(crop_ids):
+    as_float = {f"{name}_f": Cast(name, FloatField()) for name in ("min_price", "max_price", "average_price")}
+    return _split(crop_ids, CropVariable.objects.filter(crop_id__in=crop_ids).annotate(**as_float)
+                  .order_by("crop_id", "date", "variable_id")
+                  .values_list("crop_id", "date", "min_price_f", "max_price_f", "average_price_f"), 3)
+
+
+def _load_forecast(crop_ids):
+    return _split(crop_ids, current_predictions().filter(crop_id__in=crop_ids)
+                  .annotate(predicted_price_f=Cast("predicted_price", FloatField()))
+                  .order_by("crop_id", "predicted_date", "predicted_id")
+                  .values_list("crop_id", "predicted_date", "predicted_price_f"), 1)
+
+
+def _build(crop_ids, versions, history, forecast):
+    return {
+        crop_id: CropSeries(crop_id, versions[crop_scope(crop_id)], *history[crop_id], *forecast[crop_id])
+        for crop_id in crop_ids
+    }
+
+
+def load_series(crop_ids, versions):
+    """
+    โหลดประวัติทั้งหมดของพืชที่ระบุ (query ละ 1 ครั้งต่อตารางไม่ว่าจะกี่พืช) ราคาแปลงเป็น float ในฐานข้อมูล
+    ค่าพยากรณ์มาจากรอบปัจจุบัน (CurrentForecast) ของแต่ละพืช
+    """
+    return _build(crop_ids, versions, _load_history(crop_ids), _load_forecast(crop_ids))
+
+
+def own_connection(func):
+    """
+    รัน func ใน thread ของ executor ด้วย connection ของ thread นั้นเอง (query หลายตัวจึงรันพร้อมกันได้)
+    ปิดทุก connection ของ thread นั้นเมื่อรันเสร็จ: thread ของ executor ไม่มี request_finished มาปิดให้
+    และแต่ละ thread เปิด connection แยกกัน ถ้าปล่อยไว้ connection จะค้างตามจำนวน thread
+    ContextVar ถูก copy ไปด้วย การเลือก replica ของ crops/db_router.py จึงยังมีผล
+    """
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def aload_series(crop_ids, versions):
+    """ เหมือน load_series แต่ query ราคาจริงและค่าพยากรณ์พร้อมกัน """
+    history, forecast = await asyncio.gather(
+        own_connection(_load_history)(crop_ids), own_connection(_load_forecast)(crop_ids),
+    )
+    return _build(crop_ids, versions, history, forecast)
+
+
+class SeriesStore:
+    """ CropSeries ของพืชที่ถูกใช้ล่าสุดไม่เกิน max_crops ชนิด (LRU) """
+
+    def __init__(self, max_crops):
+        self.max_crops = max_crops
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, crop_ids):
+        """
+        คืนค่า dict {crop_id: CropSeries} ที่ตรงกับเวอร์ชันข้อมูลปัจจุบัน
+        เช็คเวอร์ชันด้วย query เดียว (หรือไม่มีเลยถ้ามี shared cache) และโหลดเฉพาะพืชที่ยังไม่มีหรือเก่าแล้ว
+        ระหว่าง transaction ที่ยังไม่ commit จะโหลดใหม่โดยไม่เก็บ (ข้อมูลอาจถูก rollback)
+        """
+        crop_ids = list(dict.fromkeys(crop_ids))
+        if not crop_ids:
+            return {}
+        # อ่านเวอร์ชันก่อนโหลด: ถ้าข้อมูลเปลี่ยนระหว่างนั้น array จะถูกเก็บกับเวอร์ชันเก่าและโหลดใหม่ในครั้งถัดไป
+        versions, in_transaction = self._versions(crop_ids)
+        if in_transaction or not self.max_crops:
+            return load_series(crop_ids, versions)
+        found = self._cached(crop_ids, versions)
+        missing = [crop_id for crop_id in crop_ids if crop_id not in found]
+        if missing:
+            found.update(self._keep(load_series(missing, versions)))
+        return {crop_id: found[crop_id] for crop_id in crop_ids}
+
+    async def aget_many(self, crop_ids):
+        """ get_many สำหรับ async view: พืชที่ต้องโหลดใหม่ใช้ aload_series (2 query พร้อมกัน) """
+        crop_ids = list(dict.fromkeys(crop_ids))
+        if not crop_ids:
+            return {}
+        versions, in_transaction = await sync_to_async(self._versions)(crop_ids)
+        if in_transaction:
+            # ต้องเห็นข้อมูลที่ยังไม่ commit จึงใช้ connection ของ transaction นั้น (query ทีละตัว)
+            return await sync_to_async(load_series)(crop_ids, versions)
+        if not self.max_crops:
+            return await aload_series(crop_ids, versions)
+        found = self._cached(crop_ids, versions)
+        missing = [crop_id for crop_id in crop_ids if crop_id not in found]
+        if missing:
+            found.update(self._keep(await aload_series(missing, versions)))
+        return {crop_id: found[crop_id] for crop_id in crop_ids}
+
+    @staticmethod
+    def _versions(crop_ids):
+        """ (เวอร์ชันข้อมูลของแต่ละพืช, อยู่ใน transaction หรือไม่) """
+        return current_versions([crop_scope(crop_id) for crop_id in crop_ids]), connection.in_atomic_block
+
+    def _cached(self, crop_ids, versions):
+        """ CropSeries ที่มีอยู่แล้วและตรงกับเวอร์ชันปัจจุบัน """
+        found = {}
+        with self._lock:
+            for crop_id in crop_ids:
+                series = self._series.get(crop_id)
+                if series is not None and series.version == versions[crop_scope(crop_id)]:
+                    self._series.move_to_end(crop_id)
+                    found[crop_id] = series
+        return found
+
+    def _keep(self, loaded):
+        with self._lock:
+            for crop_id, series in loaded.items():
+                self._series[crop_id] = series
+                self._series.move_to_end(crop_id)
+            while len(self._series) > self.max_crops:
+                self._series.popitem(last=False)
+        return loaded
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def __len__(self):
+        return len(self._series)
+
+
+series_store = SeriesStore(getattr(settings, "SERIES_STORE_MAX_CROPS", 256))
+
+
+def get_series(crop_ids):
+    """ dict {crop_id: CropSeries} ของพืชที่ระบุจากที่เก็บของ process นี้ """
+    return series_store.get_many(crop_ids)
+
+
+async def aget_series(crop_ids):
+    """ get_series สำหรับ async view """
+    return await series_store.aget_many(crop_ids)
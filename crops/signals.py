@@ -0,0 +1,21 @@
+# crops/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .crop_index import invalidate_crop_index
+from .response_cache import bump_versions, crop_scope, SCOPE_CATALOG
+from .models import Crop
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_delete, sender=Crop)
+def crop_changed(sender, instance, **kwargs):
+    """
+    ล้างดัชนีชื่อพืชทันที และอีกครั้งหลัง commit เพื่อให้ดัชนีใหม่เห็นข้อมูลที่ commit แล้ว
+    และเพิ่มเวอร์ชันข้อมูลของรายชื่อพืช/พืชนี้สำหรับ response cache
+    """
+    invalidate_crop_index()
+    transaction.on_commit(invalidate_crop_index)
+    bump_versions([SCOPE_CATALOG, crop_scope(instance.pk)])
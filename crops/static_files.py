@@ -0,0 +1,33 @@
+# crops/static_files.py
+# WhiteNoiseMiddleware ที่รองรับ ASGI: ตัวเดิมเป็น sync อย่างเดียว Django จึงต้องรันทุก request (รวม async view)
+# ใน thread และรอผลด้วย async_to_sync ตัวนี้ส่งต่อ request ที่ไม่ใช่ไฟล์ static บน event loop ได้เลย
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # DEBUG: ค้นไฟล์บนดิสก์ทุก request
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # เปิดไฟล์ใน thread (ไม่ block event loop)
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
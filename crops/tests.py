@@ -1,3 +1,1827 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from openpyxl import load_workbook
+
+from .api.downsample import DOWNSAMPLE_METHODS, downsample_series, parse_downsample
+from .api.exports import parquet_available
+from .api.pagination import DateKeysetPagination
+from .api.summary import overall_summary, series_summary
+from .compression import brotli, compress, compressible
+from .crop_index import CropIndex, crop_index, get_crop, invalidate_crop_index, resolve_crop, resolve_crop_list
+from .db_router import (
+    PIN_COOKIE, PrimaryReplicaRouter, ReadYourWritesMiddleware, read_from_replica, request_read_alias, use_primary,
+)
+from .forecast_runs import current_predictions, save_forecast_run
+from .ingest import jobs
+from .ingest.parallel import import_price_files
+from .ingest.pg_copy import load_price_chunks
+from .ingest.normalize import (
+    REASON_BAD_DATE, REASON_MISSING_CROP, REASON_MISSING_PRICE, frame_to_records, normalize_price_frame, parse_prices,
+    parse_thai_dates,
+)
+from .ingest.reader import (
+    CHUNK_SIZE, PriceFileError, _select_columns, iter_price_table, parse_price_file, parse_price_job,
+)
+from .ingest.rollups import PERIOD_FREQS, rebuild_rollups, refresh_rollups
+from .ingest.snapshots import rebuild_snapshots, refresh_snapshots
+from .ingest.upsert import bulk_upsert_crop_prices, refresh_derived, resolve_crops, save_price_chunks
+from .models import (
+    Crop, CropModelMapping, CropVariable, CurrentForecast, DataVersion, ImportJob, ImportManifest, PredictedData,
+    PriceRollup, PriceSnapshot,
+)
+from .response_cache import crop_scope, response_cache
+from .series_store import get_series, series_store
+
+
+def make_crop(name, days=30, start=date(2024, 1, 1)):
+    """ พืชพร้อมราคารายวัน days วันนับจาก start (ราคาเพิ่มวันละ 1 บาท) """
+    crop = Crop.objects.create(crop_name=name, unit="กก.")
+    CropVariable.objects.bulk_create([
+        CropVariable(crop=crop, date=start + timedelta(days=i), min_price=Decimal(9 + i),
+                     max_price=Decimal(11 + i), average_price=Decimal(10 + i), file_name="test.xls")
+        for i in range(days)
+    ])
+    return crop
+
+
+class PriceNormalizeTests(SimpleTestCase):
+    """ แปลงวันที่ไทย / ราคาแบบ vectorized และแยกแถวที่ใช้ได้ (clean) กับแถวที่ถูกข้าม (rejected) """
+
+    def test_thai_dates(self):
+        cases = [
+            ("4 ม.ค. 2564", date(2021, 1, 4)),
+            ("29 ก.พ. 2567", date(2024, 2, 29)),    # ปีอธิกสุรทิน
+            ("  31 ธ.ค.   2566 ", date(2023, 12, 31)),
+            ("วันพุธ 1 มี.ค. 2566", date(2023, 3, 1)),
+            ("29 ก.พ. 2566", None),                  # ไม่มีวันนี้
+            ("32 ม.ค. 2567", None),
+            ("1 มกราคม 2567", None),                 # ชื่อเดือนเต็ม
+            ("1 ม.ค. 67", None),                     # ปี 2 หลัก
+            ("2024-01-01", None),
+            ("", None),
+            (None, None),
+        ]
+        parsed = parse_thai_dates(pd.Series([raw for raw, _ in cases], dtype=object))
+        for (raw, expected), value in zip(cases, parsed):
+            with self.subTest(raw=raw):
+                self.assertEqual(None if pd.isna(value) else value.date(), expected)
+
+    def test_prices(self):
+        cases = [
+            ("1,234.50", 1234.5),
+            (" 12 ", 12.0),
+            ("1,000,000", 1000000.0),
+            ("0", 0.0),
+            ("-", None),
+            ("", None),
+            ("abc", None),
+            ("12.5.1", None),
+            (None, None),
+        ]
+        parsed = parse_prices(pd.Series([raw for raw, _ in cases], dtype=object))
+        self.assertEqual(parsed.dtype, "float64")
+        for (raw, expected), value in zip(cases, parsed):
+            with self.subTest(raw=raw):
+                self.assertEqual(None if pd.isna(value) else value, expected)
+        # คอลัมน์ที่เป็นตัวเลขอยู่แล้วไม่ต้องผ่าน string
+        self.assertEqual(parse_prices(pd.Series([1, 2.5])).tolist(), [1.0, 2.5])
+
+    def test_clean_rejected_split(self):
+        rows = [
+            # date, ชื่อสินค้า, เฉลี่ย, ต่ำสุด, สูงสุด, เหตุผลที่ถูกข้าม (None = ใช้ได้)
+            ("2 ม.ค. 2567", " คะน้า ", "1,020.5", "1,000", "1,050", None),
+            ("3 ม.ค. 2567", "คะน้า", "-", "10", "12", REASON_MISSING_PRICE),
+            ("4 ม.ค. 2567", "คะน้า", "11", "", "12", REASON_MISSING_PRICE),
+            ("ไม่ใช่วันที่", "คะน้า", "11", "10", "12", REASON_BAD_DATE),
+            ("5 ม.ค. 2567", "", "11", "10", "12", REASON_MISSING_CROP),
+            ("5 ม.ค. 2567", None, "11", "10", "12", REASON_MISSING_CROP),
+            # ผิดหลายอย่าง: ใช้เหตุผลตามลำดับการตรวจเดิม ราคา -> วันที่ -> ชื่อสินค้า
+            ("ไม่ใช่วันที่", "", "x", "10", "12", REASON_MISSING_PRICE),
+            ("ไม่ใช่วันที่", "", "11", "10", "12", REASON_BAD_DATE),
+            ("6 ม.ค. 2567", "กะหล่ำปลี", "20", "19", "21", None),
+        ]
+        frame = pd.DataFrame([row[:5] for row in rows],
+                             columns=["date", "ชื่อสินค้า", "ราคาเฉลี่ย", "ราคาต่ำสุด", "ราคาสูงสุด"])
+        clean, rejected = normalize_price_frame(frame)
+
+        self.assertEqual(frame_to_records(clean), [
+            {"crop_name": "คะน้า", "date": date(2024, 1, 2),
+             "average_price": 1020.5, "min_price": 1000.0, "max_price": 1050.0},
+            {"crop_name": "กะหล่ำปลี", "date": date(2024, 1, 6),
+             "average_price": 20.0, "min_price": 19.0, "max_price": 21.0},
+        ])
+        expected = [(row[0], row[5]) for row in rows if row[5] is not None]
+        self.assertEqual(list(zip(rejected["date"], rejected["reason"])), expected)
+        self.assertEqual(len(clean) + len(rejected), len(frame))
+
+
+SAMPLE_PRICE_FILE = os.path.join(os.path.dirname(__file__), "testdata", "sample_prices.xls")
+
+
+class PriceReaderTests(SimpleTestCase):
+    """
+    reader แบบ lxml iterparse ต้องได้ผลเดียวกับ pd.read_html เดิม
+    sample_prices.xls: แถวจริงจากไฟล์ที่ดาวน์โหลดมา + ราคามี comma, <div> ในช่อง, ราคา "-", วันที่ผิด,
+    ช่องราคาว่าง และตารางที่สองที่ต้องไม่ถูกอ่าน
+    """
+
+    def _read_html(self, file_path):
+        """ ขั้นตอนอ่านไฟล์ของ update_crop_prices เดิม """
+        return normalize_price_frame(_select_columns(pd.read_html(file_path)[0]))
+
+    def test_matches_read_html(self):
+        expected_clean, expected_rejected = self._read_html(SAMPLE_PRICE_FILE)
+        self.assertEqual((len(expected_clean), len(expected_rejected)), (10, 3))
+        for chunk_size in (1, 4, CHUNK_SIZE):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = list(iter_price_table(SAMPLE_PRICE_FILE, chunk_size))
+                self.assertEqual(len(chunks), -(-13 // chunk_size))
+                clean, rejected = normalize_price_frame(pd.concat(chunks, ignore_index=True))
+                assert_frame_equal(clean, expected_clean)
+                assert_frame_equal(rejected, expected_rejected)
+
+    def test_parse_price_file_matches_read_html(self):
+        clean, rejected = parse_price_file(SAMPLE_PRICE_FILE)
+        expected_clean, expected_rejected = self._read_html(SAMPLE_PRICE_FILE)
+        assert_frame_equal(clean, expected_clean)
+        assert_frame_equal(rejected, expected_rejected)
+
+    def test_unreadable_files(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        no_table = os.path.join(folder, "no_table.xls")
+        wrong_columns = os.path.join(folder, "wrong_columns.xls")
+        with open(no_table, "w", encoding="utf-8") as f:
+            f.write("<html><body><p>ไม่มีตาราง</p></body></html>")
+        with open(wrong_columns, "w", encoding="utf-8") as f:
+            f.write("<html><body><table><tr><th>วันที่</th></tr><tr><td>4 ม.ค. 2564</td></tr></table></body></html>")
+        for file_path, message in ((os.path.join(folder, "missing.xls"), "ไม่พบไฟล์"),
+                                   (no_table, "No tables found"),
+                                   (wrong_columns, "โครงสร้างไฟล์ไม่ถูกต้อง")):
+            with self.subTest(file=os.path.basename(file_path)):
+                with self.assertRaisesMessage(PriceFileError, message):
+                    list(iter_price_table(file_path))
+                clean, rejected, error, _ = parse_price_job(file_path)
+                self.assertEqual((clean, rejected, error), (None, None, message))
+
+
+def price_row(name, day, average, low=None, high=None):
+    """ แถวราคาในรูปแบบที่ bulk_upsert_crop_prices รับ """
+    return {"crop_name": name, "date": day, "average_price": average,
+            "min_price": average - 1 if low is None else low, "max_price": average + 1 if high is None else high}
+
+
+class PriceUpsertTests(TestCase):
+    """ bulk_upsert_crop_prices / save_price_chunks: จำนวนแถว insert/update/unchanged และสรุปแถวที่ถูกข้าม """
+
+    def setUp(self):
+        self.crop = make_crop("กะหล่ำปลี", days=3)
+
+    def test_counts_inserted_updated_unchanged(self):
+        changed = {}
+        counts = bulk_upsert_crop_prices([
+            price_row("กะหล่ำปลี", date(2024, 1, 1), 10),       # ค่าเดิม ไฟล์เดิม
+            price_row("กะหล่ำปลี", date(2024, 1, 2), 20.5),     # ราคาเปลี่ยน
+            price_row("กะหล่ำปลี", date(2024, 1, 4), 13),       # ใหม่กว่า watermark
+        ], "test.xls", changed=changed)
+        self.assertEqual(counts, {"inserted": 1, "updated": 1, "unchanged": 1})
+        self.assertEqual(changed, {self.crop.crop_id: {date(2024, 1, 2), date(2024, 1, 4)}})
+        self.assertEqual(CropVariable.objects.get(crop=self.crop, date=date(2024, 1, 2)).average_price,
+                         Decimal("20.50"))
+        self.assertEqual(CropVariable.objects.filter(crop=self.crop).count(), 4)
+
+    def test_same_prices_from_other_file_are_updated(self):
+        counts = bulk_upsert_crop_prices([price_row("กะหล่ำปลี", date(2024, 1, 1), 10)], "other.xls")
+        self.assertEqual(counts, {"inserted": 0, "updated": 1, "unchanged": 0})
+        self.assertEqual(CropVariable.objects.get(crop=self.crop, date=date(2024, 1, 1)).file_name, "other.xls")
+
+    def test_prices_are_rounded_to_cents(self):
+        bulk_upsert_crop_prices([price_row("กะหล่ำปลี", date(2024, 1, 5), 12.345, 11.004, 13.995)], "test.xls")
+        row = CropVariable.objects.get(crop=self.crop, date=date(2024, 1, 5))
+        self.assertEqual((row.min_price, row.max_price, row.average_price),
+                         (Decimal("11.00"), Decimal("14.00"), Decimal("12.35")))
+
+    def test_duplicate_rows_in_file_keep_last(self):
+        counts = bulk_upsert_crop_prices([
+            price_row("กะหล่ำปลี", date(2024, 1, 10), 30),
+            price_row("กะหล่ำปลี", date(2024, 1, 10), 31),
+        ], "test.xls")
+        self.assertEqual(counts, {"inserted": 1, "updated": 0, "unchanged": 0})
+        self.assertEqual(CropVariable.objects.get(crop=self.crop, date=date(2024, 1, 10)).average_price, 31)
+
+    def test_unknown_crop_is_created(self):
+        counts = bulk_upsert_crop_prices([price_row("ผักชีลาว", date(2024, 1, 1), 50)], "test.xls")
+        self.assertEqual(counts["inserted"], 1)
+        crop = Crop.objects.get(crop_name="ผักชีลาว")
+        self.assertEqual(crop.unit, "กิโลกรัม")
+        self.assertEqual(resolve_crops(["ผักชีลาว", "กะหล่ำปลี"]),
+                         {"ผักชีลาว": crop.crop_id, "กะหล่ำปลี": self.crop.crop_id})
+        self.assertEqual(Crop.objects.filter(crop_name="ผักชีลาว").count(), 1)
+
+    def test_empty_input_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(bulk_upsert_crop_prices([], "test.xls"), {"inserted": 0, "updated": 0, "unchanged": 0})
+
+    def test_save_price_chunks_summarizes_skipped_rows(self):
+        frame = pd.DataFrame({
+            "date": ["2 ม.ค. 2567", "3 ม.ค. 2567", "3 ม.ค. 2567", "วันที่ผิด", "5 ม.ค. 2567"],
+            "ชื่อสินค้า": ["กะหล่ำปลี", "กะหล่ำปลี", "กะหล่ำปลี", "กะหล่ำปลี", ""],
+            "ราคาเฉลี่ย": ["11", "-", "", "15", "16"],
+            "ราคาต่ำสุด": ["10", "11", "11", "14", "15"],
+            "ราคาสูงสุด": ["12", "13", "13", "16", "17"],
+        })
+        with redirect_stdout(io.StringIO()):
+            summary = save_price_chunks([normalize_price_frame(frame)], "prices.xls")
+        self.assertEqual(summary["row_count"], 1)
+        self.assertEqual((summary["inserted"], summary["updated"], summary["unchanged"]), (0, 1, 0))
+        self.assertEqual(summary["skipped_records"], [
+            {"crop": "กะหล่ำปลี", "date": "3 ม.ค. 2567", "skipped_rows": 2},
+            {"crop": "กะหล่ำปลี", "date": "วันที่ผิด", "skipped_rows": 1},
+            {"crop": "", "date": "5 ม.ค. 2567", "skipped_rows": 1},
+        ])
+
+
+def price_frame(rows):
+    """ DataFrame ในรูปแบบของไฟล์ราคา จาก list ของ (วันที่ไทย, ชื่อสินค้า, เฉลี่ย, ต่ำสุด, สูงสุด) """
+    return pd.DataFrame(rows, columns=["date", "ชื่อสินค้า", "ราคาเฉลี่ย", "ราคาต่ำสุด", "ราคาสูงสุด"])
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY ใช้ได้เฉพาะ PostgreSQL")
+class CopyLoaderTests(TestCase):
+    """ COPY -> temp table -> INSERT ... ON CONFLICT ... WHERE IS DISTINCT FROM ได้ผลเดียวกับ upsert ของ ORM """
+
+    def setUp(self):
+        self.crop = make_crop("กะหล่ำปลี", days=3)
+        self.chunks = [
+            price_frame([
+                ("1 ม.ค. 2567", "กะหล่ำปลี", "10", "9", "11"),     # ค่าเดิม
+                ("2 ม.ค. 2567", "กะหล่ำปลี", "50", "49", "51"),    # ถูกแทนด้วยแถวหลังใน chunk เดียวกัน
+                ("2 ม.ค. 2567", "กะหล่ำปลี", "12.5", "10", "13"),  # ราคาเปลี่ยน
+                ("4 ม.ค. 2567", "กะหล่ำปลี", "13", "12", "14"),    # ใหม่ แต่ถูกแทนด้วยแถวใน chunk ถัดไป
+                ("ผิด", "กะหล่ำปลี", "1", "1", "1"),
+            ]),
+            price_frame([
+                ("4 ม.ค. 2567", "กะหล่ำปลี", "14", "13", "15"),
+                ("3 ม.ค. 2567", "กะหล่ำปลี", "12", "11", "13"),    # ค่าเดิม
+                ("1 ม.ค. 2567", "ผักใหม่", "1,000", "900", "1,100"),
+                ("1 ม.ค. 2567", "ผักใหม่", "-", "900", "1,100"),
+            ]),
+        ]
+
+    def _load(self, backend, chunks=None):
+        chunks = self.chunks if chunks is None else chunks
+        with redirect_stdout(io.StringIO()):
+            summary = load_price_chunks((normalize_price_frame(chunk) for chunk in chunks), "test.xls", backend)
+        rows = list(CropVariable.objects.order_by("crop__crop_name", "date").values_list(
+            "crop__crop_name", "date", "min_price", "max_price", "average_price", "file_name"))
+        return summary, rows
+
+    def test_counts_and_deduplication(self):
+        summary, rows = self._load("copy")
+        self.assertEqual((summary["inserted"], summary["updated"], summary["unchanged"]), (2, 1, 2))
+        self.assertEqual(summary["row_count"], 7)
+        self.assertEqual([(r["date"], r["skipped_rows"]) for r in summary["skipped_records"]],
+                         [("ผิด", 1), ("1 ม.ค. 2567", 1)])
+        self.assertEqual(rows, [
+            ("กะหล่ำปลี", date(2024, 1, 1), Decimal("9.00"), Decimal("11.00"), Decimal("10.00"), "test.xls"),
+            ("กะหล่ำปลี", date(2024, 1, 2), Decimal("10.00"), Decimal("13.00"), Decimal("12.50"), "test.xls"),
+            ("กะหล่ำปลี", date(2024, 1, 3), Decimal("11.00"), Decimal("13.00"), Decimal("12.00"), "test.xls"),
+            ("กะหล่ำปลี", date(2024, 1, 4), Decimal("13.00"), Decimal("15.00"), Decimal("14.00"), "test.xls"),
+            ("ผักใหม่", date(2024, 1, 1), Decimal("900.00"), Decimal("1100.00"), Decimal("1000.00"), "test.xls"),
+        ])
+        # นำเข้าซ้ำ: ไม่มีแถวเปลี่ยน
+        again, _ = self._load("copy")
+        self.assertEqual((again["inserted"], again["updated"], again["unchanged"]), (0, 0, 5))
+
+    def test_matches_orm_backend(self):
+        # ORM upsert ทีละ chunk: แถวที่ซ้ำข้าม chunk ถูกนับเป็น insert แล้ว update (ผลในตารางเหมือนกัน)
+        # จึงเทียบจำนวนแถวด้วยไฟล์ที่เป็น chunk เดียว
+        whole_file = [pd.concat(self.chunks, ignore_index=True)]
+        with transaction.atomic():
+            expected = self._load("orm", whole_file)
+            transaction.set_rollback(True)
+        self.assertEqual(self._load("copy", whole_file), expected)
+
+    def test_changed_rows_refresh_derived_data(self):
+        version = DataVersion.objects.filter(scope=crop_scope(self.crop.crop_id)).values_list("version", flat=True)
+        before = version.first() or 0
+        self._load("copy")
+        self.assertEqual(version.first(), before + 1)
+        self.assertEqual(PriceSnapshot.objects.get(crop=self.crop).latest_date, date(2024, 1, 4))
+
+
+class IncrementalImportTests(TestCase):
+    """ manifest ข้ามไฟล์ที่ไม่เปลี่ยน (key เป็น path เต็ม) และ upsert เทียบค่าเฉพาะแถวที่ไม่ใหม่กว่า watermark """
+
+    def setUp(self):
+        self.folders = []
+        for _ in range(2):
+            folder = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+            # copy2 เก็บ mtime เดิม: ไฟล์ในสองโฟลเดอร์มี fingerprint เหมือนกันทุกอย่าง
+            shutil.copy2(SAMPLE_PRICE_FILE, os.path.join(folder, "prices.xls"))
+            self.folders.append(folder)
+
+    def _import(self, folder, incremental=True):
+        with redirect_stdout(io.StringIO()):
+            return import_price_files(folder, ["prices.xls"], workers=1, incremental=incremental)["prices.xls"]
+
+    def test_unchanged_file_is_skipped(self):
+        first = self._import(self.folders[0])
+        self.assertEqual((first["file_unchanged"], first["inserted"]), (False, 10))
+        with self.assertNumQueries(1):  # อ่าน manifest อย่างเดียว
+            second = self._import(self.folders[0])
+        self.assertTrue(second["file_unchanged"])
+        self.assertEqual((second["inserted"], second["updated"], second["unchanged"]), (0, 0, 10))
+        # ไม่ incremental: อ่านไฟล์ใหม่ทั้งหมด แต่ไม่มีแถวเปลี่ยน
+        forced = self._import(self.folders[0], incremental=False)
+        self.assertEqual((forced["file_unchanged"], forced["inserted"], forced["unchanged"]), (False, 0, 10))
+
+    def test_touched_file_with_same_content_is_skipped(self):
+        self._import(self.folders[0])
+        path = os.path.join(self.folders[0], "prices.xls")
+        os.utime(path, (0, 1_000_000))
+        self.assertTrue(self._import(self.folders[0])["file_unchanged"])
+        self.assertEqual(ImportManifest.objects.get().file_mtime, 1_000_000)
+
+    def test_changed_file_is_imported(self):
+        self._import(self.folders[0])
+        path = os.path.join(self.folders[0], "prices.xls")
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content.replace("<td>32.5</td>", "<td>33.5</td>", 1))
+        result = self._import(self.folders[0])
+        self.assertEqual((result["file_unchanged"], result["updated"], result["unchanged"]), (False, 1, 9))
+
+    def test_same_file_name_in_other_folder_is_not_skipped(self):
+        self._import(self.folders[0])
+        other = self._import(self.folders[1])
+        self.assertFalse(other["file_unchanged"])
+        self.assertEqual(other["unchanged"], 10)
+        self.assertEqual(
+            sorted(ImportManifest.objects.values_list("file_path", "file_name")),
+            sorted((os.path.realpath(os.path.join(folder, "prices.xls")), "prices.xls") for folder in self.folders),
+        )
+        self.assertTrue(self._import(self.folders[1])["file_unchanged"])
+
+    @staticmethod
+    def _price_reads(captured):
+        # PostgreSQL อ่านแถวเดิมด้วย server-side cursor (DECLARE ... CURSOR FOR SELECT ...)
+        return [q["sql"] for q in captured.captured_queries
+                if 'FROM "crops_cropvariable"' in q["sql"] and not q["sql"].startswith(("INSERT", "UPDATE"))]
+
+    def test_upsert_compares_only_rows_up_to_watermark(self):
+        crop = make_crop("กะหล่ำปลี", days=3)  # watermark = 3 ม.ค.
+        rows = [price_row("กะหล่ำปลี", date(2024, 1, 2), 11),
+                price_row("กะหล่ำปลี", date(2024, 1, 10), 20),
+                price_row("กะหล่ำปลี", date(2024, 1, 11), 21)]
+        with CaptureQueriesContext(connection) as captured:
+            counts = bulk_upsert_crop_prices(rows, "test.xls")
+        self.assertEqual(counts, {"inserted": 2, "updated": 0, "unchanged": 1})
+        selects = self._price_reads(captured)
+        # query ค่า MAX(date) ต่อพืช แล้ว query แถวเดิมเฉพาะช่วง 2-2 ม.ค. (แถวหลัง watermark ไม่ต้องเทียบ)
+        self.assertEqual(len(selects), 2)
+        self.assertIn("MAX", selects[0])
+        self.assertIn("2024-01-02", selects[1])
+        self.assertNotIn("2024-01-10", selects[1])
+
+        # ทุกแถวใหม่กว่า watermark: ไม่ต้อง query แถวเดิมเลย
+        with CaptureQueriesContext(connection) as captured:
+            counts = bulk_upsert_crop_prices([price_row("กะหล่ำปลี", date(2024, 2, 1), 30)], "test.xls")
+        self.assertEqual(counts, {"inserted": 1, "updated": 0, "unchanged": 0})
+        selects = self._price_reads(captured)
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(CropVariable.objects.filter(crop=crop).count(), 6)
+
+
+def period_start(period, day):
+    """ วันเริ่มช่วงเวลาแบบคำนวณตรงๆ (สัปดาห์เริ่มวันจันทร์) ใช้เทียบกับ pandas Period ใน rollups """
+    if period == PriceRollup.PERIOD_WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == PriceRollup.PERIOD_MONTH:
+        return day.replace(day=1)
+    if period == PriceRollup.PERIOD_QUARTER:
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return date(day.year, 1, 1)
+
+
+def expected_rollups(crop):
+    """ rollup ที่ควรได้ของพืช คำนวณจาก CropVariable ทั้งหมดด้วย Decimal ทีละแถว """
+    groups = {}
+    for row in CropVariable.objects.filter(crop=crop).order_by("date"):
+        for period in PERIOD_FREQS:
+            groups.setdefault((period, period_start(period, row.date)), []).append(row)
+    expected = {}
+    for (period, start), rows in groups.items():
+        total = sum(row.average_price for row in rows)
+        expected[(period, start)] = (
+            len(rows), total, (total / len(rows)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+            min(row.min_price for row in rows), max(row.max_price for row in rows),
+            rows[0].date, rows[0].average_price, rows[-1].date, rows[-1].average_price,
+        )
+    return expected
+
+
+class PriceRollupTests(TestCase):
+    """ PriceRollup รายสัปดาห์ (W-SUN)/เดือน/ไตรมาส/ปี ต้องตรงกับการคำนวณจากข้อมูลรายวันทั้งหมดเสมอ """
+
+    def setUp(self):
+        self.crop = Crop.objects.create(crop_name="มะนาว เบอร์ 1-2", unit="ร้อยผล")
+        # ข้อมูลคร่อมปี (สัปดาห์ 2023-12-25 อยู่ทั้งสองปี) ข้ามบางวัน และราคามีเศษสตางค์
+        start = date(2023, 12, 20)
+        CropVariable.objects.bulk_create([
+            CropVariable(crop=self.crop, date=start + timedelta(days=i),
+                         average_price=Decimal("10.25") + Decimal(i % 7) / 3,
+                         min_price=Decimal(8 + i % 5), max_price=Decimal(12 + i % 4), file_name="test.xls")
+            for i in range(120) if i % 6 != 5
+        ])
+        rebuild_rollups()
+
+    def _rollups(self):
+        return {
+            (r.period, r.period_start): (
+                r.day_count, r.price_sum, r.average_price, r.min_price, r.max_price,
+                r.first_date, r.first_price, r.last_date, r.last_price,
+            )
+            for r in PriceRollup.objects.filter(crop=self.crop)
+        }
+
+    def test_rebuild_matches_daily_data(self):
+        # ราคาใน CropVariable เก็บ 2 ตำแหน่ง จึงเทียบหลังอ่านกลับจากฐานข้อมูล
+        self.assertEqual(self._rollups(), expected_rollups(self.crop))
+        periods = PriceRollup.objects.filter(crop=self.crop, period=PriceRollup.PERIOD_WEEK)
+        self.assertTrue(all(r.period_start.weekday() == 0 for r in periods))
+        self.assertTrue(all(r.period_end == r.period_start + timedelta(days=6) for r in periods))
+        self.assertEqual(
+            sorted(PriceRollup.objects.filter(crop=self.crop, period=PriceRollup.PERIOD_YEAR)
+                   .values_list("period_start", "period_end")),
+            [(date(2023, 1, 1), date(2023, 12, 31)), (date(2024, 1, 1), date(2024, 12, 31))],
+        )
+
+    def test_refresh_only_rewrites_affected_periods(self):
+        before = {
+            (r.period, r.period_start): r.rollup_id for r in PriceRollup.objects.filter(crop=self.crop)
+        }
+        # แก้ราคาวันที่ 2024-02-14 (พุธ), เพิ่มวันที่ 2023-12-31 (อาทิตย์ คร่อมปี) และลบทั้งสัปดาห์ 2024-03-04
+        changed_days = {date(2024, 2, 14), date(2023, 12, 31)}
+        CropVariable.objects.filter(crop=self.crop, date=date(2024, 2, 14)).update(average_price=Decimal("99.99"))
+        CropVariable.objects.update_or_create(
+            crop=self.crop, date=date(2023, 12, 31),
+            defaults={"average_price": Decimal("1.01"), "min_price": 1, "max_price": 2, "file_name": "test.xls"},
+        )
+        removed_week = [date(2024, 3, 4) + timedelta(days=i) for i in range(7)]
+        CropVariable.objects.filter(crop=self.crop, date__in=removed_week).delete()
+        changed_days.update(removed_week)
+
+        refresh_rollups({self.crop.crop_id: changed_days})
+
+        after = self._rollups()
+        self.assertEqual(after, expected_rollups(self.crop))
+        self.assertNotIn((PriceRollup.PERIOD_WEEK, date(2024, 3, 4)), after)
+
+        affected = {(period, period_start(period, day)) for period in PERIOD_FREQS for day in changed_days}
+        for r in PriceRollup.objects.filter(crop=self.crop):
+            key = (r.period, r.period_start)
+            if key in affected:
+                self.assertNotEqual(r.rollup_id, before.get(key), key)
+            else:
+                self.assertEqual(r.rollup_id, before[key], key)
+        # ทุกชนิดช่วงเวลาได้รับผล และช่วงที่ไม่เกี่ยวข้องไม่ถูกเขียนใหม่
+        self.assertEqual({period for period, _ in affected}, set(PERIOD_FREQS))
+        self.assertIn((PriceRollup.PERIOD_WEEK, date(2023, 12, 25)), affected)
+        self.assertIn((PriceRollup.PERIOD_YEAR, date(2023, 1, 1)), affected)
+
+    def test_import_refreshes_rollups(self):
+        frame = price_frame([
+            ("20 เม.ย. 2567", "มะนาว เบอร์ 1-2", "30.50", "30", "31"),   # วันใหม่ ช่วงใหม่ทุกชนิด
+            ("10 ม.ค. 2567", "มะนาว เบอร์ 1-2", "11.11", "10", "12"),    # แก้ราคาวันเดิม
+        ])
+        with redirect_stdout(io.StringIO()):
+            save_price_chunks([normalize_price_frame(frame)], "test.xls")
+        self.assertEqual(self._rollups(), expected_rollups(self.crop))
+
+
+def legacy_crop_info(crop):
+    """ ราคา/การเปลี่ยนแปลงของ crop-info-list แบบเดิม (query ต่อพืช) ใช้เทียบกับผลจาก PriceSnapshot """
+    history = CropVariable.objects.filter(crop=crop).order_by('date')
+    if not history.exists():
+        return {"price": "", "avg_price": "", "change": "", "status": ""}
+    latest = history.last()
+    previous = history.exclude(date=latest.date).last()
+    if previous and previous.average_price:
+        change_val = (latest.average_price - previous.average_price) / previous.average_price * 100
+        change_pct = round(change_val, 2)
+        change, status = (f"↑ {change_pct}%", "up") if change_val >= 0 else (f"↓ {abs(change_pct)}%", "down")
+    else:
+        change, status = "↑ 0%", "up"
+    return {
+        "price": f"฿{int(latest.min_price)} - ฿{int(latest.max_price)} / {crop.unit}",
+        "avg_price": f"฿{int(latest.average_price)} / {crop.unit}",
+        "change": change,
+        "status": status,
+    }
+
+
+class PriceSnapshotTests(TestCase):
+    """ crop-info-list จาก PriceSnapshot ต้องได้ผลเดียวกับการคำนวณต่อพืชแบบเดิม """
+
+    def setUp(self):
+        response_cache.local.clear()
+        self.rising = make_crop("ผักกาดหอม คละ", days=10)
+        self.falling = Crop.objects.create(crop_name="ผักกาดหอม คัด", unit="กก.")
+        self.single = Crop.objects.create(crop_name="ผักกะเฉด", unit="กำ")
+        self.zero = Crop.objects.create(crop_name="ขิงแก่", unit="กก.")
+        self.empty = Crop.objects.create(crop_name="ขิง อ่อน", unit="กก.")
+        for crop, prices in ((self.falling, ["33.30", "31.70"]), (self.single, ["7.50"]), (self.zero, ["0", "12"])):
+            CropVariable.objects.bulk_create([
+                CropVariable(crop=crop, date=date(2024, 3, 1) + timedelta(days=2 * i), average_price=Decimal(price),
+                             min_price=Decimal(price), max_price=Decimal(price) + 2, file_name="test.xls")
+                for i, price in enumerate(prices)
+            ])
+        self.crops = [self.rising, self.falling, self.single, self.zero, self.empty]
+
+    def _assert_parity(self):
+        response_cache.local.clear()
+        rows = {row["name"]: row for row in self.client.get(reverse("crop_info_list")).json()}
+        for crop in self.crops:
+            row = rows[crop.crop_name]
+            self.assertEqual(
+                {key: row[key] for key in ("price", "avg_price", "change", "status")}, legacy_crop_info(crop),
+                crop.crop_name,
+            )
+
+    def test_missing_snapshots_are_computed_without_writing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._assert_parity()
+        self.assertFalse(PriceSnapshot.objects.exists())
+        writes = [q["sql"] for q in queries if q["sql"].lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertEqual(writes, [])
+
+    def test_stored_snapshots_match_legacy(self):
+        rebuild_snapshots()
+        self.assertEqual(PriceSnapshot.objects.count(), len(self.crops))
+        self._assert_parity()
+
+    def test_refresh_after_import(self):
+        rebuild_snapshots()
+        frame = price_frame([
+            ("5 มี.ค. 2567", "ผักกาดหอม คัด", "35", "34", "36"),  # วันใหม่ล่าสุด
+            ("1 มี.ค. 2567", "ขิงแก่", "6", "5", "7"),           # แก้วันก่อนหน้า (ราคา 0 เดิม)
+            ("1 ม.ค. 2567", "ผักกาดหอม คละ", "99", "98", "100"),  # เก่ากว่าวันก่อนหน้า ไม่ต้องคำนวณใหม่
+            ("1 มี.ค. 2567", "ขิง อ่อน", "20", "19", "21"),       # พืชที่เพิ่งมีราคาครั้งแรก
+        ])
+        with redirect_stdout(io.StringIO()):
+            save_price_chunks([normalize_price_frame(frame)], "test.xls")
+        self._assert_parity()
+        self.assertEqual(refresh_snapshots({self.rising.crop_id: [date(2024, 1, 2)]}), 0)
+        self.assertEqual(refresh_snapshots({self.rising.crop_id: [date(2024, 1, 9)]}), 1)
+
+
+@override_settings(IMPORT_JOB_STALE_SECONDS=60, IMPORT_JOB_MAX_ATTEMPTS=2)
+class ImportJobQueueTests(TestCase):
+    """ คิวงานนำเข้า: worker สองตัวไม่ได้งานเดียวกัน และงานที่ worker หยุดไปกลับเข้าคิว """
+
+    def _enqueue(self):
+        return jobs.enqueue_import(ImportJob.KIND_FILE, "/tmp", ["prices.xls"], incremental=False)
+
+    def _go_stale(self, job, seconds=120):
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_job_is_claimed_once(self):
+        queued = self._enqueue()
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.pk, queued.pk)
+        self.assertEqual(claimed.status, ImportJob.STATUS_RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNotNone(claimed.heartbeat_at)
+        # worker อีกตัวที่เห็นงานเป็น queued ก่อนหน้านี้ claim ไม่สำเร็จ
+        self.assertFalse(jobs._claim(queued))
+        self.assertIsNone(jobs.claim_next_job())
+        self.assertEqual(ImportJob.objects.get(pk=queued.pk).attempts, 1)
+
+    def test_two_workers_get_different_jobs(self):
+        first, second = self._enqueue(), self._enqueue()
+        self.assertEqual([jobs.claim_next_job().pk, jobs.claim_next_job().pk], [first.pk, second.pk])
+
+    def test_live_job_is_not_requeued(self):
+        self._enqueue()
+        jobs.claim_next_job()
+        self.assertEqual(jobs.recover_stale_jobs(), (0, 0))
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_stale_job_is_requeued_and_claimed_again(self):
+        self._enqueue()
+        job = jobs.claim_next_job()
+        jobs._record_progress(job, {"inserted": 5, "updated": 0, "unchanged": 0, "skipped_records": []})
+        self._go_stale(job)
+
+        reclaimed = jobs.claim_next_job()
+        self.assertEqual(reclaimed.pk, job.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+        self.assertEqual((reclaimed.files_done, reclaimed.rows_inserted), (0, 0))
+
+        # worker เดิมที่กลับมาทำงานต่อเขียนทับรอบใหม่ไม่ได้
+        jobs._record_progress(job, {"inserted": 7, "updated": 0, "unchanged": 0, "skipped_records": []})
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).rows_inserted, 0)
+
+    def test_stale_job_fails_after_max_attempts(self):
+        self._enqueue()
+        for _ in range(2):
+            job = jobs.claim_next_job()
+            self._go_stale(job)
+        self.assertEqual(jobs.recover_stale_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_job_without_heartbeat_uses_started_at(self):
+        self._enqueue()
+        job = jobs.claim_next_job()
+        ImportJob.objects.filter(pk=job.pk).update(heartbeat_at=None, started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.recover_stale_jobs(), (1, 0))
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).status, ImportJob.STATUS_QUEUED)
+
+
+@override_settings(IMPORT_JOB_STALE_SECONDS=1, IMPORT_JOB_HEARTBEAT_SECONDS=0.1)
+class ImportJobHeartbeatTests(TransactionTestCase):
+    """
+    ไฟล์ที่ใช้เวลานานกว่า IMPORT_JOB_STALE_SECONDS ต้องไม่ถูกส่งกลับเข้าคิวระหว่างที่ยังรันอยู่
+    ใช้ TransactionTestCase: thread ของ heartbeat ใช้ connection ของตัวเองจึงต้องเห็นแถวงานที่ commit แล้ว
+    """
+
+    def _run(self, slow_import):
+        jobs.enqueue_import(ImportJob.KIND_FILE, "/tmp", ["prices.xls"], incremental=False)
+        job = jobs.claim_next_job()
+        with mock.patch.object(jobs, "import_price_files", slow_import), redirect_stdout(io.StringIO()):
+            jobs.run_job(job)
+        return ImportJob.objects.get(pk=job.pk)
+
+    def test_long_file_keeps_heartbeat(self):
+        recovered = []
+
+        def slow_import(folder_path, file_names, **kwargs):
+            first = ImportJob.objects.get().heartbeat_at
+            time.sleep(1.5)
+            self.assertGreater(ImportJob.objects.get().heartbeat_at, first)
+            # worker อื่นตรวจงานค้างระหว่างนี้: งานนี้ยังมี heartbeat ใหม่ จึงไม่ถูกส่งกลับเข้าคิว
+            recovered.append(jobs.recover_stale_jobs())
+            return {name: {"success": True, "file_unchanged": False, "skipped_records": [],
+                           "inserted": 1, "updated": 0, "unchanged": 0,
+                           "parse_seconds": 0.0, "write_seconds": 1.5} for name in file_names}
+
+        job = self._run(slow_import)
+        self.assertEqual(recovered, [(0, 0)])
+        self.assertEqual((job.status, job.attempts), (ImportJob.STATUS_DONE, 1))
+        self.assertEqual([t.name for t in threading.enumerate() if t.name.endswith("-heartbeat")], [])
+
+    def test_heartbeat_stops_when_job_is_taken_over(self):
+        def requeued_import(folder_path, file_names, **kwargs):
+            # จำลองว่างานถูกส่งกลับเข้าคิวและ worker อื่นรับไปแล้ว (attempts เพิ่ม)
+            ImportJob.objects.update(attempts=F("attempts") + 1)
+            time.sleep(0.3)
+            return {}
+
+        job = self._run(requeued_import)
+        # ผลของรอบเก่าไม่ทับรอบใหม่ และ heartbeat ของรอบเก่าไม่อัปเดตแถวงาน
+        self.assertEqual((job.status, job.attempts), (ImportJob.STATUS_RUNNING, 2))
+        heartbeat = job.heartbeat_at
+        time.sleep(0.3)
+        self.assertEqual(ImportJob.objects.get().heartbeat_at, heartbeat)
+
+
+@override_settings(PRICE_FILES_DIR=os.path.dirname(SAMPLE_PRICE_FILE))
+class UpdatePricesRequestTests(TestCase):
+    """ update-prices/ รับเฉพาะชื่อไฟล์ในโฟลเดอร์ราคา """
+
+    def test_rejects_paths(self):
+        for file_name in ("../sample_prices.xls", "../../manage.py", "testdata/sample_prices.xls",
+                          "/etc/passwd", "..\\sample_prices.xls", "..", "sample..xls"):
+            with self.subTest(file=file_name):
+                response = self.client.get(reverse("update-prices"), {"file": file_name})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_accepts_file_in_price_folder(self):
+        response = self.client.get(reverse("update-prices"), {"file": "sample_prices.xls"})
+        self.assertEqual(response.status_code, 202)
+        job = ImportJob.objects.get(pk=response.json()["job_id"])
+        self.assertEqual(job.params["files"], ["sample_prices.xls"])
+
+
+class CropIndexTests(TestCase):
+    def setUp(self):
+        invalidate_crop_index()
+        self.addCleanup(invalidate_crop_index)
+
+    def test_resolve_tiers(self):
+        kale = Crop.objects.create(crop_name="ผักคะน้า คละ", unit="กก.")
+        kale_cut = Crop.objects.create(crop_name="ผักคะน้า คัด (บาท/กก.)", unit="กก.")
+        chili = Crop.objects.create(crop_name="พริกสดชี้ฟ้า (บาท/กก.)", unit="กก.")
+        index = crop_index()
+
+        # exact: ชื่อตรงตัว และชื่อที่ต่างกันแค่ช่องว่าง/อักขระล่องหน/ตัวพิมพ์
+        self.assertEqual(index.exact("ผักคะน้า คละ").crop_id, kale.crop_id)
+        self.assertIsNone(index.exact(" ผักคะน้า  คละ"))
+        self.assertEqual(index.resolve(" ผักคะน้า​  คละ ").crop_id, kale.crop_id)
+        # prefix: เลือกชื่อที่สั้นที่สุดที่ขึ้นต้นด้วยคำค้น
+        self.assertEqual(index.resolve("ผักคะน้า").crop_id, kale.crop_id)
+        self.assertEqual(index.resolve("ผักคะน้า คั").crop_id, kale_cut.crop_id)
+        # substring: คำค้นอยู่กลางชื่อ
+        self.assertEqual(index.resolve("ชี้ฟ้า").crop_id, chili.crop_id)
+        self.assertIsNone(index.resolve("มะนาว"))
+        self.assertIsNone(index.resolve("  "))
+
+        crops, not_found = resolve_crop_list([chili.crop_id, 999999], ["คะน้า", "พริกสด"])
+        self.assertEqual([crop.crop_id for crop in crops], [chili.crop_id, kale.crop_id])
+        self.assertEqual(not_found, [999999])
+
+    def test_returns_copies(self):
+        crop = Crop.objects.create(crop_name="แตงกวา คละ", unit="กก.")
+        resolve_crop("แตงกวา").crop_name = "ถูกแก้"
+        self.assertEqual(get_crop(crop.crop_id).crop_name, "แตงกวา คละ")
+
+    def test_signals_invalidate_index(self):
+        crop = Crop.objects.create(crop_name="มะระจีน คละ", unit="กก.")
+        self.assertEqual(len(crop_index()), 1)
+
+        Crop.objects.create(crop_name="มะระจีน คัด", unit="กก.")
+        self.assertEqual(crop_index().exact("มะระจีน คัด").crop_name, "มะระจีน คัด")
+
+        crop.crop_name = "มะระขี้นก"
+        crop.save()
+        self.assertIsNone(crop_index().exact("มะระจีน คละ"))
+        self.assertEqual(resolve_crop("ขี้นก").crop_id, crop.crop_id)
+
+        crop.delete()
+        self.assertIsNone(get_crop(crop.crop_id))
+        self.assertEqual(len(crop_index()), 1)
+
+    def test_forecast_and_save_uses_mapping_crop(self):
+        crop = make_crop("ถั่วฝักยาว คละ", days=20)
+        model_file = tempfile.NamedTemporaryFile(suffix=".joblib", delete=False)
+        model_file.close()
+        self.addCleanup(os.remove, model_file.name)
+        CropModelMapping.objects.create(crop=crop, model_path=model_file.name)
+        model = mock.Mock()
+        model.predict.return_value = [42.0]
+
+        # ดัชนีที่ค้าง (ไม่รู้จักพืชนี้) ต้องไม่มีผลกับเส้นทางเขียน
+        with mock.patch("crops.crop_index.crop_index", return_value=CropIndex([])), \
+                mock.patch("crops.views_ml.joblib.load", return_value=model), redirect_stdout(io.StringIO()):
+            response = self.client.get(reverse("forecast_and_save"))
+
+        self.assertEqual(response.status_code, 200)
+        run = CurrentForecast.objects.get(crop=crop).run
+        self.assertEqual(run.data_watermark, date(2024, 1, 20))
+        self.assertEqual(PredictedData.objects.filter(run=run).count(), 90)
+
+
+class ResponseCacheTests(TestCase):
+    """ ETag / 304 และ HIT / MISS ของ cached_response (combined-priceforecast และ crops-list) """
+
+    def setUp(self):
+        response_cache.local.clear()
+        self.crop = make_crop("กะหล่ำปลี")
+        self.params = {"vegetableName": "กะหล่ำปลี", "startDate": "2024-01-01", "endDate": "2024-01-31"}
+
+    def _get(self, params=None, name="combined_price_forecast", **headers):
+        return self.client.get(reverse(name), params if params is not None else self.params, headers=headers)
+
+    @staticmethod
+    def _count(response, kind):
+        return sum(row["type"] == kind for row in response.json()["results"])
+
+    def test_miss_then_hit_with_same_etag(self):
+        first, second = self._get(), self._get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(first.content, second.content)
+
+    def test_matching_if_none_match_returns_304(self):
+        etag = self._get()["ETag"]
+        for header in (etag, "W/" + etag, f'"other", {etag}', "*"):
+            with self.subTest(header=header):
+                response = self._get(if_none_match=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+                self.assertEqual(response.content, b"")
+        self.assertEqual(self._get(if_none_match='"other"').status_code, 200)
+
+    def test_import_changes_etag(self):
+        etag = self._get()["ETag"]
+        added = date(2024, 1, 31)
+        CropVariable.objects.create(crop=self.crop, date=added, min_price=50, max_price=60, average_price=55)
+        refresh_derived({self.crop.crop_id: {added}})
+
+        response = self._get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self._count(response, "historical"), 31)
+
+    def test_forecast_run_changes_etag(self):
+        etag = self._get()["ETag"]
+        save_forecast_run(self.crop, [(date(2024, 1, 20), Decimal("42.00"))], "test@1")
+
+        response = self._get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self._count(response, "predicted"), 1)
+
+    def test_crop_edit_changes_etag(self):
+        urls = ("combined_price_forecast", "crops_list")
+        etags = {name: self._get(None if name == urls[0] else {}, name)["ETag"] for name in urls}
+        self.crop.unit = "หัว"
+        self.crop.save()
+        for name in urls:
+            with self.subTest(name=name):
+                response = self._get(None if name == urls[0] else {}, name, if_none_match=etags[name])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etags[name])
+
+    def test_other_crop_keeps_etag(self):
+        etag = self._get()["ETag"]
+        other = make_crop("ผักกาดขาว", days=1)
+        refresh_derived({other.crop_id: {date(2024, 1, 1)}})
+        self.assertEqual(self._get(if_none_match=etag).status_code, 304)
+
+    @override_settings(ALLOWED_HOSTS=["a.example", "b.example"])
+    def test_no_collision_across_hosts(self):
+        first = self._get(HOST="a.example")
+        second = self._get(HOST="b.example")
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "MISS"))
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_no_collision_across_params(self):
+        etags = {self._get()["ETag"]}
+        variants = [
+            {**self.params, "endDate": "2024-01-15"},
+            {**self.params, "format": "columnar"},
+            {**self.params, "max_points": "5"},
+            {**self.params, "startDate": "2024-01-02"},
+        ]
+        for params in variants:
+            with self.subTest(params=params):
+                response = self._get(params)
+                self.assertEqual(response["X-Cache"], "MISS")
+                self.assertNotIn(response["ETag"], etags)
+                etags.add(response["ETag"])
+
+    def test_equivalent_params_share_key(self):
+        etag = self._get()["ETag"]
+        # ช่องว่างรอบค่าและชื่อพืชที่ resolve ไปพืชเดียวกันใช้ key เดียวกัน
+        response = self._get({**self.params, "startDate": " 2024-01-01 ", "vegetableName": " กะหล่ำปลี"})
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_errors_are_not_cached(self):
+        params = {**self.params, "vegetableName": "ไม่มีพืชนี้"}
+        for _ in range(2):
+            response = self._get(params)
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn("X-Cache", response)
+
+
+class ColumnarFormatTests(TestCase):
+    """ combined-priceforecast ?format=columnar ต้องมีข้อมูลเดียวกับรูปแบบปกติ เรียงตามแกนวันที่เดียวกัน """
+
+    def setUp(self):
+        response_cache.local.clear()
+        self.crop = make_crop("กะหล่ำดอก คละ", days=30)
+        # ค่าพยากรณ์ทับกับราคาจริง 6 วันสุดท้าย และต่อหลังวันสุดท้ายอีก 6 วัน
+        save_forecast_run(self.crop, [
+            (date(2024, 1, 25) + timedelta(days=i), Decimal(50 + i)) for i in range(12)
+        ], "test@1")
+        self.params = {"vegetableName": "กะหล่ำดอก", "startDate": "2024-01-01", "endDate": "2024-02-10"}
+
+    def _get(self, **params):
+        return self.client.get(reverse("combined_price_forecast"), {**self.params, **params})
+
+    def test_matches_json_format(self):
+        plain = self._get().json()
+        response = self._get(format="columnar")
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+
+        self.assertEqual(payload["format"], "columnar")
+        self.assertEqual(payload["crop"], {"crop_id": self.crop.crop_id, "crop_name": "กะหล่ำดอก คละ", "unit": "กก."})
+        self.assertEqual(payload["overall_summary"], plain["overall_summary"])
+        series = payload["series"]
+        dates = series["dates"]
+        self.assertEqual(dates, sorted({row["date"] for row in plain["results"]}))
+        self.assertEqual((dates[0], dates[-1], len(dates)), ("2024-01-01", "2024-02-05", 36))
+        for key in ("min", "max", "avg", "predicted", "combined"):
+            self.assertEqual(len(series[key]), len(dates), key)
+
+        historical = {row["date"]: row for row in plain["results"] if row["type"] == "historical"}
+        predicted = {row["date"]: row["price"] for row in plain["results"] if row["type"] == "predicted"}
+        combined = {row["date"]: row["combined_price"] for row in plain["combined"]}
+        for i, day in enumerate(dates):
+            row = historical.get(day)
+            self.assertEqual(series["avg"][i], row and row["price"])
+            self.assertEqual(series["min"][i], row and row["min_price"])
+            self.assertEqual(series["max"][i], row and row["max_price"])
+            self.assertEqual(series["predicted"][i], predicted.get(day))
+            self.assertEqual(series["combined"][i], combined.get(day))
+        # วันที่มีทั้งราคาจริงและค่าพยากรณ์ combined ใช้ราคาจริง
+        overlap = dates.index("2024-01-27")
+        self.assertEqual((series["avg"][overlap], series["predicted"][overlap]), (36.0, 52.0))
+        self.assertEqual(series["combined"][overlap], 36.0)
+
+    def test_unknown_format_is_not_found(self):
+        self.assertEqual(self._get(format="csv").status_code, 404)
+
+    def test_fast_json_renderer_keeps_thai_text(self):
+        response = self.client.get(reverse("crop_info_list"))
+        self.assertEqual(response["Content-Type"], "application/json; charset=utf-8")
+        self.assertIn("กะหล่ำดอก คละ".encode("utf-8"), response.content)
+
+
+class DownsampleTests(TestCase):
+    """ ลดจำนวนจุดด้วย LTTB / bucket (crops/api/downsample.py) """
+
+    def setUp(self):
+        days = np.arange(19723, 19723 + 500, dtype=np.int64)
+        # ราคาขึ้นลงเป็นคลื่น มีจุดพุ่งสูงหนึ่งจุดและช่วงที่ไม่มีค่า
+        average = 20 + 5 * np.sin(np.arange(500) / 15)
+        average[250] = 80
+        average[300:305] = np.nan
+        self.days = days
+        self.columns = {"min_price": average - 1, "max_price": average + 1, "price": average}
+        self.aggregations = {"min_price": "min", "max_price": "max", "price": "mean"}
+
+    def _downsample(self, max_points, method):
+        return downsample_series(self.days, self.columns, max_points, method, "price", self.aggregations)
+
+    def test_parse_downsample(self):
+        self.assertEqual(parse_downsample({}), (None, "lttb"))
+        self.assertEqual(parse_downsample({"max_points": "", "downsample": "bucket"}), (None, "bucket"))
+        self.assertEqual(parse_downsample({"max_points": "3"}), (3, "lttb"))
+        for params in ({"max_points": "2"}, {"max_points": "0"}, {"max_points": "-5"}, {"max_points": "abc"},
+                       {"max_points": "10", "downsample": "avg"}):
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                parse_downsample(params)
+
+    def test_lttb_keeps_endpoints_and_real_points(self):
+        for max_points in (3, 4, 50, 499):
+            with self.subTest(max_points=max_points):
+                days, columns = self._downsample(max_points, "lttb")
+                self.assertEqual(len(days), max_points)
+                self.assertEqual((days[0], days[-1]), (self.days[0], self.days[-1]))
+                self.assertTrue((np.diff(days) > 0).all())
+                # จุดที่เลือกเป็นจุดจริง ทุกคอลัมน์มาจากแถวเดียวกัน
+                rows = days - self.days[0]
+                for key, values in columns.items():
+                    np.testing.assert_array_equal(values, self.columns[key][rows])
+        days, _ = self._downsample(50, "lttb")
+        self.assertIn(self.days[250], days)
+
+    def test_bucket_aggregates_each_range(self):
+        days, columns = self._downsample(7, "bucket")
+        self.assertEqual(len(days), 7)
+        starts = np.floor(np.arange(7) * 500 / 7).astype(np.int64)
+        np.testing.assert_array_equal(days, self.days[starts])
+        for i, (start, end) in enumerate(zip(starts, [*starts[1:], 500])):
+            price = self.columns["price"][start:end]
+            self.assertEqual(columns["min_price"][i], np.nanmin(self.columns["min_price"][start:end]))
+            self.assertEqual(columns["max_price"][i], np.nanmax(self.columns["max_price"][start:end]))
+            self.assertEqual(columns["price"][i], round(float(np.nanmean(price)), 2))
+
+    def test_bucket_of_missing_values_is_nan(self):
+        columns = {"price": np.array([1.0, np.nan, np.nan, np.nan, 5.0, 6.0])}
+        days, merged = downsample_series(np.arange(6), columns, 3, "bucket", "price", {"price": "mean"})
+        np.testing.assert_array_equal(days, [0, 2, 4])
+        np.testing.assert_array_equal(merged["price"], [1.0, np.nan, 5.5])
+
+    def test_short_series_is_unchanged(self):
+        for max_points in (None, 500, 1000):
+            days, columns = self._downsample(max_points, "lttb")
+            self.assertIs(days, self.days)
+            self.assertIs(columns, self.columns)
+
+    def test_endpoint_limits_points(self):
+        response_cache.local.clear()
+        make_crop("หัวผักกาด คละ", days=200)
+        params = {"vegetableName": "หัวผักกาด", "startDate": "2024-01-01", "endDate": "2024-12-31"}
+        full = self.client.get(reverse("combined_price_forecast"), params).json()
+        for method in DOWNSAMPLE_METHODS:
+            with self.subTest(method=method):
+                payload = self.client.get(
+                    reverse("combined_price_forecast"), {**params, "max_points": "20", "downsample": method}
+                ).json()
+                self.assertEqual(len(payload["results"]), 20)
+                self.assertEqual(len(payload["combined"]), 20)
+                self.assertEqual(payload["results"][0]["date"], "2024-01-01")
+                # summary ยังคำนวณจากข้อมูลทั้งหมด
+                self.assertEqual(payload["overall_summary"], full["overall_summary"])
+                quarterly = self.client.get(reverse("quarterly_avg"), {
+                    "crop_name": "หัวผักกาด", "startDate": "2024-01-01", "endDate": "2024-12-31",
+                    "max_points": "20", "downsample": method,
+                }).json()
+                self.assertEqual(len(quarterly["dailyPrices"]), 20)
+                if method == "lttb":
+                    self.assertEqual(quarterly["dailyPrices"][-1]["date"], "2024-07-18")
+        response = self.client.get(reverse("combined_price_forecast"), {**params, "max_points": "2"})
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchPriceForecastTests(TestCase):
+    """ batch-priceforecast: ข้อมูลของแต่ละพืชเท่ากับ combined-priceforecast ตามลำดับที่ขอ """
+
+    def setUp(self):
+        response_cache.local.clear()
+        self.cabbage = make_crop("กะหล่ำปลี คละ", days=20)
+        self.kale = make_crop("ผักคะน้า คัด", days=10, start=date(2024, 1, 5))
+        save_forecast_run(self.kale, [(date(2024, 1, 15), Decimal("30.00"))], "test@1")
+        self.dates = {"startDate": "2024-01-01", "endDate": "2024-01-31"}
+
+    def _get(self, params):
+        return self.client.get(reverse("batch_price_forecast"), {**self.dates, **params})
+
+    def _single(self, crop, **params):
+        return self.client.get(
+            reverse("combined_price_forecast"), {**self.dates, "vegetableName": crop.crop_name, **params}
+        ).json()
+
+    def test_matches_single_crop_responses(self):
+        response = self._get({"crop_id": f"{self.kale.crop_id}", "vegetableName": ["กะหล่ำปลี", "ผักคะน้า"]})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        # ลำดับตามที่ขอ (crop_id ก่อนชื่อ) และพืชซ้ำส่งครั้งเดียว
+        self.assertEqual([s["crop"]["crop_id"] for s in payload["series"]], [self.kale.crop_id, self.cabbage.crop_id])
+        self.assertEqual(payload["not_found"], [])
+        for crop, series in zip((self.kale, self.cabbage), payload["series"]):
+            single = self._single(crop)
+            self.assertEqual(series["crop"], {"crop_id": crop.crop_id, "crop_name": crop.crop_name, "unit": "กก."})
+            self.assertEqual({key: series[key] for key in single}, single)
+
+    def test_columnar_and_max_points(self):
+        params = {"crop_id": f"{self.cabbage.crop_id},{self.kale.crop_id}", "format": "columnar", "max_points": "5"}
+        payload = self._get(params).json()
+        self.assertEqual(payload["series"], [
+            self._single(crop, format="columnar", max_points="5") for crop in (self.cabbage, self.kale)
+        ])
+
+    def test_partial_misses(self):
+        payload = self._get({"crop_id": [f"{self.cabbage.crop_id}", "999999", "x"], "vegetableName": "ไม่มีพืชนี้"}).json()
+        self.assertEqual([s["crop"]["crop_id"] for s in payload["series"]], [self.cabbage.crop_id])
+        self.assertEqual(payload["not_found"], ["999999", "x", "ไม่มีพืชนี้"])
+
+        payload = self._get({"vegetableName": "ไม่มีพืชนี้"}).json()
+        self.assertEqual(payload, {"series": [], "not_found": ["ไม่มีพืชนี้"]})
+
+    def test_max_batch_crops(self):
+        crop_ids = f"{self.cabbage.crop_id},{self.kale.crop_id}"
+        with mock.patch("crops.api.views_api.MAX_BATCH_CROPS", 1):
+            response = self._get({"crop_id": crop_ids})
+            self.assertEqual(response.status_code, 400)
+            # พืชซ้ำและพืชที่หาไม่พบไม่นับรวม
+            response = self._get({"crop_id": f"{self.cabbage.crop_id},{self.cabbage.crop_id},999999"})
+            self.assertEqual(response.status_code, 200)
+
+    def test_bad_requests(self):
+        self.assertEqual(self._get({}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("batch_price_forecast"), {"crop_id": "1"}).status_code, 400)
+        self.assertEqual(self._get({"crop_id": "1", "endDate": "2024-13-01"}).status_code, 400)
+        self.assertEqual(self._get({"crop_id": "1", "max_points": "1"}).status_code, 400)
+        self.assertEqual(self._get({"crop_id": "1", "format": "csv"}).status_code, 404)
+
+
+@skipUnless(brotli is not None, "ต้องติดตั้ง Brotli")
+class CompressionTests(TestCase):
+    """ CompressionMiddleware และ body ที่บีบอัดแล้วใน response cache ตาม Accept-Encoding """
+
+    def setUp(self):
+        response_cache.local.clear()
+        make_crop("กะหล่ำปลี")
+        self.params = {"vegetableName": "กะหล่ำปลี", "startDate": "2024-01-01", "endDate": "2024-01-31"}
+
+    @staticmethod
+    def _decode(response):
+        encoding = response.get("Content-Encoding")
+        if encoding == "br":
+            return brotli.decompress(response.content)
+        if encoding == "gzip":
+            return gzip.decompress(response.content)
+        return response.content
+
+    def _prices(self, accept_encoding):
+        return self.client.get(reverse("cropvariable-list"), headers={"accept-encoding": accept_encoding})
+
+    def test_negotiates_encoding(self):
+        plain = self._prices("identity")
+        cases = {
+            "gzip, deflate, br": "br",
+            "gzip": "gzip",
+            "br;q=0.5, gzip": "gzip",
+            "*": "br",
+            "identity": None,
+            "gzip;q=0, br;q=0": None,
+            "": None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(accept_encoding=header):
+                response = self._prices(header)
+                self.assertEqual(response.get("Content-Encoding"), expected)
+                self.assertIn("Accept-Encoding", response["Vary"])
+                self.assertEqual(self._decode(response), plain.content)
+                if expected:
+                    self.assertEqual(response["Content-Length"], str(len(response.content)))
+                    self.assertLess(len(response.content), len(plain.content))
+
+    def test_min_size(self):
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 7):
+            response = self._prices("br, gzip")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertFalse(response.has_header("Vary") and "Accept-Encoding" in response["Vary"])
+
+    def test_html_is_not_compressed(self):
+        # หน้า admin มี CSRF token: ต้องไม่บีบอัด (BREACH)
+        response = self.client.get(reverse("admin:login"), headers={"accept-encoding": "br, gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/html"))
+        self.assertGreater(len(response.content), 512)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertFalse(compressible("text/html; charset=utf-8", 10 ** 6))
+        self.assertFalse(compressible("text/csv", 10 ** 6))
+        self.assertTrue(compressible("application/json; charset=utf-8", 10 ** 6))
+
+    def test_cached_bodies_per_encoding(self):
+        url = reverse("combined_price_forecast")
+        first = self.client.get(url, self.params, headers={"accept-encoding": "gzip"})
+        self.assertEqual((first["X-Cache"], first["Content-Encoding"]), ("MISS", "gzip"))
+        self.assertIn("Accept-Encoding", first["Vary"])
+        self.assertTrue(first["ETag"].startswith('W/"'))
+        body = gzip.decompress(first.content)
+
+        # encoding ใหม่ของรายการเดิม: บีบอัดครั้งเดียวแล้วเก็บคู่กับรายการใน cache
+        with mock.patch("crops.response_cache.compress", wraps=compress) as compress_spy:
+            second = self.client.get(url, self.params, headers={"accept-encoding": "br"})
+            third = self.client.get(url, self.params, headers={"accept-encoding": "br"})
+            again = self.client.get(url, self.params, headers={"accept-encoding": "gzip"})
+        self.assertEqual(compress_spy.call_count, 1)
+        self.assertEqual([r["X-Cache"] for r in (second, third, again)], ["HIT"] * 3)
+        self.assertEqual((second["Content-Encoding"], again["Content-Encoding"]), ("br", "gzip"))
+        self.assertEqual(second.content, third.content)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(brotli.decompress(second.content), body)
+
+        plain = self.client.get(url, self.params, headers={"accept-encoding": "identity"})
+        self.assertEqual(plain["X-Cache"], "HIT")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+        self.assertEqual(plain.content, body)
+        # ETag เดียวกัน (weak comparison) ทุก encoding
+        self.assertEqual(plain["ETag"], first["ETag"].removeprefix("W/"))
+
+
+def baseline_rows(crop, start_date, end_date):
+    """
+    แถวของ workbook จาก export เดิม (ก่อนรองรับหลายพืช/หลายรูปแบบ) คำนวณตรงจากฐานข้อมูล:
+    ราคาจริงทุกวันในช่วง + ราคาพยากรณ์ของวันที่ไม่มีราคาจริง เรียงตามวันที่ (ช่องว่างเป็น None)
+    """
+    rows = [
+        (crop.crop_name, day.isoformat(), float(low), float(high), float(average), None)
+        for day, low, high, average in CropVariable.objects.filter(
+            crop=crop, date__range=(start_date, end_date)
+        ).values_list("date", "min_price", "max_price", "average_price")
+    ]
+    historical_dates = {row[1] for row in rows}
+    rows += [
+        (crop.crop_name, day.isoformat(), None, None, None, float(price))
+        for day, price in current_predictions().filter(
+            crop=crop, predicted_date__range=(start_date, end_date)
+        ).values_list("predicted_date", "predicted_price")
+        if day.isoformat() not in historical_dates
+    ]
+    return sorted(rows, key=lambda row: row[1])
+
+
+class PriceExportTests(TestCase):
+    """ export-excel: xlsx / csv / parquet ได้แถวเดียวกับ workbook ของ export เดิม และ cache ของไฟล์ """
+
+    start, end = date(2024, 1, 5), date(2024, 2, 5)
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        settings_override = override_settings(EXPORT_CACHE_DIR=cache_dir, EXPORT_CACHE_MAX_FILES=10)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.cabbage = make_crop("กะหล่ำปลี")
+        self.kale = make_crop("คะน้า", days=10, start=date(2024, 1, 20))
+        # ค่าพยากรณ์ทับช่วงท้ายของราคาจริง (25-30 ม.ค.) และต่อไปถึง 10 ก.พ.
+        save_forecast_run(self.cabbage, [
+            (date(2024, 1, 25) + timedelta(days=i), Decimal(40 + i)) for i in range(17)
+        ], "test@1")
+
+    def _export(self, **params):
+        query = {"startDate": self.start.isoformat(), "endDate": self.end.isoformat(), **params}
+        return self.client.get(reverse("export_excel"), query)
+
+    @staticmethod
+    def _body(response):
+        return b"".join(response.streaming_content)
+
+    def assertMatchesBaseline(self, rows, crop):
+        expected = baseline_rows(crop, self.start, self.end)
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual(rows[0], expected[0])
+        self.assertEqual(rows[-1], expected[-1])
+
+    def _sheet_rows(self, body, title):
+        sheet = load_workbook(io.BytesIO(body))[title]
+        header, *rows = sheet.iter_rows(values_only=True)
+        self.assertEqual(header[:6], ("Crop Name", "Date", "Min Price", "Max Price", "Average Price", "Predicted Price"))
+        return [tuple(row[:6]) for row in rows]
+
+    def test_baseline_fixture_overlaps_forecast(self):
+        rows = baseline_rows(self.cabbage, self.start, self.end)
+        # ราคาจริง 5-30 ม.ค. (26 วัน) + พยากรณ์ 31 ม.ค. - 5 ก.พ. (6 วัน)
+        self.assertEqual(len(rows), 32)
+        self.assertEqual(rows[-1][5], 51.0)
+
+    def test_xlsx_single_crop(self):
+        response = self._export(vegetableName="กะหล่ำปลี")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("attachment", response["Content-Disposition"])
+        self.assertMatchesBaseline(self._sheet_rows(self._body(response), "Price Data"), self.cabbage)
+
+    def test_xlsx_one_sheet_per_crop(self):
+        response = self._export(crop_id=f"{self.cabbage.crop_id},{self.kale.crop_id}")
+        body = self._body(response)
+        self.assertEqual(load_workbook(io.BytesIO(body), read_only=True).sheetnames, ["กะหล่ำปลี", "คะน้า"])
+        self.assertMatchesBaseline(self._sheet_rows(body, "กะหล่ำปลี"), self.cabbage)
+        self.assertMatchesBaseline(self._sheet_rows(body, "คะน้า"), self.kale)
+
+    def test_xlsx_long_layout(self):
+        response = self._export(crop_id=[self.cabbage.crop_id, self.kale.crop_id], layout="long")
+        rows = self._sheet_rows(self._body(response), "Price Data")
+        expected = baseline_rows(self.cabbage, self.start, self.end) + baseline_rows(self.kale, self.start, self.end)
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual((rows[0], rows[-1]), (expected[0], expected[-1]))
+
+    def test_csv_streams_same_rows(self):
+        response = self._export(vegetableName="กะหล่ำปลี", file_format="csv")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        header, *rows = csv.reader(io.StringIO(self._body(response).decode("utf-8-sig")))
+        self.assertEqual(header[0], "Crop Name")
+        rows = [(name, day, *(float(value) if value else None for value in prices)) for name, day, *prices in rows]
+        self.assertMatchesBaseline(rows, self.cabbage)
+
+    @skipUnless(parquet_available(), "ต้องติดตั้ง pyarrow")
+    def test_parquet_same_rows(self):
+        import pyarrow.parquet as pq
+
+        response = self._export(vegetableName="กะหล่ำปลี", file_format="parquet")
+        self.assertEqual(response.status_code, 200)
+        table = pq.read_table(io.BytesIO(self._body(response))).to_pylist()
+        rows = [
+            (row["crop_name"], row["date"].isoformat(), row["min_price"], row["max_price"],
+             row["average_price"], row["predicted_price"])
+            for row in table
+        ]
+        self.assertEqual({row["crop_id"] for row in table}, {self.cabbage.crop_id})
+        self.assertMatchesBaseline(rows, self.cabbage)
+
+    def test_file_cache_hit_and_invalidation(self):
+        for file_format in ("xlsx", "csv"):
+            with self.subTest(file_format=file_format):
+                first = self._export(vegetableName="กะหล่ำปลี", file_format=file_format)
+                first_body = self._body(first)
+                second = self._export(vegetableName="กะหล่ำปลี", file_format=file_format)
+                self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+                self.assertEqual(self._body(second), first_body)
+                # ช่วงวันที่อื่นเป็นไฟล์อื่น
+                other = self._export(vegetableName="กะหล่ำปลี", file_format=file_format, endDate="2024-01-31")
+                self.assertEqual(other["X-Cache"], "MISS")
+                self._body(other)
+
+        added = date(2024, 1, 31)
+        CropVariable.objects.create(crop=self.cabbage, date=added, min_price=1, max_price=3, average_price=2)
+        refresh_derived({self.cabbage.crop_id: {added}})
+        response = self._export(vegetableName="กะหล่ำปลี")
+        self.assertEqual(response["X-Cache"], "MISS")
+        rows = self._sheet_rows(self._body(response), "Price Data")
+        self.assertIn(("กะหล่ำปลี", "2024-01-31", 1.0, 3.0, 2.0, None), rows)
+
+    def test_invalid_crop_id_is_400(self):
+        for value in ("abc", "1,x", "-1", "1.5"):
+            with self.subTest(crop_id=value):
+                response = self._export(crop_id=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_unknown_crop_is_404(self):
+        response = self._export(crop_id=f"{self.cabbage.crop_id},999999")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["not_found"], ["999999"])
+
+
+
+class KeysetPaginationTests(TestCase):
+    """ DateKeysetPagination และตัวกรอง date_after / date_before ของ crop-variables / predicted-data """
+
+    def setUp(self):
+        self.cabbage = make_crop("กะหล่ำปลี", days=12)
+        self.kale = make_crop("คะน้า", days=8, start=date(2024, 1, 5))
+        # รอบเก่าของกะหล่ำปลีต้องไม่แสดง เหลือแค่รอบปัจจุบัน
+        save_forecast_run(self.cabbage, [(date(2024, 2, 1), Decimal("99"))], "test@1")
+        save_forecast_run(self.cabbage, [
+            (date(2024, 1, 13) + timedelta(days=i), Decimal(40 + i)) for i in range(5)
+        ], "test@2")
+        save_forecast_run(self.kale, [(date(2024, 1, 13) + timedelta(days=i), Decimal(20 + i)) for i in range(3)],
+                          "test@1")
+
+    def _walk(self, name, params):
+        """ เดินตามลิงก์ next จนหมด คืนค่า (แถวทั้งหมด, จำนวนหน้า) """
+        rows, pages = [], 0
+        response = self.client.get(reverse(name), params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            payload = response.json()
+            self.assertEqual(set(payload), {"next", "results"})
+            rows += payload["results"]
+            pages += 1
+            if payload["next"] is None:
+                return rows, pages
+            response = self.client.get(payload["next"])
+
+    def test_walks_all_price_rows_in_order(self):
+        rows, pages = self._walk("cropvariable-list", {"page_size": 3})
+        expected = list(CropVariable.objects.order_by("date", "variable_id").values_list("date", "variable_id"))
+        self.assertEqual([(date.fromisoformat(r["date"]), r["variable_id"]) for r in rows], expected)
+        self.assertEqual(pages, 7)  # 20 แถว หน้าละ 3 (หน้าสุดท้ายมี 2 แถว)
+
+    def test_walks_current_predictions_in_order(self):
+        rows, _ = self._walk("predicteddata-list", {"page_size": 2})
+        self.assertEqual(
+            [(r["predicted_date"], r["crop"]) for r in rows],
+            [(day.isoformat(), str(crop)) for day, crop in sorted(
+                [(date(2024, 1, 13) + timedelta(days=i), self.cabbage) for i in range(5)]
+                + [(date(2024, 1, 13) + timedelta(days=i), self.kale) for i in range(3)],
+                key=lambda item: item[0],
+            )],
+        )
+        self.assertNotIn("2024-02-01", [r["predicted_date"] for r in rows])
+
+    def test_date_range_and_crop_filters(self):
+        rows, _ = self._walk("cropvariable-list", {
+            "date_after": "2024-01-06", "date_before": "2024-01-09", "crop": self.kale.crop_id, "page_size": 2,
+        })
+        self.assertEqual([r["date"] for r in rows], ["2024-01-06", "2024-01-07", "2024-01-08", "2024-01-09"])
+        self.assertEqual({r["crop"] for r in rows}, {str(self.kale)})
+
+        rows, _ = self._walk("cropvariable-list", {"date_after": "2024-01-11"})
+        self.assertEqual([r["date"] for r in rows], ["2024-01-11", "2024-01-11", "2024-01-12", "2024-01-12"])
+
+        rows, _ = self._walk("predicteddata-list", {"date_before": "2024-01-14", "crop": self.cabbage.crop_id})
+        self.assertEqual([(r["predicted_date"], r["predicted_price"]) for r in rows],
+                         [("2024-01-13", "40.00"), ("2024-01-14", "41.00")])
+
+        response = self.client.get(reverse("cropvariable-list"), {"date_after": "2024-02-30"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_size_and_cursor(self):
+        pagination = DateKeysetPagination()
+        self.assertIsNone(pagination.decode_cursor(mock.Mock(query_params={})))
+        cursor = pagination.encode_cursor(date(2024, 1, 5), 17)
+        request = mock.Mock(query_params={"cursor": cursor})
+        self.assertEqual(pagination.decode_cursor(request), (date(2024, 1, 5), 17))
+
+        for size, expected in (("0", 1), ("5", 5), ("5000", 1000), ("x", 100)):
+            with self.subTest(size=size):
+                self.assertEqual(pagination.get_page_size(mock.Mock(query_params={"page_size": size})), expected)
+        # base64 เสีย / "2024-01-05" ไม่มี pk / "2024-01-05|x" / "2024-13-05|1"
+        for bad in ("not-base64!", "MjAyNC0wMS0wNQ==", "MjAyNC0wMS0wNXx4", "MjAyNC0xMy0wNXwx"):
+            with self.subTest(cursor=bad):
+                self.assertEqual(self.client.get(reverse("cropvariable-list"), {"cursor": bad}).status_code, 404)
+
+
+def legacy_volatility(prices):
+    """ volatility แบบเดิม: ส่วนเบี่ยงเบนมาตรฐาน (ตัวหาร n - 1) ของผลตอบแทนรายวันที่ราคาก่อนหน้า > 0 """
+    returns = [(curr - prev) / prev for prev, curr in zip(prices, prices[1:]) if prev > 0]
+    return statistics.stdev(returns) * 100 if len(returns) >= 2 else 0.0
+
+
+def legacy_closest_price(crop, target_date):
+    """ _get_closest_price แบบเดิม (query ก่อน/หลังวันนั้น ห่างเท่ากันเลือกวันก่อน) """
+    before = CropVariable.objects.filter(crop=crop, date__lte=target_date).order_by('-date').first()
+    after = CropVariable.objects.filter(crop=crop, date__gte=target_date).order_by('date').first()
+    if before and after:
+        candidate = before if (target_date - before.date).days <= (after.date - target_date).days else after
+    else:
+        candidate = before or after
+    return float(candidate.average_price) if candidate else 0.0
+
+
+class SeriesSummaryTests(TestCase):
+    """ summary จาก array ของ series store ต้องเท่ากับการคำนวณต่อ request แบบเดิม """
+
+    def setUp(self):
+        self.crop = Crop.objects.create(crop_name="ต้นหอม คละ", unit="กก.")
+        # ราคามีวันที่เป็น 0 (ผลตอบแทนวันถัดไปถูกข้าม) และเว้นวันที่ 8 / 12-14 ไว้ทดสอบราคาที่ใกล้ที่สุด
+        prices = {1: "20", 2: "22.5", 3: "0", 4: "18", 5: "18", 6: "21.25", 7: "19", 9: "25", 10: "24", 11: "26",
+                  15: "30"}
+        CropVariable.objects.bulk_create([
+            CropVariable(crop=self.crop, date=date(2024, 3, day), average_price=Decimal(price),
+                         min_price=Decimal(price) - 1, max_price=Decimal(price) + 2, file_name="test.xls")
+            for day, price in prices.items()
+        ])
+        save_forecast_run(self.crop, [(date(2024, 3, 17) + timedelta(days=i), Decimal(30 + i * i)) for i in range(5)],
+                          "test@1")
+
+    def _summary(self, start_date, end_date):
+        return series_summary(get_series([self.crop.crop_id])[self.crop.crop_id], start_date, end_date)
+
+    def test_stats_match_legacy(self):
+        summary = self._summary(date(2024, 3, 2), date(2024, 3, 20))
+        rows = list(CropVariable.objects.filter(crop=self.crop, date__range=(date(2024, 3, 2), date(2024, 3, 20)))
+                    .order_by("date"))
+        prices = [float(row.average_price) for row in rows]
+        historical = summary["historical"]
+        self.assertEqual(historical["count"], 10)
+        self.assertAlmostEqual(historical["average"], sum(prices) / len(prices))
+        self.assertEqual((historical["min"], historical["max"]), (-1.0, 32.0))
+        self.assertEqual((historical["first_price"], historical["last_price"]), (22.5, 30.0))
+        self.assertAlmostEqual(historical["volatility"], legacy_volatility(prices))
+        # ddof=1 (sample) ไม่ใช่ส่วนเบี่ยงเบนมาตรฐานของประชากร
+        returns = [(curr - prev) / prev for prev, curr in zip(prices, prices[1:]) if prev > 0]
+        self.assertNotAlmostEqual(historical["volatility"], statistics.pstdev(returns) * 100)
+
+        predicted = summary["predicted"]
+        self.assertEqual((predicted["count"], predicted["min"], predicted["max"]), (4, 30.0, 39.0))
+        self.assertAlmostEqual(predicted["volatility"], legacy_volatility([30.0, 31.0, 34.0, 39.0]))
+
+    def test_volatility_needs_two_returns(self):
+        for end_day, expected_count in ((2, 2), (1, 1)):
+            with self.subTest(end_day=end_day):
+                historical = self._summary(date(2024, 3, 1), date(2024, 3, end_day))["historical"]
+                self.assertEqual((historical["count"], historical["volatility"]), (expected_count, 0.0))
+        # ผลตอบแทนเดียวที่ใช้ได้ (ราคาก่อนหน้าเป็น 0 ถูกข้าม)
+        self.assertEqual(self._summary(date(2024, 3, 2), date(2024, 3, 4))["historical"]["volatility"], 0.0)
+
+    def test_closest_price_ties_pick_earlier_day(self):
+        series = get_series([self.crop.crop_id])[self.crop.crop_id]
+        # 8 และ 13 มี.ค. ห่างจากวันก่อนและวันหลังเท่ากัน: เลือกวันก่อน
+        expected = {date(2024, 2, 1): 20.0, date(2024, 3, 3): 0.0, date(2024, 3, 8): 19.0, date(2024, 3, 12): 26.0,
+                    date(2024, 3, 13): 26.0, date(2024, 3, 14): 30.0, date(2025, 1, 1): 30.0}
+        for target, price in expected.items():
+            with self.subTest(target=target):
+                self.assertEqual(series.closest_price(target), price)
+                self.assertEqual(legacy_closest_price(self.crop, target), price)
+
+    def test_overall_summary_falls_back_to_predictions(self):
+        overall = overall_summary(self._summary(date(2024, 3, 17), date(2024, 3, 31)))
+        self.assertEqual(overall["overall_average"], round((30 + 31 + 34 + 39 + 46) / 5, 2))
+        self.assertEqual((overall["overall_min"], overall["overall_max"]), (30.0, 46.0))
+        self.assertEqual(overall["volatility_percent"], round(legacy_volatility([30.0, 31.0, 34.0, 39.0, 46.0]), 2))
+        # ราคาที่ใกล้ 17 และ 31 มี.ค. ที่สุดเป็นราคาจริงวันที่ 15 มี.ค. ทั้งคู่
+        self.assertEqual(overall["price_change_percent"], 0.0)
+
+        empty = Crop.objects.create(crop_name="ขึ้นฉ่าย คละ", unit="กก.")
+        summary = series_summary(get_series([empty.crop_id])[empty.crop_id], date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(overall_summary(summary), {
+            "overall_average": 0.0, "overall_min": 0.0, "overall_max": 0.0,
+            "volatility_percent": 0.0, "price_change_percent": 0.0,
+        })
+
+
+class SeriesStoreVersionTests(TransactionTestCase):
+    """ series store ใช้ array เดิมจนกว่าเวอร์ชันข้อมูลของพืชจะเปลี่ยน (นอก transaction เท่านั้น) """
+
+    def setUp(self):
+        series_store.clear()
+        self.addCleanup(series_store.clear)
+        self.crop = make_crop("ผักบุ้งจีน คละ", days=5)
+        self.other = make_crop("ผักบุ้งไทย", days=5)
+
+    def _average(self, crop):
+        return series_summary(get_series([crop.crop_id])[crop.crop_id], date(2024, 1, 1), date(2024, 1, 5))[
+            "historical"]["average"]
+
+    def test_reloads_only_after_version_bump(self):
+        first = get_series([self.crop.crop_id, self.other.crop_id])
+        self.assertEqual(self._average(self.crop), 12.0)
+
+        CropVariable.objects.filter(crop=self.crop, date=date(2024, 1, 5)).update(average_price=Decimal("19"))
+        # ยังไม่เพิ่มเวอร์ชัน: ใช้ array เดิม (ไม่ query ราคาใหม่)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(get_series([self.crop.crop_id])[self.crop.crop_id], first[self.crop.crop_id])
+        self.assertFalse([q for q in queries if 'FROM "crops_cropvariable"' in q["sql"]])
+
+        refresh_derived({self.crop.crop_id: {date(2024, 1, 5)}})
+        self.assertEqual(self._average(self.crop), 13.0)
+        # พืชอื่นไม่ได้รับผล
+        self.assertIs(get_series([self.other.crop_id])[self.other.crop_id], first[self.other.crop_id])
+
+    def test_new_forecast_run_reloads(self):
+        get_series([self.crop.crop_id])
+        save_forecast_run(self.crop, [(date(2024, 1, 6), Decimal("50"))], "test@1")
+        series = get_series([self.crop.crop_id])[self.crop.crop_id]
+        self.assertEqual(series.forecast(date(2024, 1, 1), date(2024, 1, 31))[1].tolist(), [50.0])
+
+
+class AsyncViewTests(TransactionTestCase):
+    """
+    async view ผ่าน ASGI (async_client) ให้ผลเท่ากับเรียกแบบ sync และ connection ที่เปิดใน thread ของ executor
+    (own_connection: query ราคาจริง/ค่าพยากรณ์พร้อมกัน) ถูกปิดเมื่อ query เสร็จ
+    ใช้ TransactionTestCase: thread ของ executor ใช้ connection ของตัวเองจึงต้องเห็นข้อมูลที่ commit แล้ว
+    """
+    # endpoint ฝั่งอ่านอ่านจาก replica เมื่อมี (test_settings ตั้งเป็น mirror ของฐานข้อมูลทดสอบ)
+    databases = {"default", "replica"} & set(settings.DATABASES)
+
+    def setUp(self):
+        self.cabbage = make_crop("กะหล่ำปลี คละ", days=40)
+        self.kale = make_crop("ผักคะน้า คัด", days=20, start=date(2024, 1, 10))
+        save_forecast_run(self.kale, [(date(2024, 2, 1), Decimal("30.00"))], "test@1")
+        rebuild_rollups()
+        self.dates = {"startDate": "2024-01-01", "endDate": "2024-03-31"}
+        self.requests = [
+            ("combined_price_forecast", {**self.dates, "vegetableName": "ผักคะน้า"}),
+            ("combined_price_forecast", {**self.dates, "vegetableName": "กะหล่ำปลี", "max_points": "10"}),
+            ("batch_price_forecast", {**self.dates, "crop_id": f"{self.cabbage.crop_id},{self.kale.crop_id}"}),
+            ("quarterly_avg", {**self.dates, "crop_name": "ผักคะน้า"}),
+            ("quarterly_avg", {**self.dates, "crop_name": "กะหล่ำปลี", "period": "month"}),
+        ]
+        self._reset_caches()
+        self.addCleanup(self._reset_caches)
+
+    @staticmethod
+    def _reset_caches():
+        # ให้ทุก request query ฐานข้อมูลจริง (ไม่ได้ array / response เดิมจาก request ก่อน)
+        series_store.clear()
+        response_cache.local.clear()
+
+    async def test_matches_sync_client(self):
+        for name, params in self.requests:
+            with self.subTest(view=name, params=params):
+                await sync_to_async(self._reset_caches)()
+                expected = await sync_to_async(self.client.get)(reverse(name), params)
+                await sync_to_async(self._reset_caches)()
+                response = await self.async_client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), expected.json())
+
+    async def test_bad_requests(self):
+        response = await self.async_client.get(reverse("batch_price_forecast"), {"crop_id": "1"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(reverse("quarterly_avg"), {**self.dates, "crop_name": "ไม่มีพืชนี้"})
+        self.assertEqual(response.status_code, 404)
+
+    @skipUnless(connection.vendor == "postgresql", "SQLite ในหน่วยความจำไม่ปิด connection จริง")
+    async def test_executor_connections_closed(self):
+        opened = []
+
+        def record(sender, connection, **kwargs):
+            if threading.current_thread() is not threading.main_thread():
+                opened.append(connection)
+
+        connection_created.connect(record)
+        try:
+            for name, params in self.requests:
+                await sync_to_async(self._reset_caches)()
+                response = await self.async_client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200)
+        finally:
+            connection_created.disconnect(record)
+        # query ราคาจริง/ค่าพยากรณ์ของทุก request รันใน thread ของ executor
+        self.assertGreaterEqual(len(opened), 2 * len(self.requests))
+        self.assertEqual([wrapper for wrapper in opened if wrapper.connection is not None], [])
+
+
+@override_settings(EXPORT_CACHE_MAX_FILES=0)
+class QueryPlanTests(TestCase):
+    """
+    query ที่ endpoint หลักส่งจริง (จับด้วย CaptureQueriesContext) ต้องค้นผ่าน index ไม่ scan ทั้งตาราง
+    PostgreSQL ใช้ EXPLAIN (ปิด seq scan เพราะตารางทดสอบเล็ก) / SQLite ใช้ EXPLAIN QUERY PLAN
+    """
+
+    def setUp(self):
+        response_cache.local.clear()
+        self.cabbage = make_crop("กะหล่ำปลี")
+        self.kale = make_crop("คะน้า", days=10)
+        save_forecast_run(self.cabbage, [
+            (date(2024, 1, 31) + timedelta(days=i), Decimal(40 + i)) for i in range(7)
+        ], "test@1")
+        self.cursor = DateKeysetPagination().encode_cursor(date(2024, 1, 3), 1)
+
+    def _queries(self, name, params):
+        """ SQL ทั้งหมดที่ endpoint ส่งไปฐานข้อมูล แยกตามตารางที่อ่าน (ราคาจริง / ค่าพยากรณ์) """
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(name), params)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return {
+            table: [query["sql"] for query in captured.captured_queries if f'FROM "{table}"' in query["sql"]]
+            for table in ("crops_cropvariable", "crops_predicteddata")
+        }
+
+    def assertAllIndexScans(self, queries, tables=("crops_cropvariable", "crops_predicteddata"), ordered_walk=False):
+        for table in tables:
+            self.assertTrue(queries[table], f"ไม่มี query ที่อ่าน {table}")
+            for sql in queries[table]:
+                self.assertIndexScan(sql, table, ordered_walk)
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET enable_seqscan = off")
+                try:
+                    cursor.execute(f"EXPLAIN {sql}")
+                    return [row[0] for row in cursor.fetchall()]
+                finally:
+                    cursor.execute("RESET enable_seqscan")
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexScan(self, sql, table, ordered_walk=False):
+        """
+        ตารางถูกอ่านผ่าน index: SQLite ต้องเป็น SEARCH (ช่วงของ index) หรือถ้า ordered_walk เป็น SCAN ตาม index
+        (หน้าแรกของ keyset ที่เดิน index ตามลำดับแล้วหยุดที่ LIMIT) / PostgreSQL ต้องไม่มี Seq Scan บนตารางนั้น
+        """
+        plan = self._plan(sql)
+        text = "\n".join(plan)
+        if connection.vendor == "postgresql":
+            self.assertNotIn(f"Seq Scan on {table}", text)
+            self.assertRegex(text, rf"(Index Scan|Index Only Scan|Bitmap Heap Scan) .*on {table}\b")
+            return
+        lines = [line for line in plan if re.match(rf"(SEARCH|SCAN) {table}\b", line)]
+        self.assertTrue(lines, text)
+        for line in lines:
+            if ordered_walk and line.startswith("SCAN"):
+                self.assertIn("USING INDEX", line)
+            else:
+                self.assertRegex(line, rf"^SEARCH {table} USING (COVERING )?INDEX", text)
+
+    def test_combined_history_and_forecast_ranges(self):
+        params = {"vegetableName": "กะหล่ำปลี", "startDate": "2024-01-01", "endDate": "2024-02-05"}
+        self.assertAllIndexScans(self._queries("combined_price_forecast", params))
+
+    def test_export_range(self):
+        params = {"crop_id": f"{self.cabbage.crop_id},{self.kale.crop_id}", "file_format": "csv",
+                  "startDate": "2024-01-05", "endDate": "2024-02-05"}
+        self.assertAllIndexScans(self._queries("export_excel", params))
+
+    def test_keyset_pages(self):
+        pages = [
+            ({}, True),
+            ({"cursor": self.cursor}, False),
+            ({"crop": self.cabbage.crop_id, "cursor": self.cursor}, False),
+            ({"crop": self.cabbage.crop_id, "date_after": "2024-01-02", "date_before": "2024-01-20"}, False),
+        ]
+        for name, table in (("cropvariable-list", "crops_cropvariable"), ("predicteddata-list", "crops_predicteddata")):
+            for params, ordered_walk in pages:
+                with self.subTest(name=name, params=params):
+                    self.assertAllIndexScans(self._queries(name, params), [table], ordered_walk)
+
+    def test_duplicate_rows_are_rejected(self):
+        day = date(2024, 1, 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CropVariable.objects.create(crop=self.cabbage, date=day, min_price=1, max_price=2, average_price=1)
+        run = CurrentForecast.objects.get(crop=self.cabbage).run
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PredictedData.objects.create(crop=self.cabbage, run=run, predicted_date=date(2024, 1, 31), predicted_price=1)
+        self.assertEqual(CropVariable.objects.filter(crop=self.cabbage, date=day).count(), 1)
+
+
+@skipUnless("replica" in settings.DATABASES, "ต้องมี alias replica (รันด้วย --settings=price_prediction.test_settings)")
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    PrimaryReplicaRouter / use_primary / ReplicaReadMixin / ReadYourWritesMiddleware กับ alias replica
+    (price_prediction/test_settings.py สร้าง replica เป็น mirror ของฐานข้อมูลทดสอบ default)
+    ใช้ TransactionTestCase: ใน TestCase ทุกการอ่านอยู่ใน transaction ของฐานข้อมูลหลักจึงไม่ไป replica
+    และ connection ของ replica มองไม่เห็นข้อมูลที่ยังไม่ commit
+    """
+    # test runner อ่าน databases ของทุก class แม้จะถูก skip จึงขอ replica เฉพาะเมื่อมี alias นี้
+    databases = {"default", "replica"} & set(settings.DATABASES)
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.crop = make_crop("กะหล่ำปลี", days=3)
+
+    def _list(self, **headers):
+        """ GET crop-variables คืนค่า (response, จำนวน query ที่ default, จำนวน query ที่ replica) """
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse("cropvariable-list"), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 3)
+        return response, len(primary), len(replica)
+
+    def test_router_reads_replica_only_inside_read_block(self):
+        self.assertEqual(self.router.db_for_read(Crop), "default")
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Crop), "replica")
+            self.assertEqual(self.router.db_for_write(Crop), "default")
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Crop), "default")
+            self.assertEqual(self.router.db_for_read(Crop), "replica")
+            # ใน transaction ของฐานข้อมูลหลักต้องเห็นสิ่งที่เพิ่งเขียน
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Crop), "default")
+        self.assertEqual(self.router.db_for_read(Crop), "default")
+
+    def test_queries_go_to_routed_connection(self):
+        with read_from_replica(), CaptureQueriesContext(connections["replica"]) as replica:
+            self.assertEqual(CropVariable.objects.filter(crop=self.crop).count(), 3)
+            crop = Crop.objects.get(pk=self.crop.pk)
+            with use_primary(), CaptureQueriesContext(connections["default"]) as primary:
+                self.assertTrue(Crop.objects.filter(pk=self.crop.pk).exists())
+        self.assertEqual(len(replica), 2)
+        self.assertEqual(len(primary), 1)
+        self.assertEqual(crop._state.db, "replica")
+        # object จาก replica ใช้เป็น foreign key ของแถวที่เขียนลงฐานข้อมูลหลักได้
+        self.assertTrue(self.router.allow_relation(crop, self.crop))
+        row = CropVariable.objects.create(crop=crop, date=date(2024, 2, 1), min_price=1, max_price=2, average_price=1)
+        self.assertEqual(row._state.db, "default")
+
+    def test_migrations_skip_replica(self):
+        self.assertIs(self.router.allow_migrate("replica", "crops"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "crops"))
+
+    def test_viewset_reads_from_replica(self):
+        response, primary, replica = self._list()
+        self.assertEqual(response["X-Read-Database"], "replica")
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_read_primary_header_and_cookie(self):
+        request = RequestFactory().get("/", headers={"X-Read-Primary": "1"})
+        self.assertEqual(request_read_alias(request), "default")
+        self.assertEqual(request_read_alias(RequestFactory().get("/")), "replica")
+        for headers in ({"X-Read-Primary": "1"}, {"Cookie": f"{PIN_COOKIE}=1"}):
+            with self.subTest(headers=headers):
+                response, primary, replica = self._list(**headers)
+                self.assertEqual(response["X-Read-Database"], "default")
+                self.assertGreater(primary, 0)
+                self.assertEqual(replica, 0)
+
+    def test_write_pins_client_to_primary(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        open(f"{folder}/prices.xls", "wb").close()
+        with override_settings(PRICE_FILES_DIR=folder):
+            response = self.client.get(reverse("update-prices"), {"file": "prices.xls"})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.cookies[PIN_COOKIE].value, "1")
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 10)
+        # request ถัดไปของ client เดิม (ส่ง cookie กลับมา) อ่านจากฐานข้อมูลหลัก
+        response, primary, replica = self._list()
+        self.assertEqual(response["X-Read-Database"], "default")
+        self.assertEqual(replica, 0)
+        # client อื่นยังอ่านจาก replica
+        self.client.cookies.clear()
+        self.assertEqual(self._list()[0]["X-Read-Database"], "replica")
+
+    def test_middleware_pins_only_writes(self):
+        def writes(request):
+            Crop.objects.filter(pk=self.crop.pk).update(unit="กก.")
+            return JsonResponse({})
+
+        def reads(request):
+            Crop.objects.get(pk=self.crop.pk)
+            return JsonResponse({})
+
+        request = RequestFactory().get("/")
+        self.assertIn(PIN_COOKIE, ReadYourWritesMiddleware(writes)(request).cookies)
+        self.assertNotIn(PIN_COOKIE, ReadYourWritesMiddleware(reads)(request).cookies)
+        with mock.patch("crops.db_router.replica_configured", return_value=False):
+            # ไม่มี replica: ไม่ต้อง pin
+            self.assertNotIn(PIN_COOKIE, ReadYourWritesMiddleware(writes)(request).cookies)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
@@ -59,8 +60,11 @@ INSTALLED_APPS = [
 # --- Middleware ---
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise ที่รองรับ ASGI (crops/static_files.py) middleware ทุกตัวรองรับ async เพื่อให้ async view ไม่ต้องรันใน thread
+    'crops.static_files.AsyncWhiteNoiseMiddleware',
+    'crops.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'crops.db_router.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,9 +85,69 @@ REST_FRAMEWORK = {
     'DEFAULT_CHARSET': 'utf-8',
 }
 
+# --- Price import ---
+# จำนวน process ที่ใช้ parse ไฟล์ราคาพร้อมกันใน update-all-prices/ (1 = ทำทีละไฟล์)
+PRICE_IMPORT_WORKERS = int(os.getenv('PRICE_IMPORT_WORKERS', '1'))
+# โฟลเดอร์ที่เก็บไฟล์ราคา .xls สำหรับ update-prices/ และ update-all-prices/
+PRICE_FILES_DIR = os.getenv('PRICE_FILES_DIR', str(BASE_DIR / 'crops_price'))
+# งานนำเข้าที่ไม่มี heartbeat นานเกินกี่วินาทีถือว่า worker หยุดไปแล้ว: ส่งกลับเข้าคิว
+# หรือเป็น failed เมื่อถูกหยิบไปรันครบ IMPORT_JOB_MAX_ATTEMPTS ครั้ง
+IMPORT_JOB_STALE_SECONDS = int(os.getenv('IMPORT_JOB_STALE_SECONDS', '1800'))
+IMPORT_JOB_MAX_ATTEMPTS = int(os.getenv('IMPORT_JOB_MAX_ATTEMPTS', '3'))
+# worker อัปเดต heartbeat ของงานที่รันอยู่ทุกกี่วินาที (ระหว่างไฟล์ใหญ่ไฟล์เดียวด้วย) ต้องน้อยกว่า IMPORT_JOB_STALE_SECONDS
+IMPORT_JOB_HEARTBEAT_SECONDS = int(os.getenv('IMPORT_JOB_HEARTBEAT_SECONDS', '60'))
+
+# --- Crop name index ---
+# อายุ (วินาที) ของดัชนีชื่อพืชในหน่วยความจำ ก่อนโหลดใหม่เพื่อเห็นพืชที่เพิ่มจาก process อื่น
+CROP_INDEX_TTL = int(os.getenv('CROP_INDEX_TTL', '300'))
+
+# --- Series store ---
+# จำนวนพืชสูงสุดที่เก็บราคารายวันเป็น NumPy array ในหน่วยความจำของแต่ละ process (0 = โหลดใหม่ทุก request)
+SERIES_STORE_MAX_CROPS = int(os.getenv('SERIES_STORE_MAX_CROPS', '256'))
+
+# --- Forecast runs ---
+# จำนวนรอบพยากรณ์ที่เก็บไว้ต่อพืช (รวมรอบปัจจุบัน) รอบที่เก่ากว่านี้ถูกลบหลังบันทึกรอบใหม่
+FORECAST_RUNS_KEEP = int(os.getenv('FORECAST_RUNS_KEEP', '3'))
+
+# --- Response cache ---
+# cache ของ endpoint ฝั่งอ่าน (key มีเวอร์ชันข้อมูล จึงไม่ต้องตั้ง TTL) ชั้นแรกเป็น LRU ใน process
+# ตั้ง SHARED_CACHE_URL เพื่อเปิดชั้นที่แชร์ระหว่าง process: redis://... หรือ path ของโฟลเดอร์ (file cache)
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+SHARED_CACHE_URL = os.getenv('SHARED_CACHE_URL', '')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+if SHARED_CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES['shared'] = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': SHARED_CACHE_URL}
+elif SHARED_CACHE_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED_CACHE_URL.removeprefix('file://'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+RESPONSE_CACHE_SHARED_ALIAS = 'shared' if SHARED_CACHE_URL else ''
+
+# --- Response compression ---
+# บีบอัด response ของ API ด้วย Brotli / gzip ตาม Accept-Encoding (เฉพาะ body ที่ยาวอย่างน้อย COMPRESSION_MIN_SIZE bytes)
+# ระดับ CACHED ใช้กับ body ที่เก็บใน response cache (บีบอัดครั้งเดียวต่อรายการ จึงตั้งสูงกว่าได้)
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '512'))
+COMPRESSION_BROTLI_LEVEL = int(os.getenv('COMPRESSION_BROTLI_LEVEL', '4'))  # 0-11
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))  # 1-9
+COMPRESSION_CACHED_BROTLI_LEVEL = int(os.getenv('COMPRESSION_CACHED_BROTLI_LEVEL', '9'))
+COMPRESSION_CACHED_GZIP_LEVEL = int(os.getenv('COMPRESSION_CACHED_GZIP_LEVEL', '9'))
+
+# --- Export cache ---
+# ไฟล์ export (xlsx/csv/parquet) ที่สร้างแล้ว เก็บตาม hash ของพารามิเตอร์ + เวอร์ชันข้อมูล เพื่อส่งซ้ำได้ทันที
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bluzora-exports'))
+EXPORT_CACHE_MAX_FILES = int(os.getenv('EXPORT_CACHE_MAX_FILES', '100'))  # 0 = ไม่เก็บ
+
 # --- URLs and WSGI ---
 ROOT_URLCONF = 'price_prediction.urls'
 WSGI_APPLICATION = 'price_prediction.wsgi.application'
+# production รันแบบ ASGI (Procfile: gunicorn + UvicornWorker) endpoint ฝั่งอ่านหลักเป็น async view
+ASGI_APPLICATION = 'price_prediction.asgi.application'
 
 # --- Templates ---
 TEMPLATES = [
@@ -103,9 +167,13 @@ TEMPLATES = [
 ]
 
 # --- Database ---
+# Production รันแบบ ASGI: แต่ละ request / thread ของ executor (sync_to_async) เปิด connection ของตัวเอง
+# ค่าเริ่มต้นจึงไม่เก็บ connection ค้างไว้ (0 = ปิดเมื่อจบ request) กัน connection ค้างเกิน max_connections ของ PostgreSQL
+# ตั้ง CONN_MAX_AGE (วินาที) ได้เมื่อรันแบบ WSGI หรือมี pooler (เช่น PgBouncer) อยู่หน้าฐานข้อมูล
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', '0'))
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
-    DATABASES = {'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=600)}
+    DATABASES = {'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=CONN_MAX_AGE)}
 else:
     DATABASES = {
         'default': {
@@ -115,9 +183,23 @@ else:
             'PASSWORD': os.getenv('DB_PASSWORD'),
             'HOST': os.getenv('DB_HOST', 'localhost'),
             'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': CONN_MAX_AGE,
         }
     }
 
+# --- Read replica ---
+# ตั้ง REPLICA_DATABASE_URL เพื่อให้ endpoint ฝั่งอ่านของ API อ่านจากฐานข้อมูล replica (crops/db_router.py)
+# การนำเข้า / พยากรณ์ / admin ใช้ฐานข้อมูลหลักเสมอ ทดสอบในเครื่องได้ด้วยสำเนาไฟล์ SQLite หรือ PostgreSQL อีกฐาน
+# client ที่เพิ่งเขียนข้อมูลอ่านจากฐานข้อมูลหลักต่ออีก REPLICA_PIN_SECONDS วินาที (replica อาจยังตามไม่ทัน)
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL', '')
+if REPLICA_DATABASE_URL:
+    # ใช้ parse ไม่ใช่ config (config อ่าน DATABASE_URL ก่อน default เสมอ)
+    DATABASES['replica'] = dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=CONN_MAX_AGE)
+    # ตอนรันเทสต์ให้ replica ชี้ไปที่ฐานข้อมูลทดสอบเดียวกับ default
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['crops.db_router.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
 # --- Internationalization ---
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
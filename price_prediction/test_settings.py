@@ -0,0 +1,10 @@
+# price_prediction/test_settings.py
+# settings สำหรับรันเทสต์: python manage.py test crops --settings=price_prediction.test_settings
+# เหมือน settings.py ทุกอย่าง แต่มี alias replica เสมอ (mirror ของฐานข้อมูลทดสอบ default)
+# เทสต์ของ router จึงรันได้โดยไม่ต้องตั้ง REPLICA_DATABASE_URL
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+if 'replica' not in DATABASES:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}